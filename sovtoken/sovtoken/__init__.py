@@ -7,7 +7,12 @@ LEDGER_IDS = {TOKEN_LEDGER_ID, }
 AcceptableWriteTypes = {TokenTransactions.MINT_PUBLIC.value,
                         TokenTransactions.XFER_PUBLIC.value}
 
-AcceptableQueryTypes = {TokenTransactions.GET_UTXO.value, }
+AcceptableQueryTypes = {TokenTransactions.GET_UTXO.value,
+                        TokenTransactions.GET_BALANCE.value,
+                        TokenTransactions.GET_UTXOS.value,
+                        TokenTransactions.GET_OUTPUT_AUDIT.value,
+                        TokenTransactions.GET_TXN_HISTORY.value,
+                        TokenTransactions.GET_UTXO_FOR_AMOUNT.value}
 
 # TODO: Find a better way to import all members of this module
 __all__ = [
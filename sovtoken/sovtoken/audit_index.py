@@ -0,0 +1,97 @@
+"""
+Optional index of the token ledger answering which txn spent an output and which outputs a txn
+created, so auditing a payment does not need a scan of the ledger. It is kept in reserved keys
+of the utxo cache, uncommitted entries are committed and rejected with the batches of the cache.
+
+    `#spent:<address>:<seq no>` -> seq no of the txn spending the output
+    `#created:<seq no>` -> outputs of the txn, a JSON list of `[address, amount]`
+
+MINT_PUBLIC, XFER_PUBLIC and FEE_TXN all keep their inputs and outputs in the same fields of
+the txn payload, so any txn of the token ledger is indexed the same way.
+"""
+import json
+from typing import List, Optional, Tuple
+
+from plenum.common.ledger import Ledger
+from plenum.common.txn_util import get_payload_data, get_seq_no
+from sovtoken.constants import INPUTS, OUTPUTS, ADDRESS, SEQNO, AMOUNT
+from sovtoken.utxo_cache import UTXOCache
+from stp_core.common.log import getlogger
+
+logger = getlogger()
+
+
+class AuditIndex:
+    SPENT_KEY_PREFIX = '#spent:'
+    CREATED_KEY_PREFIX = '#created:'
+    # Set once all committed txns of the ledger are indexed
+    INDEX_MARKER = 'audit_index'
+
+    def __init__(self, utxo_cache: UTXOCache):
+        self.utxo_cache = utxo_cache
+
+    @classmethod
+    def _spent_key(cls, address: str, seq_no: int) -> str:
+        return '{}{}:{}'.format(cls.SPENT_KEY_PREFIX, address, seq_no)
+
+    @classmethod
+    def _created_key(cls, seq_no: int) -> str:
+        return '{}{}'.format(cls.CREATED_KEY_PREFIX, seq_no)
+
+    @classmethod
+    def _txn_records(cls, txn) -> List[Tuple[str, str]]:
+        payload = get_payload_data(txn)
+        seq_no = get_seq_no(txn)
+        records = [(cls._spent_key(i[ADDRESS], i[SEQNO]), str(seq_no)) for i in payload.get(INPUTS, [])]
+        outputs = payload.get(OUTPUTS)
+        if outputs:
+            records.append((cls._created_key(seq_no), json.dumps([[o[ADDRESS], o[AMOUNT]] for o in outputs])))
+        return records
+
+    def add_txn(self, txn, is_committed=False):
+        for key, value in self._txn_records(txn):
+            self.utxo_cache.set(key, value, is_committed=is_committed)
+
+    def get_spent_by(self, address: str, seq_no: int, is_committed=True) -> Optional[int]:
+        # Seq no of the txn spending the output, None while it is unspent
+        try:
+            value = self.utxo_cache.get(self._spent_key(address, seq_no), is_committed=is_committed)
+        except KeyError:
+            return None
+        return int(value)
+
+    def get_created(self, seq_no: int, is_committed=True) -> List[Tuple[str, int]]:
+        # `(address, amount)` of the outputs created by the txn
+        try:
+            value = self.utxo_cache.get(self._created_key(seq_no), is_committed=is_committed)
+        except KeyError:
+            return []
+        if isinstance(value, (bytes, bytearray)):
+            value = bytes(value).decode()
+        return [(address, amount) for address, amount in json.loads(value)]
+
+    def ensure_index(self, ledger: Ledger, chunk_size=1000) -> int:
+        """
+        Indexes the committed txns of the ledger applied before the index was enabled. Runs
+        once, later calls find the marker key and return immediately. Has to be called on
+        startup, before any batch is applied.
+
+        :return: number of indexed txns
+        """
+        if self.utxo_cache.has_marker(self.INDEX_MARKER):
+            return 0
+
+        indexed = 0
+        chunk = []
+        for _, txn in ledger.getAllTxn():
+            chunk.extend(self._txn_records(txn))
+            indexed += 1
+            if len(chunk) >= chunk_size:
+                self.utxo_cache.set_committed_batch(chunk)
+                chunk = []
+        if chunk:
+            self.utxo_cache.set_committed_batch(chunk)
+        self.utxo_cache.set_marker(self.INDEX_MARKER)
+
+        logger.info('built audit index for {} token txns'.format(indexed))
+        return indexed
@@ -0,0 +1,126 @@
+"""
+Applies the token ledger txns received in catch-up to the token state and the utxo cache in
+chunks instead of one by one. The txns of a chunk go through the request handlers'
+`updateState` together, so an address touched by many txns is written once per chunk, the
+state is committed once and the utxo cache changes are stored with a single write batch.
+
+The ledger is ahead of the state while txns are buffered. The seq no of the last applied txn
+is kept in the utxo cache for the duration of the catch-up, so txns buffered when the node
+stopped are applied when the next catch-up starts.
+
+A node bootstrapped from a snapshot (see `sovtoken.snapshot`) has a state ahead of its ledger,
+the txns the snapshot already includes are only checked against the snapshot's txn root.
+"""
+from itertools import groupby
+from typing import List
+
+from plenum.common.ledger import Ledger
+from plenum.common.metrics_collector import MetricsCollector, NullMetricsCollector
+from plenum.common.txn_util import get_type, get_seq_no, get_req_id
+from plenum.common.ledger_uncommitted_tracker import LedgerUncommittedTracker
+from sovtoken.exceptions import TokenSnapshotError
+from sovtoken.metrics import TokenMetricsName
+from sovtoken.utxo_cache import UTXOCache
+from state.pruning_state import PruningState
+from stp_core.common.log import getlogger
+
+logger = getlogger()
+
+
+class TokenCatchupApplier:
+    # Meta value of the utxo cache with the seq no of the last txn applied during a catch-up
+    AppliedSeqNoMeta = 'catchup_applied_seq_no'
+    # Meta values of the utxo cache with the seq no and txn root of the snapshot the state was
+    # loaded from, until the ledger reaches it
+    SnapshotSeqNoMeta = 'snapshot_seq_no'
+    SnapshotTxnRootMeta = 'snapshot_txn_root'
+
+    def __init__(self, node, ledger_id: int, ledger, state: PruningState, utxo_cache: UTXOCache,
+                 tracker: LedgerUncommittedTracker, chunk_size=1000,
+                 metrics: MetricsCollector = NullMetricsCollector()):
+        self.node = node
+        self.ledger_id = ledger_id
+        self.ledger = ledger
+        self.state = state
+        self.utxo_cache = utxo_cache
+        self.tracker = tracker
+        self.chunk_size = max(chunk_size, 1)
+        self.metrics = metrics
+        self._txns = []
+        self._snapshot_seq_no = 0
+
+    @staticmethod
+    def ledger_root_at(ledger, seq_no: int) -> str:
+        # Txn root of the ledger when it had `seq_no` txns
+        return Ledger.hashToStr(ledger.tree.merkle_tree_hash(0, seq_no))
+
+    def _check_snapshot_txn_root(self):
+        expected = self.utxo_cache.get_meta(self.SnapshotTxnRootMeta)
+        actual = self.ledger_root_at(self.ledger, self._snapshot_seq_no)
+        if actual != expected:
+            raise TokenSnapshotError('the token state was loaded from a snapshot with txn root {} at seq no {} '
+                                     'but the ledger has txn root {}'.format(expected, self._snapshot_seq_no, actual))
+
+    def pre_catchup(self):
+        snapshot_seq_no = self.utxo_cache.get_meta(self.SnapshotSeqNoMeta)
+        self._snapshot_seq_no = 0 if snapshot_seq_no is None else int(snapshot_seq_no)
+        # Txns which were added to the ledger but not applied before the node stopped
+        applied = self.utxo_cache.get_meta(self.AppliedSeqNoMeta)
+        if applied is not None and int(applied) < self.ledger.size:
+            logger.info('applying token txns {} to {} added to the ledger by an interrupted catch-up'.format(
+                int(applied) + 1, self.ledger.size))
+            for seq_no in range(int(applied) + 1, self.ledger.size + 1):
+                self.add_txn(self.ledger_id, self.ledger.getBySeqNo(seq_no))
+            self.flush()
+        self.utxo_cache.set_meta(self.AppliedSeqNoMeta, str(self.ledger.size), is_committed=True)
+
+    def add_txn(self, ledger_id: int, txn):
+        # Called for every txn added to the ledger in catch-up
+        if get_seq_no(txn) == self._snapshot_seq_no:
+            self._check_snapshot_txn_root()
+        self._txns.append(txn)
+        if len(self._txns) >= self.chunk_size:
+            self.flush()
+
+    def post_catchup(self):
+        self.flush()
+        self.utxo_cache.remove_meta(self.AppliedSeqNoMeta)
+        if self._snapshot_seq_no:
+            logger.error('token ledger caught up to seq no {} but the state was loaded from a snapshot at seq no {}'.format(
+                self.ledger.size, self._snapshot_seq_no))
+
+    def flush(self):
+        if not self._txns:
+            return
+        txns, self._txns = self._txns, []
+        with self.metrics.measure_time(TokenMetricsName.TOKEN_CATCHUP_CHUNK_TIME):
+            self._apply(txns)
+        logger.debug('applied {} token txns from catch-up, up to seq no {}'.format(len(txns), get_seq_no(txns[-1])))
+
+    def _apply(self, txns: List):
+        # Reverted unordered batches leave no uncommitted changes in the utxo cache, the chunk is then
+        # applied as an uncommitted batch and committed with one write batch
+        in_batch = not self.utxo_cache.un_committed and not self.utxo_cache.current_batch_ops
+        # The token ledger also holds txns of other plugins (the fees), each run of txns of one
+        # request handler is applied in ledger order
+        to_apply = [txn for txn in txns if get_seq_no(txn) > self._snapshot_seq_no]
+        for req_handler, run in groupby(to_apply, key=lambda txn: self.node.get_req_handler(txn_type=get_type(txn))):
+            if req_handler:
+                req_handler.updateState(list(run), isCommitted=not in_batch)
+        self.state.commit(rootHash=self.state.headHash)
+
+        last_seq_no = get_seq_no(txns[-1])
+        self.utxo_cache.set_meta(self.AppliedSeqNoMeta, str(last_seq_no), is_committed=not in_batch)
+        if in_batch:
+            self.utxo_cache.create_batch_from_current(self.state.committedHeadHash)
+            self.utxo_cache.commit_batch()
+        if self._snapshot_seq_no and last_seq_no >= self._snapshot_seq_no:
+            # The ledger caught up with the snapshot
+            self.utxo_cache.remove_meta(self.SnapshotSeqNoMeta)
+            self.utxo_cache.remove_meta(self.SnapshotTxnRootMeta)
+            self._snapshot_seq_no = 0
+        self.tracker.set_last_committed(self.state.committedHeadHash, last_seq_no)
+
+        self.node.updateSeqNoMap([txn for txn in txns if get_req_id(txn)], self.ledger_id)
+        for txn in txns:
+            self.node._clear_request_for_txn(self.ledger_id, txn)
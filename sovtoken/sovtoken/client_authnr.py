@@ -1,20 +1,24 @@
+from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
+from functools import lru_cache
 
 import base58
 from base58 import b58decode
 
-from common.serializers.serialization import serialize_msg_for_signing
+from common.serializers.serialization import signing_serializer
 from plenum.common.constants import TXN_TYPE
 from plenum.common.exceptions import (CouldNotAuthenticate,
                                       InsufficientCorrectSignatures,
                                       InvalidSignatureFormat)
+from plenum.common.metrics_collector import MetricsCollector, NullMetricsCollector, measure_time
 from plenum.common.types import OPERATION, PLUGIN_TYPE_AUTHENTICATOR, f
 from plenum.common.verifier import DidVerifier, Verifier
 from plenum.server.client_authn import CoreAuthNr
 from sovtoken import AcceptableQueryTypes, AcceptableWriteTypes
 from sovtoken.constants import (ADDRESS, INPUTS, MINT_PUBLIC, OUTPUTS, SIGS,
                                 XFER_PUBLIC)
-from sovtoken.util import address_to_verkey
+from sovtoken.metrics import TokenMetricsName
+from sovtoken.util import address_to_verkey, ADDRESS_CACHE_SIZE
 from stp_core.crypto.nacl_wrappers import Verifier as NaclVerifier
 
 
@@ -27,12 +31,27 @@ class AddressSigVerifier(Verifier):
         return self._vr.verify(sig, msg)
 
 
+@lru_cache(maxsize=ADDRESS_CACHE_SIZE)
+def get_verifier(verifier, verkey: str) -> Verifier:
+    # Verifiers are stateless, one is built per verkey (decoding the key) and reused
+    return verifier(verkey)
+
+
 class TokenAuthNr(CoreAuthNr):
     pluginType = PLUGIN_TYPE_AUTHENTICATOR
 
     write_types = AcceptableWriteTypes
     query_types = AcceptableQueryTypes
 
+    # Payments with at least this many inputs have their signatures verified in a thread
+    # pool, the nacl verification does not hold the GIL
+    ParallelVerificationThreshold = 16
+    _verification_pool = None
+
+    def __init__(self, state=None, metrics: MetricsCollector = NullMetricsCollector()):
+        super().__init__(state)
+        self.metrics = metrics
+
     # ------------------------------------------------------------------------------------
     # Entrance point for transaction signature verification. Here come all transactions of all types,
     # but only XFER_PUBLIC and MINT_PUBLIC are verified
@@ -52,7 +71,9 @@ class TokenAuthNr(CoreAuthNr):
     # If the check fails, it will raise InsufficientCorrectSignatures
     # The verkey will be unobtainable from input, it will raise CouldNotAuthenticate
     # Raises UnknownIdentifier if input is not a valid base58 value
+    @measure_time(TokenMetricsName.XFER_PUBLIC_AUTHENTICATE_TIME)
     def authenticate_xfer(self, req_data, verifier):
+        self.metrics.add_event(TokenMetricsName.SIGNATURE_VERIFICATIONS, len(req_data[OPERATION][SIGS]))
         return self.verify_signtures_on_payments(req_data[OPERATION][INPUTS],
                                                  req_data[OPERATION][OUTPUTS],
                                                  req_data[OPERATION][SIGS],
@@ -69,10 +90,19 @@ class TokenAuthNr(CoreAuthNr):
                 return vk
         return super().getVerkey(identifier)
 
+    @staticmethod
+    def _get_verification_pool() -> ThreadPoolExecutor:
+        if TokenAuthNr._verification_pool is None:
+            TokenAuthNr._verification_pool = ThreadPoolExecutor(thread_name_prefix='sig_verification')
+        return TokenAuthNr._verification_pool
+
     @staticmethod
     def verify_signtures_on_payments(inputs, outputs, signatures, verifier,
                                      *extra_fields_for_signing):
-        correct_sigs_from = []
+        # Each input signs `serialize_msg_for_signing([inp, outputs, *extra])`, that is the
+        # serialized items joined with ',', so the part after the input is serialized once
+        shared_part = None
+        checks = []
         for inp, sig in zip(inputs,
                             signatures):
             try:
@@ -81,18 +111,28 @@ class TokenAuthNr(CoreAuthNr):
                 raise InvalidSignatureFormat from ex
 
             # TODO: Account for `extra` field
-            new_data = [inp, outputs]
-            new_data.extend(extra_fields_for_signing)
             idr = inp[ADDRESS]
-            ser = serialize_msg_for_signing(new_data)
+            ser = signing_serializer.serialize(inp, level=1, toBytes=False)
+            if shared_part is None:
+                shared_part = ''.join(',' + signing_serializer.serialize(item, level=1, toBytes=False)
+                                      for item in [outputs, *extra_fields_for_signing])
+            ser = (ser + shared_part).encode('utf-8')
             try:
                 verkey = address_to_verkey(idr)
             except ValueError:
                 continue
 
-            vr = verifier(verkey)
-            if vr.verify(sig, ser):
-                correct_sigs_from.append(idr)
+            checks.append((idr, get_verifier(verifier, verkey), sig, ser))
+
+        def check(item):
+            _, vr, sig, ser = item
+            return vr.verify(sig, ser)
+
+        if len(checks) >= TokenAuthNr.ParallelVerificationThreshold:
+            results = TokenAuthNr._get_verification_pool().map(check, checks)
+        else:
+            results = map(check, checks)
+        correct_sigs_from = [item[0] for item, verified in zip(checks, results) if verified]
 
         if len(correct_sigs_from) != len(inputs):
             # All inputs should have signatures present
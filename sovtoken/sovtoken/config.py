@@ -1,4 +1,5 @@
 from plenum.common.constants import KeyValueStorageType
+from sovtoken.constants import UTXO_CACHE_LAYOUT_ADDRESS
 
 
 def get_config(config):
@@ -7,4 +8,60 @@ def get_config(config):
     config.tokenStateDbName = 'sovtoken_state'
     config.utxoCacheStorage = KeyValueStorageType.Rocksdb
     config.utxoCacheDbName = 'utxo_cache'
+    # `UTXO_CACHE_LAYOUT_ADDRESS` keeps all outputs of an address in one value,
+    # `UTXO_CACHE_LAYOUT_SHARDED` keeps each output under its own key
+    config.utxoCacheLayout = getattr(config, 'utxoCacheLayout', UTXO_CACHE_LAYOUT_ADDRESS)
+    # Keep a count/balance summary key per address, only used by the sharded layout
+    config.utxoCacheSummary = getattr(config, 'utxoCacheSummary', True)
+    # Number of addresses whose decoded outputs are kept in memory by the address layout, 0 disables it
+    config.utxoCacheLruSize = getattr(config, 'utxoCacheLruSize', 1000)
+    # Keep the outputs of each address ordered by amount for GET_UTXO_FOR_AMOUNT, only used by the
+    # address layout. It is built from the utxo cache on the first start with it enabled, without
+    # it the outputs are sorted for each query
+    config.utxoCacheAmountIndex = getattr(config, 'utxoCacheAmountIndex', False)
+    # Outputs with an amount below this are dust, with the amount index the number of dust outputs
+    # of all addresses is kept. Changing it recounts them on the next start, 0 disables the count
+    config.utxoCacheDustThreshold = getattr(config, 'utxoCacheDustThreshold', 0)
+    # Convert utxo cache values still in the legacy string format when the node starts
+    config.utxoCacheMigrateOnStartup = getattr(config, 'utxoCacheMigrateOnStartup', False)
+    # Rebuild the utxo cache from the token ledger when the node starts, ledgers with more txns
+    # than `utxoCacheRebuildInMemoryTxns` are aggregated through temporary files in the data dir
+    config.utxoCacheRebuildOnStartup = getattr(config, 'utxoCacheRebuildOnStartup', False)
+    config.utxoCacheRebuildInMemoryTxns = getattr(config, 'utxoCacheRebuildInMemoryTxns', 10000000)
+    # Report the latencies of the plugin hooks and request handlers, the utxo cache reads and
+    # writes, signature verifications and proof sizes to the node's metrics collector
+    config.tokenMetricsEnabled = getattr(config, 'tokenMetricsEnabled', False)
+    # Number of replies to GET_UTXO, GET_UTXOS, GET_BALANCE and GET_FEES queries kept for the
+    # committed state root, 0 disables the cache
+    config.tokenQueryReplyCacheSize = getattr(config, 'tokenQueryReplyCacheSize', 1000)
+    # Threads generating the state proofs of GET_UTXO and GET_FEES queries at the committed root,
+    # 0 (the default) answers them on the node's thread as before. At most `tokenQueryMaxPending`
+    # queries wait for them and the replies are sent every `tokenQueryServiceInterval` seconds
+    config.tokenQueryThreads = getattr(config, 'tokenQueryThreads', 0)
+    config.tokenQueryMaxPending = getattr(config, 'tokenQueryMaxPending', 64)
+    config.tokenQueryServiceInterval = getattr(config, 'tokenQueryServiceInterval', 0.01)
+    # Keep an index of the txn spending each output and the outputs created by each txn for
+    # GET_OUTPUT_AUDIT, it is built from the token ledger on the first start with it enabled
+    config.tokenAuditIndex = getattr(config, 'tokenAuditIndex', False)
+    # Keep the seq nos of the txns touching each address for GET_TXN_HISTORY, it is built from the
+    # token ledger on the first start with it enabled
+    config.tokenHistoryIndex = getattr(config, 'tokenHistoryIndex', False)
+    # Encoding of the seq no in token state keys, 2 pads it to a fixed width so outputs are read
+    # in seq no order without sorting them. The state is migrated when the node starts, all nodes
+    # of a pool have to change it together since their state roots differ otherwise
+    config.tokenStateKeyVersion = getattr(config, 'tokenStateKeyVersion', 1)
+    # Remove spent outputs from the token state instead of keeping them with an empty value, spent
+    # outputs kept before are removed when the node starts. All nodes of a pool have to enable it
+    # together since their state roots differ otherwise. Disabling it again needs the token state
+    # rebuilt from the ledger, outputs already removed are not written back
+    config.tokenCompactSpentOutputs = getattr(config, 'tokenCompactSpentOutputs', False)
+    # Number of token txns received in catch-up applied to the state and the utxo cache together
+    config.tokenCatchupChunkSize = getattr(config, 'tokenCatchupChunkSize', 1000)
+    # Take a snapshot of the token state and utxo cache every `tokenSnapshotInterval` token txns
+    # (0 disables them) in `tokenSnapshotsDirName` of the data dir, keeping the most recent ones
+    config.tokenSnapshotInterval = getattr(config, 'tokenSnapshotInterval', 0)
+    config.tokenSnapshotsDirName = getattr(config, 'tokenSnapshotsDirName', 'sovtoken_snapshots')
+    config.tokenSnapshotsToKeep = getattr(config, 'tokenSnapshotsToKeep', 2)
+    # Snapshot directory loaded when the token ledger catch-up first starts with an empty token state
+    config.tokenSnapshotBootstrap = getattr(config, 'tokenSnapshotBootstrap', None)
     return config
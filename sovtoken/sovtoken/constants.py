@@ -4,15 +4,39 @@ INPUTS = 'inputs'
 OUTPUTS = 'outputs'
 EXTRA = 'extra'
 ADDRESS = 'address'
+ADDRESSES = 'addresses'
 SIGS = 'signatures'
 RESULT = 'result'
 AMOUNT = 'amount'
 SEQNO = 'seqNo'
+BALANCE = 'balance'
+FROM_SEQNO = 'from'
+LIMIT = 'limit'
+NEXT_SEQNO = 'next'
+SPENT_BY = 'spentBy'
+SEQNOS = 'seqNos'
+WITH_TXNS = 'withTxns'
+TXNS = 'txns'
+FEE_TXN_TYPE = 'feeTxnType'
+FEE = 'fee'
 
 TOKEN_LEDGER_ID = 1001
 
 MINT_PUBLIC = TokenTransactions.MINT_PUBLIC.value
 XFER_PUBLIC = TokenTransactions.XFER_PUBLIC.value
 GET_UTXO = TokenTransactions.GET_UTXO.value
+GET_BALANCE = TokenTransactions.GET_BALANCE.value
+GET_UTXOS = TokenTransactions.GET_UTXOS.value
+GET_OUTPUT_AUDIT = TokenTransactions.GET_OUTPUT_AUDIT.value
+GET_TXN_HISTORY = TokenTransactions.GET_TXN_HISTORY.value
+GET_UTXO_FOR_AMOUNT = TokenTransactions.GET_UTXO_FOR_AMOUNT.value
 
-ACCEPTABLE_TXN_TYPES = (MINT_PUBLIC, XFER_PUBLIC, GET_UTXO)
\ No newline at end of file
+ACCEPTABLE_TXN_TYPES = (MINT_PUBLIC, XFER_PUBLIC, GET_UTXO, GET_BALANCE, GET_UTXOS, GET_OUTPUT_AUDIT,
+                        GET_TXN_HISTORY, GET_UTXO_FOR_AMOUNT)
+
+# Maximum number of addresses in a GET_UTXOS request
+MAX_ADDRESSES_PER_QUERY = 1000
+
+# Storage layouts of the utxo cache, see `sovtoken.storage.get_utxo_cache`
+UTXO_CACHE_LAYOUT_ADDRESS = 'address'
+UTXO_CACHE_LAYOUT_SHARDED = 'sharded'
\ No newline at end of file
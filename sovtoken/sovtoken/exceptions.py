@@ -32,5 +32,8 @@ class UTXOAddressNotFound(UTXONotFound):
 class UTXOAlreadySpentError(UTXOError):
     pass
 
+class TokenSnapshotError(Exception):
+    pass
+
 class TokenValueError(PlenumValueError):
     pass
\ No newline at end of file
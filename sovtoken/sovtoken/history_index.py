@@ -0,0 +1,173 @@
+"""
+Optional index of the seq nos of the token ledger txns touching each address, through an
+input or an output, so the history of an address is read without scanning the ledger. Like the
+audit index it is kept in reserved keys of the utxo cache, uncommitted appends are committed
+and rejected with the batches of the cache.
+
+    `#history:<address>` -> number of seq nos of the address
+    `#history:<address>:<n>` -> seq nos `n * CHUNK_SIZE` to `(n + 1) * CHUNK_SIZE - 1`
+
+Seq nos are only appended, in ledger order. A chunk holds the first seq no followed by the
+deltas to the next ones, each as an unsigned LEB128 varint, so most seq nos take a byte or
+two. Appending rewrites the last chunk only and a page is found by a binary search over the
+first seq nos of the chunks.
+"""
+from typing import Callable, Dict, List, Optional, Tuple
+
+from plenum.common.ledger import Ledger
+from plenum.common.txn_util import get_payload_data, get_seq_no
+from sovtoken.constants import INPUTS, OUTPUTS, ADDRESS
+from sovtoken.utxo_cache import UTXOCache
+from stp_core.common.log import getlogger
+
+logger = getlogger()
+
+
+def encode_seq_nos(seq_nos: List[int]) -> bytes:
+    encoded = bytearray()
+    previous = 0
+    for seq_no in seq_nos:
+        delta = seq_no - previous
+        previous = seq_no
+        while delta > 0x7f:
+            encoded.append((delta & 0x7f) | 0x80)
+            delta >>= 7
+        encoded.append(delta)
+    return bytes(encoded)
+
+
+def decode_seq_nos(data: bytes) -> List[int]:
+    seq_nos = []
+    previous = 0
+    delta = shift = 0
+    for byte in data:
+        delta |= (byte & 0x7f) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        previous += delta
+        seq_nos.append(previous)
+        delta = shift = 0
+    return seq_nos
+
+
+class HistoryIndex:
+    KEY_PREFIX = '#history:'
+    # Set once all committed txns of the ledger are indexed
+    INDEX_MARKER = 'history_index'
+    # Seq nos per chunk, an append rewrites at most this many
+    CHUNK_SIZE = 128
+
+    def __init__(self, utxo_cache: UTXOCache):
+        self.utxo_cache = utxo_cache
+
+    @classmethod
+    def _count_key(cls, address: str) -> str:
+        return '{}{}'.format(cls.KEY_PREFIX, address)
+
+    @classmethod
+    def _chunk_key(cls, address: str, n: int) -> str:
+        return '{}{}:{}'.format(cls.KEY_PREFIX, address, n)
+
+    @staticmethod
+    def _txn_addresses(txn) -> List[str]:
+        # Addresses of the inputs and outputs of the txn, each once
+        payload = get_payload_data(txn)
+        addresses = [i[ADDRESS] for i in payload.get(INPUTS, [])] + [o[ADDRESS] for o in payload.get(OUTPUTS, [])]
+        return list(dict.fromkeys(addresses))
+
+    def _read(self, key: str, is_committed=True):
+        try:
+            return self.utxo_cache.get(key, is_committed=is_committed)
+        except KeyError:
+            return None
+
+    @classmethod
+    def _append(cls, address: str, seq_no: int, read: Callable, write: Callable):
+        count = read(cls._count_key(address))
+        count = int(count) if count is not None else 0
+        n = count // cls.CHUNK_SIZE
+        seq_nos = decode_seq_nos(bytes(read(cls._chunk_key(address, n)))) if count % cls.CHUNK_SIZE else []
+        seq_nos.append(seq_no)
+        write(cls._chunk_key(address, n), encode_seq_nos(seq_nos))
+        write(cls._count_key(address), str(count + 1))
+
+    def add_txn(self, txn, is_committed=False):
+        seq_no = get_seq_no(txn)
+        for address in self._txn_addresses(txn):
+            self._append(address, seq_no,
+                         lambda key: self._read(key, is_committed=is_committed),
+                         lambda key, value: self.utxo_cache.set(key, value, is_committed=is_committed))
+
+    def get_count(self, address: str, is_committed=True) -> int:
+        count = self._read(self._count_key(address), is_committed=is_committed)
+        return int(count) if count is not None else 0
+
+    def _get_chunk(self, address: str, n: int, is_committed=True) -> List[int]:
+        return decode_seq_nos(bytes(self._read(self._chunk_key(address, n), is_committed=is_committed)))
+
+    def get_page(self, address: str, from_seq_no=0, limit=None,
+                 is_committed=True) -> Tuple[List[int], Optional[int]]:
+        """
+        Returns at most `limit` seq nos of txns touching the address starting from seq no
+        `from_seq_no`, and the seq no to continue from (None on the last page)
+        """
+        chunks = (self.get_count(address, is_committed=is_committed) + self.CHUNK_SIZE - 1) // self.CHUNK_SIZE
+        # The last chunk starting at or before `from_seq_no` holds the first seq no of the page
+        low, high = 0, chunks
+        while high - low > 1:
+            middle = (low + high) // 2
+            if self._get_chunk(address, middle, is_committed=is_committed)[0] <= from_seq_no:
+                low = middle
+            else:
+                high = middle
+
+        page = []
+        for n in range(low, chunks):
+            for seq_no in self._get_chunk(address, n, is_committed=is_committed):
+                if seq_no < from_seq_no:
+                    continue
+                if limit is not None and len(page) == limit:
+                    return page, seq_no
+                page.append(seq_no)
+        return page, None
+
+    def ensure_index(self, ledger: Ledger, chunk_size=1000) -> int:
+        """
+        Indexes the committed txns of the ledger applied before the index was enabled. Runs
+        once, later calls find the marker key and return immediately. Has to be called on
+        startup, before any batch is applied. The values changed by `chunk_size` txns are
+        written together.
+
+        :return: number of indexed txns
+        """
+        if self.utxo_cache.has_marker(self.INDEX_MARKER):
+            return 0
+
+        indexed = 0
+        # Values written for the txns of the current chunk, later appends of the chunk read them
+        written = {}  # type: Dict[str, object]
+        # Values left from an index disabled before are replaced, the history of an address
+        # starts over when it is first seen
+        seen = set()
+
+        def read(key):
+            return written[key] if key in written else self._read(key)
+
+        for _, txn in ledger.getAllTxn():
+            seq_no = get_seq_no(txn)
+            for address in self._txn_addresses(txn):
+                if address not in seen:
+                    seen.add(address)
+                    written[self._count_key(address)] = '0'
+                self._append(address, seq_no, read, written.__setitem__)
+            indexed += 1
+            if indexed % chunk_size == 0:
+                self.utxo_cache.set_committed_batch(list(written.items()))
+                written.clear()
+        if written:
+            self.utxo_cache.set_committed_batch(list(written.items()))
+        self.utxo_cache.set_marker(self.INDEX_MARKER)
+
+        logger.info('built history index for {} token txns'.format(indexed))
+        return indexed
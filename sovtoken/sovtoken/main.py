@@ -1,24 +1,66 @@
-import functools
+import os
+
 from plenum.common.constants import DOMAIN_LEDGER_ID, NodeHooks
+from sovtoken.audit_index import AuditIndex
+from sovtoken.catchup import TokenCatchupApplier
 from sovtoken.client_authnr import TokenAuthNr
 from sovtoken.config import get_config
 from sovtoken.constants import TOKEN_LEDGER_ID
+from sovtoken.exceptions import TokenSnapshotError
+from sovtoken.history_index import HistoryIndex
+from sovtoken.metrics import get_metrics
+from sovtoken.query_executor import QueryExecutor, process_queries_in_executor
+from sovtoken.snapshot import load_snapshot, TokenSnapshotter
 from sovtoken.storage import get_token_hash_store, \
     get_token_ledger, get_token_state, get_utxo_cache
 from sovtoken.token_req_handler import TokenReqHandler
+from sovtoken.utxo_cache import UTXOCache
+from sovtoken.utxo_cache_rebuild import rebuild_and_verify
+from stp_core.common.log import getlogger
+
+logger = getlogger()
 
 
 def integrate_plugin_in_node(node):
 
-    def postTxnAddedToLedgerClbk(node, *args, **kwargs):
-        node.postTxnFromCatchupAddedToLedger(*args, **kwargs)
-        tracker = token_req_handler.tracker
-        tracker.set_last_committed(state.committedHeadHash,
-                                   ledger.size)
+    def preCatchupStartClbk():
+        nonlocal bootstrap_snapshot
+        if bootstrap_snapshot and state.isEmpty:
+            load_bootstrap_snapshot(bootstrap_snapshot)
+        bootstrap_snapshot = None
+        catchup_applier.pre_catchup()
+
+    def postTxnAddedToLedgerClbk(ledger_id, txn):
+        catchup_applier.add_txn(ledger_id, txn)
+
+    def postCatchupCompleteClbk():
+        catchup_applier.post_catchup()
+
+    def load_bootstrap_snapshot(path):
+        # The pool ledger is caught up before the token ledger, so the multi-signature of the
+        # snapshot is verified with the BLS keys and the quorums of the current pool
+        try:
+            load_snapshot(path, ledger, state, utxo_cache,
+                          bls_bft=node.bls_bft, quorum=node.quorums.bls_signatures)
+        except TokenSnapshotError as ex:
+            logger.error('token snapshot {} is not loaded, the whole token ledger is caught up: {}'.format(path, ex))
+            return
+        prepare_state()
+
+    def prepare_state():
+        # Brings the committed token state to the configured layout, before any batch is applied
+        if node.config.tokenCompactSpentOutputs:
+            TokenReqHandler.compact_spent_outputs(state, utxo_cache)
+        else:
+            # Spent outputs are written to the state again, they are removed once it is enabled again
+            utxo_cache.remove_meta(TokenReqHandler.SpentOutputsCompactedMarker)
+        TokenReqHandler.migrate_state_keys(state, utxo_cache, node.config.tokenStateKeyVersion)
 
     node.config = get_config(node.config)
+    bootstrap_snapshot = node.config.tokenSnapshotBootstrap
 
-    token_authnr = TokenAuthNr(node.states[DOMAIN_LEDGER_ID])
+    metrics = get_metrics(node)
+    token_authnr = TokenAuthNr(node.states[DOMAIN_LEDGER_ID], metrics=metrics)
     hash_store = get_token_hash_store(node.dataLocation)
     ledger = get_token_ledger(node.dataLocation,
                               node.config.tokenTransactionsFile,
@@ -29,18 +71,69 @@ def integrate_plugin_in_node(node):
     utxo_cache = get_utxo_cache(node.dataLocation,
                                 node.config.utxoCacheDbName,
                                 node.config)
+    if node.config.utxoCacheRebuildOnStartup:
+        spill_dir = node.dataLocation if ledger.size > node.config.utxoCacheRebuildInMemoryTxns else None
+        rebuild_and_verify(ledger, state, utxo_cache, spill_dir=spill_dir)
+    if node.config.utxoCacheMigrateOnStartup:
+        utxo_cache.migrate_legacy_values()
+    utxo_cache.ensure_balance_index()
+    if utxo_cache.amount_index:
+        utxo_cache.ensure_amount_index()
+    else:
+        # Outputs changed while the index is disabled are not indexed, it is built again once enabled
+        utxo_cache.remove_meta(UTXOCache.AMOUNT_INDEX_MARKER)
+    utxo_cache.ensure_dust_count()
+    prepare_state()
+    if node.config.tokenAuditIndex:
+        audit_index = AuditIndex(utxo_cache)
+        audit_index.ensure_index(ledger)
+    else:
+        # Txns committed while the index is disabled are not indexed, it is built again once enabled
+        audit_index = None
+        utxo_cache.remove_meta(AuditIndex.INDEX_MARKER)
+    if node.config.tokenHistoryIndex:
+        history_index = HistoryIndex(utxo_cache)
+        history_index.ensure_index(ledger)
+    else:
+        history_index = None
+        utxo_cache.remove_meta(HistoryIndex.INDEX_MARKER)
 
     if TOKEN_LEDGER_ID not in node.ledger_ids:
         node.ledger_ids.append(TOKEN_LEDGER_ID)
 
     node.ledgerManager.addLedger(TOKEN_LEDGER_ID, ledger,
-                                 postTxnAddedToLedgerClbk=functools.partial(postTxnAddedToLedgerClbk, node))
+                                 preCatchupStartClbk=preCatchupStartClbk,
+                                 postCatchupCompleteClbk=postCatchupCompleteClbk,
+                                 postTxnAddedToLedgerClbk=postTxnAddedToLedgerClbk)
     node.on_new_ledger_added(TOKEN_LEDGER_ID)
     node.register_state(TOKEN_LEDGER_ID, state)
     node.clientAuthNr.register_authenticator(token_authnr)
 
+    query_executor = None
+    if node.config.tokenQueryThreads:
+        query_executor = QueryExecutor(node.config.tokenQueryThreads, node.config.tokenQueryMaxPending,
+                                       metrics=metrics)
     token_req_handler = TokenReqHandler(ledger, state, utxo_cache,
-                                        node.states[DOMAIN_LEDGER_ID], node.bls_bft.bls_store)
+                                        node.states[DOMAIN_LEDGER_ID], node.bls_bft.bls_store,
+                                        metrics=metrics, reply_cache_size=node.config.tokenQueryReplyCacheSize,
+                                        audit_index=audit_index, history_index=history_index,
+                                        remove_spent_outputs=node.config.tokenCompactSpentOutputs,
+                                        query_executor=query_executor,
+                                        state_key_version=node.config.tokenStateKeyVersion)
     node.register_req_handler(token_req_handler, TOKEN_LEDGER_ID)
+    catchup_applier = TokenCatchupApplier(node, TOKEN_LEDGER_ID, ledger, state, utxo_cache,
+                                          token_req_handler.tracker,
+                                          chunk_size=node.config.tokenCatchupChunkSize,
+                                          metrics=metrics)
+    if query_executor:
+        query_executor.serve(token_req_handler)
+        process_queries_in_executor(node, query_executor)
+        node.startRepeating(query_executor.service, node.config.tokenQueryServiceInterval)
+    if node.config.tokenSnapshotInterval:
+        snapshotter = TokenSnapshotter(os.path.join(node.dataLocation, node.config.tokenSnapshotsDirName),
+                                       node.config.tokenSnapshotInterval, ledger, state,
+                                       node.bls_bft.bls_store, keep=node.config.tokenSnapshotsToKeep,
+                                       metrics=metrics)
+        node.register_hook(NodeHooks.POST_BATCH_COMMITTED, snapshotter.post_batch_committed)
 
     return node
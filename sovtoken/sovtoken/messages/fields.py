@@ -43,24 +43,80 @@ class PublicOutputField(AnyMapField):
             return "amount -- " + amt_error
 
 
-# class PublicAddressesField(IterableField):
-#     def __init__(self, **kwargs):
-#         super().__init__(inner_field_type=PublicAddressField(), **kwargs)
+class PublicAddressesField(IterableField):
+    def __init__(self, **kwargs):
+        super().__init__(inner_field_type=PublicAddressField(), **kwargs)
 
 
-class PublicOutputsField(IterableField):
-    def __init__(self, **kwargs):
-        super().__init__(inner_field_type=PublicOutputField(), **kwargs)
+class _PaymentListField(IterableField):
+    """
+    Validates a list of inputs or outputs in a single pass: each element is checked, every
+    distinct address is validated once and uniqueness is tracked along the way. The errors are
+    the ones `IterableField` with the element field and a uniqueness check afterwards gives.
+    """
+    unique_error = None
+
+    def _check_length(self, val):
+        if self.min_length is not None:
+            if len(val) < self.min_length:
+                return 'length should be at least {}'.format(self.min_length)
+        if self.max_length is not None:
+            if len(val) > self.max_length:
+                return 'length should be at most {}'.format(self.max_length)
+
+    def _unique_key(self, item):
+        raise NotImplementedError
+
+    def _check_item(self, item, address_error):
+        raise NotImplementedError
 
     def _specific_validation(self, val):
-        error = super()._specific_validation(val)
+        error = self._check_length(val)
         if error:
             return error
 
-        if len(val) != len({a["address"] for a in val}):
-            error = 'Each output should contain unique address'
-        if error:
-            return error
+        address_errors = {}
+        seen = set()
+        for item in val:
+            if type(item) is not dict:
+                error = self.inner_field_type.validate(item)
+                if error:
+                    return error
+            address = item["address"]
+            try:
+                address_error = address_errors[address]
+            except KeyError:
+                address_error = address_errors[address] = \
+                    self.inner_field_type.public_address_field.validate(address)
+            except TypeError:
+                # Unhashable, not a valid address anyway
+                address_error = self.inner_field_type.public_address_field.validate(address)
+            error = self._check_item(item, address_error)
+            if error:
+                return error
+            seen.add(self._unique_key(item))
+
+        if len(seen) != len(val):
+            return self.unique_error
+
+
+class PublicOutputsField(_PaymentListField):
+    unique_error = 'Each output should contain unique address'
+
+    def __init__(self, **kwargs):
+        super().__init__(inner_field_type=PublicOutputField(), **kwargs)
+
+    def _unique_key(self, item):
+        return item["address"]
+
+    def _check_item(self, item, address_error):
+        if address_error:
+            return "address -- " + address_error
+        amount = item["amount"]
+        if type(amount) is not int or amount <= 0:
+            amt_error = self.inner_field_type.public_amount_field.validate(amount)
+            if amt_error:
+                return "amount -- " + amt_error
 
 
 class PublicInputField(AnyMapField):
@@ -80,16 +136,20 @@ class PublicInputField(AnyMapField):
             return "seqNo -- " + amt_error
 
 
-class PublicInputsField(IterableField):
+class PublicInputsField(_PaymentListField):
+    unique_error = 'Each input should be unique'
+
     def __init__(self, **kwargs):
         super().__init__(inner_field_type=PublicInputField(), **kwargs)
 
-    def _specific_validation(self, val):
-        error = super()._specific_validation(val)
-        if error:
-            return error
-
-        if len(val) != len({(a["address"], a["seqNo"]) for a in val}):
-            error = 'Each input should be unique'
-        if error:
-            return error
+    def _unique_key(self, item):
+        return item["address"], item["seqNo"]
+
+    def _check_item(self, item, address_error):
+        if address_error:
+            return "address -- " + address_error
+        seq_no = item["seqNo"]
+        if type(seq_no) is not int or seq_no < 1:
+            seq_no_error = self.inner_field_type.seq_no_field.validate(seq_no)
+            if seq_no_error:
+                return "seqNo -- " + seq_no_error
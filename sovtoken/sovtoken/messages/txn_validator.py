@@ -1,14 +1,22 @@
 from plenum.common.constants import TXN_TYPE
 from plenum.common.exceptions import InvalidClientRequest
-from plenum.common.messages.fields import IterableField
+from plenum.common.messages.fields import IterableField, NonNegativeNumberField, BooleanField, NonEmptyStringField
 from plenum.common.request import Request
 
-from sovtoken.constants import MINT_PUBLIC, XFER_PUBLIC, GET_UTXO, INPUTS, SIGS, ADDRESS, OUTPUTS
-from sovtoken.messages.fields import PublicOutputField, PublicOutputsField, PublicInputsField
+from sovtoken.constants import MINT_PUBLIC, XFER_PUBLIC, GET_UTXO, GET_BALANCE, GET_UTXOS, GET_OUTPUT_AUDIT, \
+    GET_TXN_HISTORY, GET_UTXO_FOR_AMOUNT, INPUTS, SIGS, ADDRESS, ADDRESSES, OUTPUTS, FROM_SEQNO, LIMIT, SEQNO, \
+    WITH_TXNS, AMOUNT, FEE_TXN_TYPE, MAX_ADDRESSES_PER_QUERY
+from sovtoken.messages.fields import PublicOutputField, PublicOutputsField, PublicInputsField, PublicAddressesField, \
+    PublicAmountField
 
 PUBLIC_OUTPUT_VALIDATOR = IterableField(PublicOutputField())
 PUBLIC_OUTPUTS_VALIDATOR = PublicOutputsField()
 PUBLIC_INPUTS_VALIDATOR = PublicInputsField()
+SEQNO_VALIDATOR = NonNegativeNumberField()
+PUBLIC_ADDRESSES_VALIDATOR = PublicAddressesField(min_length=1, max_length=MAX_ADDRESSES_PER_QUERY)
+WITH_TXNS_VALIDATOR = BooleanField()
+AMOUNT_VALIDATOR = PublicAmountField()
+FEE_TXN_TYPE_VALIDATOR = NonEmptyStringField()
 
 
 def outputs_validate(request: Request):
@@ -51,6 +59,22 @@ def address_validate(request: Request):
                                    request.reqId, error)
 
 
+def page_validate(request: Request):
+    operation = request.operation
+    error = None
+    for param in (FROM_SEQNO, LIMIT):
+        if param in operation:
+            error = SEQNO_VALIDATOR.validate(operation[param])
+            if error:
+                error = '{} {}'.format(param, error)
+                break
+    if not error and operation.get(LIMIT) == 0:
+        error = '{} must be positive'.format(LIMIT)
+    if error:
+        raise InvalidClientRequest(request.identifier,
+                                   request.reqId, error)
+
+
 def txn_mint_public_validate(request: Request):
     operation = request.operation
     if operation[TXN_TYPE] == MINT_PUBLIC:
@@ -77,4 +101,68 @@ def txn_xfer_public_validate(request: Request):
 def txt_get_utxo_validate(request: Request):
     operation = request.operation
     if operation[TXN_TYPE] == GET_UTXO:
+        address_validate(request)
+        return page_validate(request)
+
+
+def txn_get_balance_validate(request: Request):
+    operation = request.operation
+    if operation[TXN_TYPE] == GET_BALANCE:
         return address_validate(request)
+
+
+def txn_get_utxos_validate(request: Request):
+    operation = request.operation
+    if operation[TXN_TYPE] == GET_UTXOS:
+        if ADDRESSES not in operation:
+            error = '{} needs to be provided'.format(ADDRESSES)
+        else:
+            error = PUBLIC_ADDRESSES_VALIDATOR.validate(operation[ADDRESSES])
+        if error:
+            raise InvalidClientRequest(request.identifier,
+                                       request.reqId, error)
+
+
+def txn_get_output_audit_validate(request: Request):
+    operation = request.operation
+    if operation[TXN_TYPE] == GET_OUTPUT_AUDIT:
+        if SEQNO not in operation:
+            error = '{} needs to be provided'.format(SEQNO)
+        else:
+            error = SEQNO_VALIDATOR.validate(operation[SEQNO])
+        if error:
+            raise InvalidClientRequest(request.identifier,
+                                       request.reqId, error)
+        if ADDRESS in operation:
+            address_validate(request)
+
+
+def txn_get_txn_history_validate(request: Request):
+    operation = request.operation
+    if operation[TXN_TYPE] == GET_TXN_HISTORY:
+        address_validate(request)
+        page_validate(request)
+        if WITH_TXNS in operation:
+            error = WITH_TXNS_VALIDATOR.validate(operation[WITH_TXNS])
+            if error:
+                raise InvalidClientRequest(request.identifier,
+                                           request.reqId, '{} {}'.format(WITH_TXNS, error))
+
+
+def txn_get_utxo_for_amount_validate(request: Request):
+    operation = request.operation
+    if operation[TXN_TYPE] == GET_UTXO_FOR_AMOUNT:
+        address_validate(request)
+        if AMOUNT not in operation:
+            error = '{} needs to be provided'.format(AMOUNT)
+        else:
+            error = AMOUNT_VALIDATOR.validate(operation[AMOUNT])
+            if error:
+                error = '{} {}'.format(AMOUNT, error)
+        if not error and FEE_TXN_TYPE in operation:
+            error = FEE_TXN_TYPE_VALIDATOR.validate(operation[FEE_TXN_TYPE])
+            if error:
+                error = '{} {}'.format(FEE_TXN_TYPE, error)
+        if error:
+            raise InvalidClientRequest(request.identifier,
+                                       request.reqId, error)
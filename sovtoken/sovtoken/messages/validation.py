@@ -2,13 +2,21 @@ from plenum.common.constants import TXN_TYPE
 from plenum.common.exceptions import InvalidClientRequest
 from plenum.common.request import Request
 
-from sovtoken.constants import MINT_PUBLIC, XFER_PUBLIC, GET_UTXO, ACCEPTABLE_TXN_TYPES
-from sovtoken.messages.txn_validator import txn_mint_public_validate, txn_xfer_public_validate, txt_get_utxo_validate
+from sovtoken.constants import MINT_PUBLIC, XFER_PUBLIC, GET_UTXO, GET_BALANCE, GET_UTXOS, GET_OUTPUT_AUDIT, \
+    GET_TXN_HISTORY, GET_UTXO_FOR_AMOUNT, ACCEPTABLE_TXN_TYPES
+from sovtoken.messages.txn_validator import txn_mint_public_validate, txn_xfer_public_validate, txt_get_utxo_validate, \
+    txn_get_balance_validate, txn_get_utxos_validate, txn_get_output_audit_validate, txn_get_txn_history_validate, \
+    txn_get_utxo_for_amount_validate
 
 TXN_STATIC_VALIDATION_MAP = {
     MINT_PUBLIC: txn_mint_public_validate,
     XFER_PUBLIC: txn_xfer_public_validate,
-    GET_UTXO: txt_get_utxo_validate
+    GET_UTXO: txt_get_utxo_validate,
+    GET_BALANCE: txn_get_balance_validate,
+    GET_UTXOS: txn_get_utxos_validate,
+    GET_OUTPUT_AUDIT: txn_get_output_audit_validate,
+    GET_TXN_HISTORY: txn_get_txn_history_validate,
+    GET_UTXO_FOR_AMOUNT: txn_get_utxo_for_amount_validate
 }
 
 
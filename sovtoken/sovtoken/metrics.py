@@ -0,0 +1,109 @@
+"""
+Metrics of the token plugins. They are reported through the node's plenum metrics collector
+when `config.tokenMetricsEnabled` is set, so they are flushed and stored like the node's own
+metrics. Timings are in seconds and every event is accumulated by the collector (count, sum,
+min, max) between flushes.
+"""
+import struct
+from datetime import datetime
+from enum import IntEnum, unique
+from typing import Optional
+
+from plenum.common.metrics_collector import MetricsCollector, NullMetricsCollector, \
+    KvStoreMetricsFormat, MetricsEvent
+from plenum.common.value_accumulator import ValueAccumulator
+from sovtoken.constants import MINT_PUBLIC, XFER_PUBLIC, GET_UTXO, GET_BALANCE, GET_UTXOS, GET_OUTPUT_AUDIT, \
+    GET_TXN_HISTORY, GET_UTXO_FOR_AMOUNT
+
+# Plenum metric names are all below this value
+TOKEN_METRICS_BASE = 40000
+
+
+@unique
+class TokenMetricsName(IntEnum):
+    # Time spent in the fees hooks registered on the node and the master replica
+    FEES_CAN_PAY_TIME = TOKEN_METRICS_BASE + 1
+    FEES_DEDUCT_TIME = TOKEN_METRICS_BASE + 2
+    FEES_POST_BATCH_CREATED_TIME = TOKEN_METRICS_BASE + 3
+    FEES_POST_BATCH_COMMITTED_TIME = TOKEN_METRICS_BASE + 4
+    FEES_VERIFY_SIGNATURE_TIME = TOKEN_METRICS_BASE + 5
+    FEES_ADD_TO_PRE_PREPARE_TIME = TOKEN_METRICS_BASE + 6
+    FEES_CHECK_RECVD_PRE_PREPARE_TIME = TOKEN_METRICS_BASE + 7
+
+    # Time spent on token requests by txn type
+    MINT_PUBLIC_VALIDATE_TIME = TOKEN_METRICS_BASE + 100
+    XFER_PUBLIC_VALIDATE_TIME = TOKEN_METRICS_BASE + 101
+    XFER_PUBLIC_AUTHENTICATE_TIME = TOKEN_METRICS_BASE + 102
+    MINT_PUBLIC_UPDATE_STATE_TIME = TOKEN_METRICS_BASE + 110
+    XFER_PUBLIC_UPDATE_STATE_TIME = TOKEN_METRICS_BASE + 111
+    FEE_TXN_UPDATE_STATE_TIME = TOKEN_METRICS_BASE + 112
+    SET_FEES_UPDATE_STATE_TIME = TOKEN_METRICS_BASE + 113
+    # Writing the collected changes of an `updateState` call to the state and the utxo cache
+    TOKEN_UPDATE_STATE_FLUSH_TIME = TOKEN_METRICS_BASE + 114
+    GET_UTXO_TIME = TOKEN_METRICS_BASE + 120
+    GET_BALANCE_TIME = TOKEN_METRICS_BASE + 121
+    GET_UTXOS_TIME = TOKEN_METRICS_BASE + 122
+    GET_FEES_TIME = TOKEN_METRICS_BASE + 123
+    GET_OUTPUT_AUDIT_TIME = TOKEN_METRICS_BASE + 124
+    GET_TXN_HISTORY_TIME = TOKEN_METRICS_BASE + 125
+    GET_UTXO_FOR_AMOUNT_TIME = TOKEN_METRICS_BASE + 126
+    TOKEN_BATCH_CREATED_TIME = TOKEN_METRICS_BASE + 130
+    TOKEN_BATCH_COMMITTED_TIME = TOKEN_METRICS_BASE + 131
+    # Applying a chunk of token txns received in catch-up
+    TOKEN_CATCHUP_CHUNK_TIME = TOKEN_METRICS_BASE + 132
+    # Taking a snapshot of the token state and utxo cache
+    TOKEN_SNAPSHOT_TIME = TOKEN_METRICS_BASE + 133
+
+    # Counters, one event per batch (cache) or per request
+    UTXO_CACHE_READS = TOKEN_METRICS_BASE + 200
+    UTXO_CACHE_WRITES = TOKEN_METRICS_BASE + 201
+    SIGNATURE_VERIFICATIONS = TOKEN_METRICS_BASE + 202
+    # Size in bytes of the serialized proof nodes of a reply
+    STATE_PROOF_SIZE = TOKEN_METRICS_BASE + 203
+    # 1 for a query answered from the reply cache and 0 otherwise, the average is the hit rate
+    QUERY_REPLY_CACHE_HIT = TOKEN_METRICS_BASE + 204
+
+
+VALIDATE_TIME = {
+    MINT_PUBLIC: TokenMetricsName.MINT_PUBLIC_VALIDATE_TIME,
+    XFER_PUBLIC: TokenMetricsName.XFER_PUBLIC_VALIDATE_TIME,
+}
+
+UPDATE_STATE_TIME = {
+    MINT_PUBLIC: TokenMetricsName.MINT_PUBLIC_UPDATE_STATE_TIME,
+    XFER_PUBLIC: TokenMetricsName.XFER_PUBLIC_UPDATE_STATE_TIME,
+}
+
+QUERY_TIME = {
+    GET_UTXO: TokenMetricsName.GET_UTXO_TIME,
+    GET_BALANCE: TokenMetricsName.GET_BALANCE_TIME,
+    GET_UTXOS: TokenMetricsName.GET_UTXOS_TIME,
+    GET_OUTPUT_AUDIT: TokenMetricsName.GET_OUTPUT_AUDIT_TIME,
+    GET_TXN_HISTORY: TokenMetricsName.GET_TXN_HISTORY_TIME,
+    GET_UTXO_FOR_AMOUNT: TokenMetricsName.GET_UTXO_FOR_AMOUNT_TIME,
+}
+
+
+def get_metrics(node) -> MetricsCollector:
+    # The collector the plugins report to, the node's one only when enabled in the config
+    if getattr(node.config, 'tokenMetricsEnabled', False):
+        return node.metrics
+    return NullMetricsCollector()
+
+
+def decode_metrics_event(key: bytes, value: bytes) -> Optional[MetricsEvent]:
+    """
+    Same as `KvStoreMetricsFormat.decode` but also knows the token metric names, which
+    plenum skips when reading the metrics store
+    """
+    event = KvStoreMetricsFormat.decode(key, value)
+    if event is not None:
+        return event
+    name = int.from_bytes(value[:32], byteorder='big', signed=False)
+    if name not in TokenMetricsName.__members__.values():
+        return None
+    key = int.from_bytes(key, byteorder='big', signed=False)
+    ts = datetime.utcfromtimestamp((key >> KvStoreMetricsFormat.seq_bits) / 1000000.0)
+    data = value[32:]
+    value = struct.unpack('d', data)[0] if len(data) == 8 else ValueAccumulator.from_bytes(data)
+    return MetricsEvent(ts, TokenMetricsName(name), value)
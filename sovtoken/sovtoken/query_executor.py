@@ -0,0 +1,119 @@
+"""
+Runs the state proof generation of read queries in a thread pool instead of the node's event
+loop, so a burst of GET_UTXO or GET_FEES for big addresses does not hold up 3PC.
+
+A request handler registered with `serve` implements `get_query_response_async(request,
+executor, send_reply)`. On the node's thread it takes a `TrieView` of the committed root and
+reads the multi-signature of the root, then submits a job which only reads the view: nodes are
+stored under their hash and never removed, so the job sees an immutable view of the committed
+state while batches are applied, and records the nodes of its proof in the view. Replies are
+handed back to the node's thread by `service`, which the node runs repeatedly; the reply cache,
+the bls store and the metrics are only touched there.
+"""
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+from plenum.common.constants import TXN_TYPE, STATE_PROOF, PROOF_NODES
+from plenum.common.messages.node_messages import Reply
+from plenum.common.metrics_collector import MetricsCollector, NullMetricsCollector
+from plenum.common.request import Request
+from sovtoken.metrics import TokenMetricsName
+from sovtoken.query_reply_cache import QueryReplyCache
+from stp_core.common.log import getlogger
+
+logger = getlogger()
+
+
+class QueryExecutor:
+    def __init__(self, max_workers: int, max_pending: int,
+                 metrics: MetricsCollector = NullMetricsCollector()):
+        # At most `max_pending` queries are submitted and not yet delivered, above that queries
+        # are answered on the node's thread
+        self.max_pending = max_pending
+        self.metrics = metrics
+        self._pool = ThreadPoolExecutor(max_workers=max_workers)
+        self._pending = 0
+        # Finished jobs, appended by the pool threads
+        self._done = deque()
+        # Request handlers whose queries are answered through the executor
+        self.handlers = []
+
+    def serve(self, handler):
+        # `handler` implements `get_query_response_async`
+        if handler not in self.handlers:
+            self.handlers.append(handler)
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def run_query(self, request: Request, root_hash: bytes, job: Callable[[], dict],
+                  reply_cache: QueryReplyCache, send_reply: Callable[[dict], None]) -> bool:
+        """
+        Submits `job` making the reply to the query at the committed `root_hash`, the reply is
+        cached and passed to `send_reply` by `service`.
+
+        :return: False if the query was not submitted since its reply is cached or too many
+        queries are pending, it has to be answered on the node's thread then
+        """
+        if self._pending >= self.max_pending or reply_cache.has_reply(request, root_hash):
+            return False
+
+        def deliver(result: dict):
+            reply_cache.put(request, root_hash, result)
+            send_reply(result)
+
+        self._pending += 1
+        future = self._pool.submit(job)
+        future.add_done_callback(lambda f: self._done.append((request, f, deliver)))
+        return True
+
+    def service(self) -> int:
+        """
+        Delivers the replies of finished jobs, called on the node's thread
+
+        :return: number of delivered replies
+        """
+        count = 0
+        while self._done:
+            request, future, deliver = self._done.popleft()
+            self._pending -= 1
+            try:
+                result = future.result()
+            except Exception as ex:
+                logger.error('failed to answer query {} of {}: {}'.format(
+                    request.operation.get(TXN_TYPE), request.key, ex))
+                continue
+            if STATE_PROOF in result:
+                self.metrics.add_event(TokenMetricsName.STATE_PROOF_SIZE, len(result[STATE_PROOF][PROOF_NODES]))
+            deliver(result)
+            count += 1
+        return count
+
+    def stop(self):
+        self._pool.shutdown(wait=False)
+
+
+def process_queries_in_executor(node, executor: QueryExecutor):
+    """
+    Makes the node answer the queries of the request handlers served by `executor` through
+    it, the other ones as before
+    """
+    process_query = node.process_query
+
+    def process_query_in_executor(request: Request, frm: str):
+        handler = node.get_req_handler(txn_type=request.operation[TXN_TYPE])
+        if handler not in executor.handlers:
+            return process_query(request, frm)
+        # Same as `Node.process_query`
+        try:
+            handler.doStaticValidation(request)
+            node.send_ack_to_client((request.identifier, request.reqId), frm)
+        except Exception as ex:
+            node.send_nack_to_client((request.identifier, request.reqId), str(ex), frm)
+        if not handler.get_query_response_async(request, executor,
+                                                lambda result: node.transmitToClient(Reply(result), frm)):
+            node.transmitToClient(Reply(handler.get_query_response(request)), frm)
+
+    node.process_query = process_query_in_executor
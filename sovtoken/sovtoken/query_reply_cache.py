@@ -0,0 +1,94 @@
+"""
+Replies of the read queries of a request handler, kept for the committed state root they were
+made at. Clients send the same queries again and again between batches, a cached reply saves
+generating its state proof. All replies are dropped once the committed root changes.
+"""
+import json
+from collections import OrderedDict
+from typing import Callable
+
+from plenum.common.metrics_collector import MetricsCollector, NullMetricsCollector
+from plenum.common.request import Request
+from plenum.common.types import f
+from plenum.common.constants import STATE_PROOF, TXN_TYPE
+from sovtoken.metrics import TokenMetricsName
+
+
+class QueryReplyCache:
+    def __init__(self, size: int, proof_types=frozenset(),
+                 metrics: MetricsCollector = NullMetricsCollector()):
+        # At most `size` replies are kept, caching is off when it is 0. Replies to queries of
+        # `proof_types` without a state proof are not kept, the multi-signature of the root
+        # can be stored later
+        self.size = size
+        self.proof_types = proof_types
+        self.metrics = metrics
+        self._root_hash = None
+        self._replies = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def stats(self) -> dict:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._replies),
+        }
+
+    @staticmethod
+    def _key(request: Request) -> str:
+        # Identical queries only differ in the identifier and req id of the request
+        return json.dumps(request.operation, sort_keys=True)
+
+    def _use_root(self, root_hash: bytes):
+        if root_hash != self._root_hash:
+            self._replies.clear()
+            self._root_hash = root_hash
+
+    def has_reply(self, request: Request, root_hash: bytes) -> bool:
+        if not self.size:
+            return False
+        self._use_root(root_hash)
+        return self._key(request) in self._replies
+
+    def put(self, request: Request, root_hash: bytes, result: dict):
+        """
+        Keeps the reply to the query at the committed `root_hash`, it is dropped if the
+        committed root changed in between
+        """
+        if not self.size or (self._root_hash is not None and root_hash != self._root_hash):
+            return
+        self._use_root(root_hash)
+        if STATE_PROOF in result or request.operation.get(TXN_TYPE) not in self.proof_types:
+            key = self._key(request)
+            self._replies[key] = dict(result)
+            self._replies.move_to_end(key)
+            if len(self._replies) > self.size:
+                self._replies.popitem(last=False)
+
+    def get_reply(self, request: Request, root_hash: bytes, make_reply: Callable[[Request], dict]) -> dict:
+        """
+        Returns the reply to the query at the committed `root_hash`, made by `make_reply` if
+        it is not cached
+        """
+        if not self.size:
+            return make_reply(request)
+        self._use_root(root_hash)
+
+        key = self._key(request)
+        cached = self._replies.get(key)
+        if cached is not None:
+            self._replies.move_to_end(key)
+            self.hits += 1
+            self.metrics.add_event(TokenMetricsName.QUERY_REPLY_CACHE_HIT, 1)
+            result = dict(cached)
+            result[f.IDENTIFIER.nm] = request.identifier
+            result[f.REQ_ID.nm] = request.reqId
+            return result
+
+        self.misses += 1
+        self.metrics.add_event(TokenMetricsName.QUERY_REPLY_CACHE_HIT, 0)
+        result = make_reply(request)
+        self.put(request, root_hash, result)
+        return result
@@ -0,0 +1,252 @@
+import struct
+from typing import List, Tuple, Optional, Iterator
+
+from sovtoken.exceptions import UTXONotFound, UTXOError
+from sovtoken.types import Output
+from sovtoken.util import iterate_prefix
+from sovtoken.utxo_cache import UTXOCache
+from storage.kv_store import KeyValueStorage
+from stp_core.common.log import getlogger
+
+logger = getlogger()
+
+
+class ShardedUTXOCache(UTXOCache):
+    """
+    A `UTXOCache` storing every unspent output under its own key, so adding or spending an
+    output costs the same no matter how many outputs the address holds.
+
+    The key values look like this
+        `<address>:<seq no> -> <amount>`
+        `<address> -> <count>:<balance>` (optional summary of the address)
+
+    The seq no is an unsigned 64 bit big-endian integer so a prefix iteration over
+    `<address>:` returns the outputs of the address ordered by seq no. Spent outputs are
+    deleted; while a batch is uncommitted they are marked with an empty value.
+    """
+    SEPARATOR = b':'
+    SPENT = b''
+    _SEQ_NO = struct.Struct('>Q')
+
+    def __init__(self, kv_store: KeyValueStorage, with_summary=True):
+        super().__init__(kv_store)
+        self.with_summary = with_summary
+
+    @classmethod
+    def _output_prefix(cls, address: str) -> bytes:
+        return address.encode() + cls.SEPARATOR
+
+    @classmethod
+    def _output_key(cls, address: str, seq_no: int) -> bytes:
+        try:
+            return cls._output_prefix(address) + cls._SEQ_NO.pack(seq_no)
+        except struct.error:
+            raise UTXOError("Invalid seq_no {}".format(seq_no))
+
+    @classmethod
+    def _parse_output_key(cls, key: bytes) -> Tuple[str, int]:
+        address, seq_no = key[:-cls._SEQ_NO.size - 1], key[-cls._SEQ_NO.size:]
+        return address.decode(), cls._SEQ_NO.unpack(seq_no)[0]
+
+    @staticmethod
+    def _summary_key(address: str) -> bytes:
+        return address.encode()
+
+    def _get_value(self, key: bytes, is_committed=False):
+        value = self.get(key, is_committed=is_committed)
+        if value == self.SPENT:
+            raise KeyError(key)
+        return value
+
+    def _remove_value(self, key: bytes, is_committed=False):
+        if is_committed:
+            self._store.remove(key)
+        else:
+            self.set(key, self.SPENT, is_committed=False)
+
+    def get_summary(self, address: str, is_committed=False) -> Tuple[int, int]:
+        # Returns the number of unspent outputs and their total amount for the address
+        if not self.with_summary:
+            outputs = self.get_unspent_outputs(address, is_committed=is_committed)
+            return len(outputs), sum(o.amount for o in outputs)
+        try:
+            value = self._get_value(self._summary_key(address), is_committed=is_committed)
+        except KeyError:
+            return 0, 0
+        count, balance = bytes(value).split(self.SEPARATOR)
+        return int(count), int(balance)
+
+    def get_balance(self, address: str, is_committed=False) -> int:
+        return self.get_summary(address, is_committed=is_committed)[1]
+
+    def ensure_balance_index(self) -> int:
+        # The summary key is the balance index of this layout
+        return 0
+
+    def _update_summary(self, address: str, count_delta: int, amount_delta: int, is_committed=False):
+        if not self.with_summary:
+            return
+        count, balance = self.get_summary(address, is_committed=is_committed)
+        count += count_delta
+        balance += amount_delta
+        key = self._summary_key(address)
+        if count == 0:
+            self._remove_value(key, is_committed=is_committed)
+        else:
+            self.set(key, '{}:{}'.format(count, balance).encode(), is_committed=is_committed)
+
+    def add_output(self, output: Output, is_committed=False):
+        UTXOCache._is_valid_output(output)
+        if not isinstance(output.seqNo, int) or not isinstance(output.amount, int):
+            raise UTXOError("Adding invalid types -- seqNo:{} amount:{}".format(output.seqNo, output.amount))
+
+        logger.debug('adding new output: output:{}'.format(str(output)))
+
+        key = self._output_key(output.address, output.seqNo)
+        count_delta, amount_delta = 1, output.amount
+        if self.with_summary:
+            try:
+                # The same output can be re-applied (e.g. replaying a txn)
+                previous = int(self._get_value(key, is_committed=is_committed))
+                count_delta, amount_delta = 0, output.amount - previous
+            except KeyError:
+                pass
+
+        self.set(key, str(output.amount).encode(), is_committed=is_committed)
+        self._update_summary(output.address, count_delta, amount_delta, is_committed=is_committed)
+
+    def spend_output(self, output: Output, is_committed=False):
+        UTXOCache._is_valid_output(output)
+
+        logger.debug('spending output -- output:{}'.format(str(output)))
+
+        key = self._output_key(output.address, output.seqNo)
+        try:
+            amount = int(self._get_value(key, is_committed=is_committed))
+        except KeyError:
+            raise UTXONotFound("seq_no {} is not found for address {}".format(output.seqNo, output.address))
+
+        self._remove_value(key, is_committed=is_committed)
+        self._update_summary(output.address, -1, -amount, is_committed=is_committed)
+
+    def update_outputs(self, address: str, changes: List[Tuple[int, Optional[int]]], is_committed=False):
+        # Every output has its own key anyway, only the summary is written once
+        logger.debug('updating {} outputs of address {}'.format(len(changes), address))
+
+        count_delta = amount_delta = 0
+        for seq_no, amount in changes:
+            key = self._output_key(address, seq_no)
+            if amount is None:
+                try:
+                    previous = int(self._get_value(key, is_committed=is_committed))
+                except KeyError:
+                    raise UTXONotFound("seq_no {} is not found for address {}".format(seq_no, address))
+                self._remove_value(key, is_committed=is_committed)
+                count_delta, amount_delta = count_delta - 1, amount_delta - previous
+                continue
+
+            if not isinstance(seq_no, int) or not isinstance(amount, int):
+                raise UTXOError("Adding invalid types -- seqNo:{} amount:{}".format(seq_no, amount))
+            previous = None
+            if self.with_summary:
+                try:
+                    previous = int(self._get_value(key, is_committed=is_committed))
+                except KeyError:
+                    pass
+            self.set(key, str(amount).encode(), is_committed=is_committed)
+            if previous is None:
+                count_delta, amount_delta = count_delta + 1, amount_delta + amount
+            else:
+                amount_delta += amount - previous
+
+        self._update_summary(address, count_delta, amount_delta, is_committed=is_committed)
+
+    def _uncommitted_ops(self):
+        # All uncommitted writes, oldest first
+        for _, ops in self.un_committed:
+            yield from ops.items()
+        yield from self.current_batch_ops
+
+    def get_unspent_outputs(self, address: str,
+                            is_committed=False) -> List[Output]:
+        prefix = self._output_prefix(address)
+        items = dict(iterate_prefix(self._store, prefix))
+        if not is_committed:
+            overlay = {k: v for k, v in self._uncommitted_ops()
+                       if isinstance(k, bytes) and k.startswith(prefix)}
+            if overlay:
+                items.update(overlay)
+                items = {k: items[k] for k in sorted(items)}
+
+        rtn = []
+        for key, value in items.items():
+            if value == self.SPENT:
+                continue
+            addr, seq_no = self._parse_output_key(key)
+            rtn.append(Output(addr, seq_no, int(value)))
+        return rtn
+
+    def get_unspent_outputs_page(self, address: str, from_seq_no=0, limit=None,
+                                 is_committed=False) -> Tuple[List[Output], Optional[int]]:
+        if is_committed:
+            # Committed outputs are read straight from the store, stopping after the page
+            start = self._output_key(address, max(from_seq_no, 0))
+            outputs = (Output(address, self._parse_output_key(key)[1], int(value))
+                       for key, value in iterate_prefix(self._store, self._output_prefix(address), start=start))
+        else:
+            outputs = (o for o in self.get_unspent_outputs(address) if o.seqNo >= from_seq_no)
+
+        page = []
+        for output in outputs:
+            if limit is not None and len(page) == limit:
+                return page, output.seqNo
+            page.append(output)
+        return page, None
+
+    def sum_inputs(self, inputs: list, is_committed=False):
+        keys = {(inp["address"], inp["seqNo"]) for inp in inputs}
+
+        output_val = 0
+        for address, seq_no in keys:
+            try:
+                output_val += int(self._get_value(self._output_key(address, seq_no),
+                                                  is_committed=is_committed))
+            except KeyError:
+                raise UTXONotFound("seq_no {} is not found for address {}".format(seq_no, address))
+
+        return output_val
+
+    def commit_batch(self):
+        # Same as `OptimisticKVStore.commit_batch` but spent outputs are deleted from the store
+        if not self.un_committed:
+            raise ValueError
+        batch_idr, ops = self.un_committed[0]
+        self._store.setBatch([(k, v) for k, v in ops.items() if v != self.SPENT])
+        for key in [k for k, v in ops.items() if v == self.SPENT]:
+            try:
+                self._store.remove(key)
+            except KeyError:
+                pass
+        self.un_committed = self.un_committed[1:]
+        return batch_idr
+
+    def _address_records(self, address: str, seq_nos: List[int], amounts: List[int]) -> List[Tuple]:
+        records = [(self._output_key(address, seq_no), str(amount).encode())
+                   for seq_no, amount in zip(seq_nos, amounts)]
+        if self.with_summary and seq_nos:
+            records.append((self._summary_key(address), '{}:{}'.format(len(seq_nos), sum(amounts)).encode()))
+        return records
+
+    def iter_committed_outputs(self) -> Iterator[Output]:
+        for key, value in self._store.iterator(include_value=True):
+            key = bytes(key)
+            # Addresses have no separator, so only output keys have it before the seq no
+            if key.startswith(self.RESERVED_KEY_MARK.encode()) or \
+                    key[-self._SEQ_NO.size - 1:-self._SEQ_NO.size] != self.SEPARATOR:
+                continue
+            address, seq_no = self._parse_output_key(key)
+            yield Output(address, seq_no, int(value))
+
+    def migrate_legacy_values(self, chunk_size=1000) -> int:
+        # Outputs are stored individually, there is no legacy per address value to convert
+        return 0
@@ -0,0 +1,387 @@
+"""
+Snapshots of the committed token state, so a new node can load it instead of applying the whole
+token ledger. A snapshot is a directory named after the size of the ledger it was taken at
+
+    <ledger size>/
+        manifest.json  ledger size, txn root, state root, its BLS multi-signature and the
+                       sha256 of the state file
+        state          the trie nodes reachable from the state root
+
+Nothing in a snapshot is trusted but the multi-signature of the pool. It has to be over the
+state root and txn root of the manifest and is verified with the BLS keys of the pool. Trie
+nodes are stored under the hash of their encoding, so loaded nodes are checked against the
+state root by construction, and all nodes reachable from the root have to be there. The utxo
+cache is built from the loaded state, the digest only detects a corrupted state file early.
+
+Nodes take a snapshot every `tokenSnapshotInterval` token txns, once the committed state root
+has a multi-signature, and write it in a background thread. A node with an empty token state
+loads the snapshot given in `tokenSnapshotBootstrap` when the catch-up of the token ledger
+starts, once the pool ledger is caught up and the BLS keys of the pool are known. The txns after
+the snapshot are then applied in that catch-up, see `TokenCatchupApplier`. Offline, with the
+node stopped
+
+    python -m sovtoken.snapshot create --data-dir <node data dir> --snapshots-dir <dir>
+    python -m sovtoken.snapshot load --data-dir <node data dir> --snapshot <snapshot dir> --no-verify-signature
+
+The pool keys are not available offline, so the multi-signature of snapshots loaded that way is
+not verified, only load snapshots taken by a trusted node.
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import struct
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Iterator, Optional
+
+from common.serializers.serialization import state_roots_serializer
+from crypto.bls.bls_bft import BlsBft
+from crypto.bls.bls_multi_signature import MultiSignature
+from plenum.common.config_util import getConfig
+from plenum.common.metrics_collector import MetricsCollector, NullMetricsCollector, measure_time
+from plenum.server.quorums import Quorum
+from sovtoken.catchup import TokenCatchupApplier
+from sovtoken.config import get_config
+from sovtoken.constants import TOKEN_LEDGER_ID
+from sovtoken.exceptions import TokenSnapshotError
+from sovtoken.metrics import TokenMetricsName
+from sovtoken.storage import get_token_hash_store, get_token_ledger, get_token_state, get_utxo_cache
+from sovtoken.token_req_handler import TokenReqHandler
+from sovtoken.utxo_cache import UTXOCache
+from sovtoken.utxo_cache_rebuild import collect_state_outputs
+from state.pruning_state import PruningState
+from state.trie.pruning_trie import BLANK_NODE, BLANK_ROOT, NODE_TYPE_BRANCH, NODE_TYPE_EXTENSION, Trie, \
+    rlp_decode
+from state.util.utils import sha3
+from stp_core.common.log import getlogger
+
+logger = getlogger()
+
+# Version 1 snapshots also had the unspent outputs, they are built from the state now
+SNAPSHOT_VERSION = 2
+MANIFEST_FILE = 'manifest.json'
+STATE_FILE = 'state'
+_LENGTH = struct.Struct('>I')
+
+
+def _child_hashes(node) -> Iterator[bytes]:
+    # Hashes of the nodes referenced by a decoded node, nodes shorter than 32 bytes are embedded
+    node_type = Trie._get_node_type(node)
+    if node_type == NODE_TYPE_BRANCH:
+        children = node[:16]
+    elif node_type == NODE_TYPE_EXTENSION:
+        children = [node[1]]
+    else:
+        return
+    for child in children:
+        if child == BLANK_NODE:
+            continue
+        if isinstance(child, list):
+            yield from _child_hashes(child)
+        else:
+            yield bytes(child)
+
+
+def iter_trie_nodes(state: PruningState, root_hash: bytes) -> Iterator[bytes]:
+    # Yields the encoding of every node reachable from `root_hash`
+    if root_hash == BLANK_ROOT:
+        return
+    db = state._trie._db
+    pending = [root_hash]
+    seen = set()
+    while pending:
+        node_hash = pending.pop()
+        if node_hash in seen:
+            continue
+        seen.add(node_hash)
+        encoded = bytes(db.get(node_hash))
+        yield encoded
+        pending.extend(_child_hashes(rlp_decode(encoded)))
+
+
+def _write_file(path, chunks: Iterator[bytes]) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'wb') as f:
+        for chunk in chunks:
+            f.write(chunk)
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _file_digest(path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _read_nodes(path) -> Iterator[bytes]:
+    with open(path, 'rb') as f:
+        while True:
+            length = f.read(_LENGTH.size)
+            if not length:
+                return
+            yield f.read(_LENGTH.unpack(length)[0])
+
+
+def list_snapshots(snapshots_dir) -> list:
+    # Ledger sizes of the complete snapshots in the directory, ascending
+    if not os.path.isdir(snapshots_dir):
+        return []
+    return sorted(int(name) for name in os.listdir(snapshots_dir)
+                  if name.isdigit() and os.path.exists(os.path.join(snapshots_dir, name, MANIFEST_FILE)))
+
+
+def create_snapshot(snapshots_dir, ledger, state: PruningState, bls_store=None, keep: Optional[int] = None) -> str:
+    """
+    Writes a snapshot of the committed token state, which must be at the same point as the
+    committed ledger. Only the `keep` most recent snapshots are kept if given.
+
+    :return: the directory of the snapshot
+    """
+    state_root = bytes(state.committedHeadHash)
+    multi_sig = bls_store.get(state_roots_serializer.serialize(state_root)) if bls_store else None
+    return write_snapshot(snapshots_dir, ledger.size, ledger.root_hash, state, state_root, multi_sig, keep=keep)
+
+
+def write_snapshot(snapshots_dir, seq_no: int, txn_root: str, state: PruningState, state_root: bytes,
+                   multi_sig: Optional[MultiSignature], keep: Optional[int] = None) -> str:
+    """
+    Writes the snapshot of the state at `state_root`, the state of the ledger at `seq_no` with
+    `txn_root`. Only reads the trie nodes of the root, which are never removed, so it can run
+    outside the node's thread while batches are committed.
+
+    :return: the directory of the snapshot
+    """
+    path = os.path.join(snapshots_dir, str(seq_no))
+    if os.path.exists(path):
+        return path
+
+    encoded_root = state_roots_serializer.serialize(state_root)
+    os.makedirs(snapshots_dir, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(dir=snapshots_dir, prefix='.tmp_')
+    try:
+        state_digest = _write_file(os.path.join(tmp_dir, STATE_FILE),
+                                   (_LENGTH.pack(len(node)) + node for node in iter_trie_nodes(state, state_root)))
+        manifest = {
+            'version': SNAPSHOT_VERSION,
+            'seq_no': seq_no,
+            'txn_root': txn_root,
+            'state_root': encoded_root,
+            'multi_signature': multi_sig.as_dict() if multi_sig else None,
+            'files': {STATE_FILE: state_digest},
+        }
+        with open(os.path.join(tmp_dir, MANIFEST_FILE), 'w') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.rename(tmp_dir, path)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    logger.info('created token snapshot at seq no {} with state root {}'.format(seq_no, encoded_root))
+
+    if keep:
+        for old in list_snapshots(snapshots_dir)[:-keep]:
+            shutil.rmtree(os.path.join(snapshots_dir, str(old)), ignore_errors=True)
+    return path
+
+
+def read_manifest(path) -> dict:
+    """
+    Reads the manifest of the snapshot in `path` and checks the digests of its files and that
+    the multi-signature, if any, is over its state root and txn root. The multi-signature itself
+    is checked by `verify_multi_signature`
+    """
+    try:
+        with open(os.path.join(path, MANIFEST_FILE)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as ex:
+        raise TokenSnapshotError('cannot read the manifest of snapshot {}: {}'.format(path, ex))
+    if manifest.get('version') != SNAPSHOT_VERSION:
+        raise TokenSnapshotError('snapshot {} has unsupported version {}'.format(path, manifest.get('version')))
+    for name, expected in manifest['files'].items():
+        if _file_digest(os.path.join(path, name)) != expected:
+            raise TokenSnapshotError('file {} of snapshot {} does not match its checksum'.format(name, path))
+    multi_sig = manifest['multi_signature']
+    if multi_sig:
+        value = multi_sig['value']
+        if value.get('ledger_id') != TOKEN_LEDGER_ID or value.get('state_root_hash') != manifest['state_root'] \
+                or value.get('txn_root_hash') != manifest['txn_root']:
+            raise TokenSnapshotError('the multi-signature of snapshot {} is not over its roots'.format(path))
+    return manifest
+
+
+def verify_multi_signature(manifest: dict, bls_bft: BlsBft, quorum: Quorum):
+    """
+    Checks that the multi-signature of the manifest is signed by a quorum of nodes with the BLS
+    keys they had in the pool state it refers to
+    """
+    if not manifest['multi_signature']:
+        raise TokenSnapshotError('snapshot at seq no {} has no multi-signature'.format(manifest['seq_no']))
+    try:
+        multi_sig = MultiSignature.from_dict(**manifest['multi_signature'])
+        pool_root = state_roots_serializer.deserialize(multi_sig.value.pool_state_root_hash)
+    except (TypeError, ValueError) as ex:
+        raise TokenSnapshotError('invalid multi-signature in snapshot at seq no {}: {}'.format(manifest['seq_no'], ex))
+    public_keys = []
+    for node_name in set(multi_sig.participants):
+        try:
+            key = bls_bft.bls_key_register.get_key_by_name(node_name, pool_root)
+        except LookupError:
+            # The pool state of the multi-signature is not known, the pool ledger is behind
+            raise TokenSnapshotError('pool state {} of the multi-signature of snapshot at seq no {} is not '
+                                     'known'.format(multi_sig.value.pool_state_root_hash, manifest['seq_no']))
+        if not key:
+            raise TokenSnapshotError('no BLS key of {} for the multi-signature of snapshot at seq no {}'.format(
+                node_name, manifest['seq_no']))
+        public_keys.append(key)
+    if not quorum.is_reached(len(public_keys)):
+        raise TokenSnapshotError('the multi-signature of snapshot at seq no {} has {} participants, {} are '
+                                 'needed'.format(manifest['seq_no'], len(public_keys), quorum.value))
+    if not bls_bft.bls_crypto_verifier.verify_multi_sig(multi_sig.signature, multi_sig.value.as_single_value(),
+                                                        public_keys):
+        raise TokenSnapshotError('the multi-signature of snapshot at seq no {} is not valid'.format(manifest['seq_no']))
+
+
+def load_snapshot(path, ledger, state: PruningState, utxo_cache: UTXOCache,
+                  bls_bft: Optional[BlsBft], quorum: Optional[Quorum] = None, chunk_size=1000) -> dict:
+    """
+    Loads the snapshot in `path` into an empty token state and utxo cache. Its multi-signature
+    is verified with the keys of `bls_bft` and has to reach `quorum`, only snapshots from a trusted
+    source may be loaded with `bls_bft` None. If the ledger already has the txns of the snapshot
+    its txn root has to match, the txns after the snapshot are applied by the next catch-up.
+
+    :return: the manifest of the snapshot
+    """
+    if not state.isEmpty or next(utxo_cache.iter_committed_outputs(), None) is not None:
+        raise TokenSnapshotError('a snapshot can only be loaded into an empty token state and utxo cache')
+    manifest = read_manifest(path)
+    seq_no = manifest['seq_no']
+    if bls_bft is not None:
+        verify_multi_signature(manifest, bls_bft, quorum)
+    else:
+        logger.warning('the multi-signature of token snapshot {} is not verified'.format(path))
+    if ledger.size >= seq_no > 0 and TokenCatchupApplier.ledger_root_at(ledger, seq_no) != manifest['txn_root']:
+        raise TokenSnapshotError('the txn root of snapshot {} does not match the ledger'.format(path))
+
+    state_root = state_roots_serializer.deserialize(manifest['state_root'])
+    kv = state._kv
+    chunk = []
+    for node in _read_nodes(os.path.join(path, STATE_FILE)):
+        chunk.append((sha3(node), node))
+        if len(chunk) >= chunk_size:
+            kv.setBatch(chunk)
+            chunk = []
+    if chunk:
+        kv.setBatch(chunk)
+    try:
+        # Every node reachable from the root has to be there, nodes are checked against their
+        # hash so the root covers all of them
+        for _ in iter_trie_nodes(state, state_root):
+            pass
+    except KeyError:
+        raise TokenSnapshotError('nodes of the state of snapshot {} are missing'.format(path))
+    state.commit(rootHash=state_root)
+    state.revertToHead(state_root)
+
+    # Payments are checked against the utxo cache, so it comes from the verified state only
+    utxo_cache.rebuild(collect_state_outputs(state, state.committedHead), chunk_size=chunk_size)
+    # Snapshots may keep spent outputs and their state keys may be of another version, the
+    # state is compacted and migrated on startup as configured
+    utxo_cache.remove_meta(TokenReqHandler.SpentOutputsCompactedMarker)
+    utxo_cache.remove_meta(TokenReqHandler.StateKeyVersionMeta)
+    if ledger.size > seq_no:
+        utxo_cache.set_meta(TokenCatchupApplier.AppliedSeqNoMeta, str(seq_no), is_committed=True)
+    if ledger.size != seq_no:
+        utxo_cache.set_meta(TokenCatchupApplier.SnapshotSeqNoMeta, str(seq_no), is_committed=True)
+        utxo_cache.set_meta(TokenCatchupApplier.SnapshotTxnRootMeta, manifest['txn_root'], is_committed=True)
+    logger.info('loaded token snapshot at seq no {} with state root {}'.format(seq_no, manifest['state_root']))
+    return manifest
+
+
+class TokenSnapshotter:
+    """
+    Takes a snapshot after a batch is committed once the token ledger grew by `interval` txns
+    since the last one and the committed state root has a multi-signature. The snapshot is
+    written by `executor`, a single background thread by default, no snapshot is taken while
+    the previous one is being written.
+    """
+
+    def __init__(self, snapshots_dir, interval: int, ledger, state: PruningState, bls_store, keep=2,
+                 metrics: MetricsCollector = NullMetricsCollector(), executor: Optional[ThreadPoolExecutor] = None):
+        self.snapshots_dir = snapshots_dir
+        self.interval = interval
+        self.ledger = ledger
+        self.state = state
+        self.bls_store = bls_store
+        self.keep = keep
+        self.metrics = metrics
+        self.executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix='token_snapshot')
+        self._writing = None  # type: Optional[Future]
+        snapshots = list_snapshots(snapshots_dir)
+        self.last_seq_no = snapshots[-1] if snapshots else 0
+
+    @measure_time(TokenMetricsName.TOKEN_SNAPSHOT_TIME)
+    def post_batch_committed(self, ledger_id, pp_time, committed_txns, state_root, txn_root):
+        if self.ledger.size < self.last_seq_no + self.interval:
+            return
+        if self._writing and not self._writing.done():
+            return
+        root = bytes(self.state.committedHeadHash)
+        multi_sig = self.bls_store.get(state_roots_serializer.serialize(root)) if self.bls_store else None
+        if self.bls_store and not multi_sig:
+            return
+        # The ledger and the bls store are only read here, on the node's thread
+        seq_no = self.ledger.size
+        self._writing = self.executor.submit(write_snapshot, self.snapshots_dir, seq_no, self.ledger.root_hash,
+                                             self.state, root, multi_sig, keep=self.keep)
+        self._writing.add_done_callback(self._log_failure)
+        self.last_seq_no = seq_no
+
+    def wait(self):
+        # Waits until the snapshot being written, if any, is written
+        if self._writing:
+            self._writing.exception()
+
+    @staticmethod
+    def _log_failure(future: Future):
+        if future.exception():
+            logger.error('failed to write token snapshot: {}'.format(future.exception()))
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Creates or loads token snapshots of a stopped node')
+    parser.add_argument('action', choices=['create', 'load'])
+    parser.add_argument('--data-dir', required=True, help="the node's data directory")
+    parser.add_argument('--snapshots-dir', help='directory to create the snapshot in')
+    parser.add_argument('--snapshot', help='snapshot directory to load')
+    parser.add_argument('--no-verify-signature', action='store_true',
+                        help='load without verifying the multi-signature, the pool keys are not available offline')
+    args = parser.parse_args(args)
+
+    config = get_config(getConfig())
+    ledger = get_token_ledger(args.data_dir, config.tokenTransactionsFile,
+                              get_token_hash_store(args.data_dir), config)
+    state = get_token_state(args.data_dir, config.tokenStateDbName, config)
+    utxo_cache = get_utxo_cache(args.data_dir, config.utxoCacheDbName, config)
+    try:
+        if args.action == 'create':
+            print(create_snapshot(args.snapshots_dir or os.path.join(args.data_dir, config.tokenSnapshotsDirName),
+                                  ledger, state))
+        elif not args.no_verify_signature:
+            print('the multi-signature cannot be verified offline, load trusted snapshots with '
+                  '--no-verify-signature', file=sys.stderr)
+            return 1
+        else:
+            load_snapshot(args.snapshot, ledger, state, utxo_cache, bls_bft=None)
+    except TokenSnapshotError as ex:
+        print(ex, file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
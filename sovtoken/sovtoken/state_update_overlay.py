@@ -0,0 +1,60 @@
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from sovtoken.types import Output
+from sovtoken.util import remove_state_key
+from sovtoken.utxo_cache import UTXOCache
+from state.pruning_state import PruningState
+
+
+class StateUpdateOverlay:
+    """
+    Collects the outputs added and spent by a list of txns so the state and the utxo cache are
+    written once per key and once per address on `flush`, instead of once per input and output.
+
+    The trie root only depends on the final keys and values, so writing the last value of
+    every key gives the same state root as applying the changes one by one. The changes of an
+    address are applied to the utxo cache in the order they were made, so an output can be
+    created and spent by txns of the same overlay.
+
+    Spent outputs are kept in the state with an empty value, or removed from it with
+    `remove_spent`.
+    """
+
+    def __init__(self, state: PruningState, utxo_cache: UTXOCache, remove_spent=False):
+        self.state = state
+        self.utxo_cache = utxo_cache
+        self.remove_spent = remove_spent
+        # state key -> encoded amount, None when the output is spent
+        self._state_values = OrderedDict()
+        # address -> [(seq no, amount)], the amount is None when the output is spent
+        self._address_changes = OrderedDict()
+
+    def _changes_of(self, address: str) -> List[Tuple[int, Optional[int]]]:
+        changes = self._address_changes.get(address)
+        if changes is None:
+            changes = self._address_changes[address] = []
+        return changes
+
+    def add_output(self, state_key: bytes, output: Output):
+        UTXOCache._is_valid_output(output)
+        self._state_values[state_key] = str(output.amount).encode()
+        self._changes_of(output.address).append((output.seqNo, output.amount))
+
+    def spend_output(self, state_key: bytes, address: str, seq_no: int):
+        self._state_values[state_key] = None
+        self._changes_of(address).append((seq_no, None))
+
+    def flush(self, is_committed=False):
+        # The utxo cache goes first, it raises `UTXOError` for outputs which cannot be spent
+        for address, changes in self._address_changes.items():
+            self.utxo_cache.update_outputs(address, changes, is_committed=is_committed)
+        for key, value in self._state_values.items():
+            if value is not None:
+                self.state.set(key, value)
+            elif self.remove_spent:
+                remove_state_key(self.state, key)
+            else:
+                self.state.set(key, b'')
+        self._address_changes.clear()
+        self._state_values.clear()
@@ -2,6 +2,8 @@ from ledger.compact_merkle_tree import CompactMerkleTree
 from plenum.common.ledger import Ledger
 from plenum.persistence.db_hash_store import DbHashStore
 from storage.helper import initKeyValueStorage, initHashStore
+from sovtoken.constants import UTXO_CACHE_LAYOUT_ADDRESS, UTXO_CACHE_LAYOUT_SHARDED
+from sovtoken.sharded_utxo_cache import ShardedUTXOCache
 from sovtoken.utxo_cache import UTXOCache
 from state.pruning_state import PruningState
 
@@ -23,5 +25,12 @@ def get_token_state(data_dir, name, config):
 
 
 def get_utxo_cache(data_dir, name, config):
-    return UTXOCache(initKeyValueStorage(
-        config.utxoCacheStorage, data_dir, name))
+    # The layouts are not compatible, changing the layout of an existing node
+    # requires rebuilding the utxo cache from the token ledger
+    kv_store = initKeyValueStorage(config.utxoCacheStorage, data_dir, name)
+    if config.utxoCacheLayout == UTXO_CACHE_LAYOUT_SHARDED:
+        return ShardedUTXOCache(kv_store, with_summary=config.utxoCacheSummary)
+    if config.utxoCacheLayout == UTXO_CACHE_LAYOUT_ADDRESS:
+        return UTXOCache(kv_store, cache_size=config.utxoCacheLruSize, amount_index=config.utxoCacheAmountIndex,
+                         dust_threshold=config.utxoCacheDustThreshold)
+    raise ValueError('Unknown utxo cache layout {}'.format(config.utxoCacheLayout))
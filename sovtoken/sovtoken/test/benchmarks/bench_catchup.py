@@ -0,0 +1,41 @@
+"""
+Benchmarks of applying token txns received in catch-up to the state and the utxo cache, one
+txn at a time the way the node does it for its own ledgers, and in chunks with
+`TokenCatchupApplier`. The txns are generated while they are applied. Catch-up of 1M txns is
+run with
+
+    python -m sovtoken.test.benchmarks.runner -k catchup_chunked --params 1000000
+"""
+from sovtoken.catchup import TokenCatchupApplier
+from sovtoken.constants import TOKEN_LEDGER_ID
+from sovtoken.test.helpers.helper_handler_env import TokenHandlerEnv, CatchupNode, token_txns
+from sovtoken.test.benchmarks.runner import benchmark
+
+TXN_COUNTS = (100, 1000, 10000)
+# Same as the default `utxoCacheLruSize` and `tokenCatchupChunkSize`
+UTXO_CACHE_SIZE = 1000
+CHUNK_SIZE = 1000
+
+
+def catchup_env(num_txns):
+    return TokenHandlerEnv(utxo_cache_size=UTXO_CACHE_SIZE), num_txns
+
+
+@benchmark(TXN_COUNTS, setup=catchup_env, repeat=1)
+def catchup_txn_by_txn(ctx):
+    env, num_txns = ctx
+    for txn in token_txns(num_txns):
+        env.handler.updateState([txn], isCommitted=True)
+        env.state.commit(rootHash=env.state.headHash)
+        env.handler.tracker.set_last_committed(env.state.committedHeadHash, num_txns)
+
+
+@benchmark(TXN_COUNTS + (100000,), setup=catchup_env, repeat=1)
+def catchup_chunked(ctx):
+    env, num_txns = ctx
+    applier = TokenCatchupApplier(CatchupNode(env.handler), TOKEN_LEDGER_ID, env.ledger, env.state,
+                                  env.utxo_cache, env.handler.tracker, chunk_size=CHUNK_SIZE)
+    applier.pre_catchup()
+    for txn in token_txns(num_txns):
+        applier.add_txn(TOKEN_LEDGER_ID, txn)
+    applier.post_catchup()
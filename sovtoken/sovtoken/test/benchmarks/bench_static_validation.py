@@ -0,0 +1,71 @@
+"""
+Micro-benchmark of the static validation of XFER_PUBLIC requests, comparing the single
+pass input/output validation with element by element validation followed by uniqueness
+checks (how `PublicInputsField` and `PublicOutputsField` used to work).
+
+Run with `python -m sovtoken.test.benchmarks.bench_static_validation`
+"""
+import os
+import timeit
+
+from base58 import b58encode_check
+
+from plenum.common.constants import TXN_TYPE
+from plenum.common.messages.fields import IterableField
+from plenum.common.request import Request
+from sovtoken.constants import XFER_PUBLIC, INPUTS, OUTPUTS, SIGS
+from sovtoken.messages.txn_validator import txn_xfer_public_validate, PUBLIC_INPUTS_VALIDATOR, \
+    PUBLIC_OUTPUTS_VALIDATOR
+
+INPUT_COUNTS = (1, 10, 100, 1000)
+# Addresses paying in a request, inputs are spread over them
+ADDRESS_COUNT = 10
+
+
+def random_address():
+    return b58encode_check(os.urandom(32)).decode()
+
+
+def xfer_request(num_inputs) -> Request:
+    addresses = [random_address() for _ in range(min(num_inputs, ADDRESS_COUNT))]
+    inputs = [{"address": addresses[i % len(addresses)], "seqNo": i + 1} for i in range(num_inputs)]
+    outputs = [{"address": random_address(), "amount": 10}, {"address": addresses[0], "amount": 90}]
+    return Request("6ouriXMZkLeHsuXrN1X1fd", 1,
+                   {TXN_TYPE: XFER_PUBLIC, INPUTS: inputs, OUTPUTS: outputs,
+                    SIGS: ['sig'] * num_inputs},
+                   None, None, 1)
+
+
+def legacy_xfer_validate(request: Request):
+    operation = request.operation
+    error = IterableField._specific_validation(PUBLIC_OUTPUTS_VALIDATOR, operation[OUTPUTS])
+    if not error and len(operation[OUTPUTS]) != len({o["address"] for o in operation[OUTPUTS]}):
+        error = PUBLIC_OUTPUTS_VALIDATOR.unique_error
+    if error:
+        return error
+    error = IterableField._specific_validation(PUBLIC_INPUTS_VALIDATOR, operation[INPUTS])
+    if not error and len(operation[INPUTS]) != len({(i["address"], i["seqNo"]) for i in operation[INPUTS]}):
+        error = PUBLIC_INPUTS_VALIDATOR.unique_error
+    return error
+
+
+def measure(func, request, repeat=5) -> float:
+    # Best time of a single validation in microseconds
+    number = max(1, 2000 // len(request.operation[INPUTS]))
+    return min(timeit.repeat(lambda: func(request), number=number, repeat=repeat)) / number * 1e6
+
+
+def run():
+    results = {}
+    for num_inputs in INPUT_COUNTS:
+        request = xfer_request(num_inputs)
+        assert legacy_xfer_validate(request) is None and txn_xfer_public_validate(request) is None
+        results[num_inputs] = (measure(legacy_xfer_validate, request),
+                               measure(txn_xfer_public_validate, request))
+    return results
+
+
+if __name__ == '__main__':
+    print('{:>8} {:>14} {:>16} {:>8}'.format('inputs', 'legacy, us', 'single pass, us', 'speedup'))
+    for num_inputs, (legacy, fused) in run().items():
+        print('{:>8} {:>14.1f} {:>16.1f} {:>7.2f}x'.format(num_inputs, legacy, fused, legacy / fused))
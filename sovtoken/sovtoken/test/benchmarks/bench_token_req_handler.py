@@ -0,0 +1,88 @@
+"""
+Benchmarks of the stages an XFER_PUBLIC goes through in `TokenReqHandler`, for requests
+with different numbers of inputs, and of GET_UTXO for addresses holding different numbers
+of outputs. Run them with `python -m sovtoken.test.benchmarks.runner`.
+"""
+from functools import lru_cache
+
+from plenum.common.txn_util import append_txn_metadata
+from sovtoken.test.helpers.helper_handler_env import TokenHandlerEnv
+from sovtoken.test.benchmarks.runner import benchmark
+
+INPUT_COUNTS = (1, 10, 100, 1000)
+# Number of unspent outputs of the queried address
+ADDRESS_SIZES = (1, 10, 100, 1000)
+
+
+@lru_cache()
+def funded_xfer(num_inputs):
+    # The read only stages can share the environment and the request
+    env = TokenHandlerEnv()
+    return env, env.funded_xfer(num_inputs)
+
+
+def applicable_xfer(num_inputs):
+    env = TokenHandlerEnv()
+    request = env.funded_xfer(num_inputs)
+    txn = append_txn_metadata(env.handler._reqToTxn(request), seq_no=env.ledger.size + 1,
+                              txn_time=env.pp_time + 1)
+    return env, txn
+
+
+def applied_xfer(num_inputs):
+    env = TokenHandlerEnv()
+    request = env.funded_xfer(num_inputs)
+    env.pp_time += 1
+    env.handler.apply(request, env.pp_time)
+    return env
+
+
+@lru_cache()
+def funded_address(num_outputs):
+    # The reply cache is only used through `get_query_response`
+    env = TokenHandlerEnv(reply_cache_size=1)
+    address = env.new_address()
+    env.fund(address, num_outputs)
+    return env, env.get_utxo(address)
+
+
+@benchmark(INPUT_COUNTS, setup=funded_xfer, number=20)
+def xfer_static_validation(ctx):
+    env, request = ctx
+    env.handler.doStaticValidation(request)
+
+
+@benchmark(INPUT_COUNTS, setup=funded_xfer, number=3)
+def xfer_authentication(ctx):
+    env, request = ctx
+    env.authnr.authenticate(request.as_dict)
+
+
+@benchmark(INPUT_COUNTS, setup=funded_xfer, number=20)
+def xfer_dynamic_validation(ctx):
+    env, request = ctx
+    env.handler.validate(request)
+
+
+@benchmark(INPUT_COUNTS, setup=applicable_xfer)
+def xfer_update_state(ctx):
+    env, txn = ctx
+    env.handler.updateState([txn])
+
+
+@benchmark(INPUT_COUNTS, setup=applied_xfer)
+def xfer_batch_created_and_commit(env):
+    env.handler.onBatchCreated(env.state.headHash, env.pp_time)
+    env.commit_batch(1)
+
+
+@benchmark(ADDRESS_SIZES, setup=funded_address, number=5)
+def get_all_utxo(ctx):
+    env, request = ctx
+    env.handler.get_all_utxo(request)
+
+
+@benchmark(ADDRESS_SIZES, setup=funded_address, number=5)
+def get_utxo_cached(ctx):
+    env, request = ctx
+    env.handler.get_query_response(request)
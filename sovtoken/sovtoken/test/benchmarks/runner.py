@@ -0,0 +1,134 @@
+"""
+A small benchmark runner. Benchmarks are registered with the `benchmark` decorator in
+`bench_*.py` modules, each one is run for every value of its parameter and the best time
+is compared with the stored baseline.
+
+    python -m sovtoken.test.benchmarks.runner                  # run and compare with baselines
+    python -m sovtoken.test.benchmarks.runner -k get_all_utxo  # only matching benchmarks
+    python -m sovtoken.test.benchmarks.runner --save           # store the results as baselines
+    python -m sovtoken.test.benchmarks.runner -k catchup --params 1000000  # other param values
+
+Timings depend on the machine, so baselines are not committed: run with `--save` on the
+machine (before making the changes to compare) to store them in `baselines.json` next to
+this module, or pass another file with `--baselines`. Without baselines nothing is compared.
+"""
+import argparse
+import importlib
+import json
+import logging
+import os
+import sys
+import time
+from collections import OrderedDict, namedtuple
+
+Benchmark = namedtuple('Benchmark', ['name', 'params', 'setup', 'number', 'repeat', 'func'])
+
+BENCHMARKS = OrderedDict()
+
+BENCHMARK_MODULES = [
+    'sovtoken.test.benchmarks.bench_token_req_handler',
+    'sovtoken.test.benchmarks.bench_catchup',
+    'sovtokenfees.test.benchmarks.bench_static_fees_req_handler',
+]
+
+BASELINES_FILE = os.path.join(os.path.dirname(__file__), 'baselines.json')
+
+# A result slower than the baseline by more than this fraction is a regression
+DEFAULT_TOLERANCE = 0.5
+
+
+def benchmark(params, setup=None, number=1, repeat=5):
+    """
+    Registers `func(ctx)` as a benchmark. For each value in `params`, `setup(param)` builds a
+    fresh `ctx` before every repeat (not timed) and `func` is then timed `number` times on it.
+    `number` should stay 1 for benchmarks that change `ctx`.
+    """
+    def register(func):
+        BENCHMARKS[func.__name__] = Benchmark(func.__name__, params, setup or (lambda p: p),
+                                              number, repeat, func)
+        return func
+    return register
+
+
+def run_benchmark(bench: Benchmark, params=None) -> OrderedDict:
+    # Best time of a single call in seconds for each param, `params` replaces the registered ones
+    results = OrderedDict()
+    for param in params or bench.params:
+        best = None
+        for _ in range(bench.repeat):
+            ctx = bench.setup(param)
+            start = time.perf_counter()
+            for _ in range(bench.number):
+                bench.func(ctx)
+            elapsed = (time.perf_counter() - start) / bench.number
+            best = elapsed if best is None else min(best, elapsed)
+        results[str(param)] = best
+    return results
+
+
+def load_benchmarks(modules=BENCHMARK_MODULES):
+    for module in modules:
+        try:
+            importlib.import_module(module)
+        except ImportError as ex:
+            print('skipping {}: {}'.format(module, ex), file=sys.stderr)
+
+
+def compare(results, baselines, tolerance=DEFAULT_TOLERANCE):
+    # Returns (name, param, result, baseline) for results slower than their baseline
+    regressions = []
+    for name, params in results.items():
+        for param, value in params.items():
+            baseline = baselines.get(name, {}).get(param)
+            if baseline is not None and value > baseline * (1 + tolerance):
+                regressions.append((name, param, value, baseline))
+    return regressions
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Token plugin benchmarks')
+    parser.add_argument('-k', dest='filter', default='', help='only run benchmarks with this in the name')
+    parser.add_argument('--save', action='store_true', help='store the results as the baselines')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument('--baselines', default=BASELINES_FILE)
+    parser.add_argument('--params', type=lambda v: [int(p) for p in v.split(',')],
+                        help='comma separated param values to run instead of the registered ones')
+    args = parser.parse_args(args)
+
+    # Debug logging of the handlers would dominate the timings
+    logging.disable(logging.INFO)
+    load_benchmarks()
+    baselines = {}
+    if os.path.exists(args.baselines):
+        with open(args.baselines) as f:
+            baselines = json.load(f)
+    elif not args.save:
+        print('no baselines in {}, run with --save first on this machine'.format(args.baselines), file=sys.stderr)
+
+    results = OrderedDict()
+    for name, bench in BENCHMARKS.items():
+        if args.filter not in name:
+            continue
+        results[name] = run_benchmark(bench, args.params)
+        for param, value in results[name].items():
+            baseline = baselines.get(name, {}).get(param)
+            print('{:<40} {:>8} {:>12.1f} us {:>14}'.format(
+                name, param, value * 1e6,
+                '' if baseline is None else '({:+.0%})'.format(value / baseline - 1)))
+
+    if args.save:
+        baselines.update(results)
+        with open(args.baselines, 'w') as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+        return 0
+
+    regressions = compare(results, baselines, args.tolerance)
+    for name, param, value, baseline in regressions:
+        print('REGRESSION {}[{}]: {:.1f} us, baseline {:.1f} us'.format(
+            name, param, value * 1e6, baseline * 1e6), file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    # The benchmark modules register into `sovtoken.test.benchmarks.runner`, not `__main__`
+    sys.exit(importlib.import_module('sovtoken.test.benchmarks.runner').main())
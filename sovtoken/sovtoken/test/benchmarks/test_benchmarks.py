@@ -0,0 +1,17 @@
+import pytest
+
+from sovtoken.test.benchmarks.runner import BENCHMARKS, load_benchmarks, compare
+
+load_benchmarks()
+
+
+@pytest.mark.parametrize('name', list(BENCHMARKS))
+def test_benchmark_runs_with_smallest_param(name):
+    bench = BENCHMARKS[name]
+    bench.func(bench.setup(bench.params[0]))
+
+
+def test_compare_reports_only_slower_results():
+    baselines = {'a': {'1': 1.0, '10': 2.0}}
+    results = {'a': {'1': 1.4, '10': 3.5, '100': 9.0}, 'b': {'1': 5.0}}
+    assert compare(results, baselines, tolerance=0.5) == [('a', '10', 3.5, 2.0)]
@@ -10,6 +10,12 @@ class HelperGeneral():
     - do_mint
     - do_transfer
     - do_get_utxo
+    - do_get_utxo_page
+    - do_get_utxos
+    - do_get_output_audit
+    - do_get_txn_history
+    - do_get_utxo_for_amount
+    - do_get_balance
     """
 
     def __init__(self, helper_sdk, helper_wallet, helper_request):
@@ -60,6 +66,39 @@ class HelperGeneral():
 
         return result
 
+    def do_get_utxo_page(self, address, from_seq_no=None, limit=None):
+        """ Build and send a paginated get_utxo request. """
+        request = self._request.get_utxo(address, from_seq_no, limit)
+        return self._send_get_first_result(request)
+
+    def do_get_utxos(self, addresses):
+        """ Build and send a get_utxos request. """
+        request = self._request.get_utxos(addresses)
+        result = self._send_get_first_result(request)
+        result[OUTPUTS] = {address: self._sort_utxos(utxos) for address, utxos in result[OUTPUTS].items()}
+
+        return result
+
+    def do_get_output_audit(self, seq_no, address=None):
+        """ Build and send a get_output_audit request. """
+        request = self._request.get_output_audit(seq_no, address)
+        return self._send_get_first_result(request)
+
+    def do_get_txn_history(self, address, from_seq_no=None, limit=None, with_txns=False):
+        """ Build and send a get_txn_history request. """
+        request = self._request.get_txn_history(address, from_seq_no, limit, with_txns)
+        return self._send_get_first_result(request)
+
+    def do_get_utxo_for_amount(self, address, amount, fee_txn_type=None):
+        """ Build and send a get_utxo_for_amount request. """
+        request = self._request.get_utxo_for_amount(address, amount, fee_txn_type)
+        return self._send_get_first_result(request)
+
+    def do_get_balance(self, address):
+        """ Build and send a get_balance request. """
+        request = self._request.get_balance(address)
+        return self._send_get_first_result(request)
+
     # =============
     # Private Methods
     # =============
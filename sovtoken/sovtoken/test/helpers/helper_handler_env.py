@@ -0,0 +1,193 @@
+"""
+Builds a `TokenReqHandler` on in-memory stores and drives it the way the node does,
+without a pool: requests are applied, batches are created and committed directly. Used by
+the unit tests and the benchmarks.
+"""
+import random
+from collections import deque
+from hashlib import sha256
+
+from base58 import b58encode_check
+
+from plenum.common.constants import TXN_TYPE, CURRENT_PROTOCOL_VERSION
+from plenum.common.ledger import Ledger
+from plenum.common.request import Request
+from plenum.common.signer_simple import SimpleSigner
+from plenum.common.txn_util import init_empty_txn, set_payload_data, append_txn_metadata, get_digest, \
+    get_seq_no
+from ledger.compact_merkle_tree import CompactMerkleTree
+from ledger.hash_stores.memory_hash_store import MemoryHashStore
+from sovtoken.audit_index import AuditIndex
+from sovtoken.client_authnr import TokenAuthNr
+from sovtoken.history_index import HistoryIndex
+from sovtoken.test.helpers.helper_request import build_query_request
+from sovtoken.constants import ADDRESS, AMOUNT, INPUTS, OUTPUTS, SIGS, SEQNO, \
+    MINT_PUBLIC, XFER_PUBLIC, GET_UTXO
+from sovtoken.token_req_handler import TokenReqHandler
+from sovtoken.util import verkey_to_address
+from sovtoken.utxo_cache import UTXOCache
+from state.pruning_state import PruningState
+from storage.kv_in_memory import KeyValueStorageInMemory
+
+IDENTIFIER = '6ouriXMZkLeHsuXrN1X1fd'
+
+
+class FixedMultiSignature:
+    # Stands for the BLS multi-signature of any root, only its serialization matters here
+    def as_dict(self):
+        return {'signature': 'x' * 128, 'participants': ['Alpha', 'Beta', 'Gamma'],
+                'value': {'state_root_hash': 'x' * 44, 'pool_state_root_hash': 'x' * 44,
+                          'txn_root_hash': 'x' * 44, 'ledger_id': 1001, 'timestamp': 0}}
+
+
+class FixedMultiSigStore:
+    def get(self, root_hash):
+        return FixedMultiSignature()
+
+
+def token_txns(count, num_addresses=1000):
+    """
+    Yields `count` committed token txns without signatures, as catch-up receives them: a mint
+    funding `num_addresses` addresses, then transfers each spending the oldest unspent output
+    to another address and back to its owner
+    """
+    addresses = [b58encode_check(sha256(str(i).encode()).digest()).decode() for i in range(num_addresses)]
+    unspent = deque((address, 1, 2 ** 40) for address in addresses)
+    for seq_no in range(1, count + 1):
+        if seq_no == 1:
+            txn = init_empty_txn(MINT_PUBLIC)
+            set_payload_data(txn, {OUTPUTS: [{ADDRESS: a, AMOUNT: 2 ** 40} for a in addresses]})
+        else:
+            address, spent, amount = unspent.popleft()
+            receiver = addresses[(seq_no * 7919) % num_addresses]
+            if receiver == address:
+                receiver = addresses[(seq_no * 7919 + 1) % num_addresses]
+            outputs = [{ADDRESS: receiver, AMOUNT: amount // 2}, {ADDRESS: address, AMOUNT: amount - amount // 2}]
+            unspent.extend((o[ADDRESS], seq_no, o[AMOUNT]) for o in outputs)
+            txn = init_empty_txn(XFER_PUBLIC)
+            set_payload_data(txn, {INPUTS: [{ADDRESS: address, SEQNO: spent}], OUTPUTS: outputs})
+        yield append_txn_metadata(txn, seq_no=seq_no, txn_time=seq_no)
+
+
+class CatchupNode:
+    # The parts of the node `TokenCatchupApplier` uses, every txn goes to `req_handler`
+    def __init__(self, req_handler):
+        self.req_handler = req_handler
+        self.seq_no_map = {}
+
+    def get_req_handler(self, ledger_id=None, txn_type=None):
+        return self.req_handler
+
+    def updateSeqNoMap(self, committed_txns, ledger_id):
+        for txn in committed_txns:
+            self.seq_no_map[get_digest(txn)] = get_seq_no(txn)
+
+    def _clear_request_for_txn(self, ledger_id, txn):
+        pass
+
+
+class NodeHashMemoryStore(MemoryHashStore):
+    # Keeps only the hash of a node like the persistent hash stores, so `merkle_tree_hash` works
+    def writeNode(self, node):
+        super().writeNode(node[2])
+
+
+def in_memory_ledger() -> Ledger:
+    return Ledger(CompactMerkleTree(hashStore=NodeHashMemoryStore()), dataDir=None,
+                  transactionLogStore=KeyValueStorageInMemory())
+
+
+class TokenHandlerEnv:
+    def __init__(self, utxo_cache_size=0, reply_cache_size=0, audit_index=False, history_index=False,
+                 amount_index=False, dust_threshold=0, state_key_version=TokenReqHandler.StateKeyVersionDecimal):
+        self.ledger = in_memory_ledger()
+        self.state = PruningState(KeyValueStorageInMemory())
+        self.utxo_cache = UTXOCache(KeyValueStorageInMemory(), cache_size=utxo_cache_size, amount_index=amount_index,
+                                    dust_threshold=dust_threshold)
+        self.handler = TokenReqHandler(self.ledger, self.state, self.utxo_cache,
+                                       PruningState(KeyValueStorageInMemory()),
+                                       FixedMultiSigStore(), reply_cache_size=reply_cache_size,
+                                       audit_index=AuditIndex(self.utxo_cache) if audit_index else None,
+                                       history_index=HistoryIndex(self.utxo_cache) if history_index else None,
+                                       state_key_version=state_key_version)
+        self.authnr = TokenAuthNr(PruningState(KeyValueStorageInMemory()))
+        self.signers = {}
+        self.pp_time = 0
+
+    def new_address(self) -> str:
+        signer = SimpleSigner(seed=random.getrandbits(256).to_bytes(32, 'big'))
+        address = verkey_to_address(signer.verkey)
+        self.signers[address] = signer
+        return address
+
+    def apply_batch(self, requests):
+        self.pp_time += 1
+        for request in requests:
+            self.handler.apply(request, self.pp_time)
+        self.handler.onBatchCreated(self.state.headHash, self.pp_time)
+
+    def commit_batch(self, txn_count):
+        return self.handler.commit(txn_count, self.state.headHash,
+                                   Ledger.hashToStr(self.ledger.uncommittedRootHash),
+                                   self.pp_time)
+
+    @staticmethod
+    def mint_request(outputs) -> Request:
+        # A MINT_PUBLIC paying `outputs` (pairs of address and amount)
+        return Request(IDENTIFIER, Request.gen_req_id(),
+                       {TXN_TYPE: MINT_PUBLIC,
+                        OUTPUTS: [{ADDRESS: a, AMOUNT: v} for a, v in outputs]},
+                       protocolVersion=CURRENT_PROTOCOL_VERSION)
+
+    def mint(self, outputs):
+        """
+        Commits a MINT_PUBLIC paying `outputs` (pairs of address and amount)
+        :return: the seq no of the mint
+        """
+        self.apply_batch([self.mint_request(outputs)])
+        self.commit_batch(1)
+        return self.ledger.size
+
+    def fund(self, address, num_outputs, amount=10):
+        # Gives `num_outputs` committed outputs to the address, minted in a single batch
+        self.apply_batch([self.mint_request([(address, amount)]) for _ in range(num_outputs)])
+        self.commit_batch(num_outputs)
+        first = self.ledger.size - num_outputs + 1
+        return [(seq_no, amount) for seq_no in range(first, self.ledger.size + 1)]
+
+    def sign(self, address, *to_sign) -> str:
+        return self.signers[address].sign(list(to_sign))
+
+    def xfer(self, inputs, outputs) -> Request:
+        """
+        A signed XFER_PUBLIC spending `inputs` (pairs of address and seq no) to `outputs`
+        (pairs of address and amount)
+        """
+        inputs = [{ADDRESS: a, SEQNO: s} for a, s in inputs]
+        outputs = [{ADDRESS: a, AMOUNT: v} for a, v in outputs]
+        sigs = [self.sign(i[ADDRESS], i, outputs) for i in inputs]
+        return Request(IDENTIFIER, Request.gen_req_id(),
+                       {TXN_TYPE: XFER_PUBLIC, INPUTS: inputs, OUTPUTS: outputs, SIGS: sigs},
+                       protocolVersion=CURRENT_PROTOCOL_VERSION)
+
+    def pay(self, address, seq_no, amount, to):
+        # Applies a batch with an XFER_PUBLIC spending the output of the address to `to`
+        self.apply_batch([self.xfer([(address, seq_no)], [(to, amount)])])
+
+    def funded_xfer(self, num_inputs, amount=10) -> Request:
+        # Funds a new address with `num_inputs` outputs and builds an XFER spending all of them
+        address = self.new_address()
+        seq_nos = [seq_no for seq_no, _ in self.fund(address, num_inputs, amount)]
+        return self.xfer([(address, s) for s in seq_nos],
+                         [(self.new_address(), num_inputs * amount)])
+
+    @staticmethod
+    def query_request(txn_type, fields=None) -> Request:
+        return build_query_request(txn_type, fields, IDENTIFIER)
+
+    @staticmethod
+    def get_utxo(address, **params) -> Request:
+        operation = {TXN_TYPE: GET_UTXO, ADDRESS: address}
+        operation.update(params)
+        return Request(IDENTIFIER, Request.gen_req_id(), operation,
+                       protocolVersion=CURRENT_PROTOCOL_VERSION)
@@ -5,10 +5,23 @@ from plenum.common.constants import TXN_TYPE, CURRENT_PROTOCOL_VERSION, GET_TXN,
 from plenum.common.request import Request
 from plenum.common.types import f
 from sovtoken.constants import INPUTS, OUTPUTS, EXTRA, SIGS, XFER_PUBLIC, \
-    MINT_PUBLIC, GET_UTXO, ADDRESS, SEQNO, AMOUNT
+    MINT_PUBLIC, GET_UTXO, GET_BALANCE, GET_UTXOS, GET_OUTPUT_AUDIT, GET_TXN_HISTORY, GET_UTXO_FOR_AMOUNT, ADDRESS, \
+    ADDRESSES, SEQNO, AMOUNT, FROM_SEQNO, LIMIT, WITH_TXNS, FEE_TXN_TYPE
 from sovtoken.util import address_to_verkey
 
 
+def build_query_request(txn_type, fields=None, identifier=None) -> Request:
+    """ Builds an unsigned read request of `txn_type` with the `fields` which are not None. """
+    payload = {TXN_TYPE: txn_type}
+    payload.update((name, value) for name, value in (fields or {}).items() if value is not None)
+    return Request(
+        reqId=Request.gen_req_id(),
+        operation=payload,
+        protocolVersion=CURRENT_PROTOCOL_VERSION,
+        identifier=identifier
+    )
+
+
 class HelperRequest():
     """
     Helper to build different requests.
@@ -37,12 +50,52 @@ class HelperRequest():
         self._client_wallet = client_wallet
         self._steward_wallet = steward_wallet
 
-    def get_utxo(self, address):
-        """ Builds a get_utxo request. """
+    def get_utxo(self, address, from_seq_no=None, limit=None):
+        """ Builds a get_utxo request, paginated if `from_seq_no` or `limit` is given. """
         payload = {
             TXN_TYPE: GET_UTXO,
             ADDRESS: address
         }
+        if from_seq_no is not None:
+            payload[FROM_SEQNO] = from_seq_no
+        if limit is not None:
+            payload[LIMIT] = limit
+
+        request = self._create_request(payload, self._client_did)
+
+        return request
+
+    def get_utxos(self, addresses):
+        """ Builds a get_utxos request for several addresses. """
+        payload = {
+            TXN_TYPE: GET_UTXOS,
+            ADDRESSES: addresses
+        }
+
+        request = self._create_request(payload, self._client_did)
+
+        return request
+
+    def get_output_audit(self, seq_no, address=None):
+        """ Builds a get_output_audit request for the outputs of a txn, only the ones of `address` if given. """
+        return build_query_request(GET_OUTPUT_AUDIT, {SEQNO: seq_no, ADDRESS: address}, self._client_did)
+
+    def get_txn_history(self, address, from_seq_no=None, limit=None, with_txns=False):
+        """ Builds a get_txn_history request, with the txns if `with_txns` is set. """
+        fields = {ADDRESS: address, FROM_SEQNO: from_seq_no, LIMIT: limit, WITH_TXNS: with_txns or None}
+        return build_query_request(GET_TXN_HISTORY, fields, self._client_did)
+
+    def get_utxo_for_amount(self, address, amount, fee_txn_type=None):
+        """ Builds a get_utxo_for_amount request, adding the fee of `fee_txn_type` if given. """
+        fields = {ADDRESS: address, AMOUNT: amount, FEE_TXN_TYPE: fee_txn_type}
+        return build_query_request(GET_UTXO_FOR_AMOUNT, fields, self._client_did)
+
+    def get_balance(self, address):
+        """ Builds a get_balance request. """
+        payload = {
+            TXN_TYPE: GET_BALANCE,
+            ADDRESS: address
+        }
 
         request = self._create_request(payload, self._client_did)
 
@@ -0,0 +1,36 @@
+import pytest
+
+from plenum.common.exceptions import RequestNackedException
+from plenum.common.txn_util import get_seq_no
+from sovtoken.constants import BALANCE, ADDRESS
+
+
+@pytest.fixture
+def addresses(helpers):
+    return helpers.wallet.create_new_addresses(2)
+
+
+def test_empty_address(helpers):
+    with pytest.raises(RequestNackedException):
+        helpers.general.do_get_balance('')
+
+
+def test_address_no_balance(helpers, addresses):
+    response = helpers.general.do_get_balance(addresses[0])
+    assert response[BALANCE] == 0
+    assert response[ADDRESS] == addresses[0]
+
+
+def test_balance_after_mint_and_transfer(helpers, addresses):
+    address_1, address_2 = addresses
+    mint_result = helpers.general.do_mint([{"address": address_1, "amount": 1000},
+                                           {"address": address_2, "amount": 10}])
+    assert helpers.general.do_get_balance(address_1)[BALANCE] == 1000
+
+    inputs = [{"address": address_1, "seqNo": get_seq_no(mint_result)}]
+    outputs = [{"address": address_2, "amount": 300},
+               {"address": address_1, "amount": 700}]
+    helpers.general.do_transfer(inputs, outputs)
+
+    assert helpers.general.do_get_balance(address_1)[BALANCE] == 700
+    assert helpers.general.do_get_balance(address_2)[BALANCE] == 310
@@ -0,0 +1,37 @@
+import pytest
+
+from plenum.common.txn_util import get_seq_no
+from sovtoken.constants import OUTPUTS, SPENT_BY
+
+
+@pytest.fixture(scope="module")
+def tconf(tconf):
+    old_audit_index = getattr(tconf, 'tokenAuditIndex', False)
+    tconf.tokenAuditIndex = True
+    yield tconf
+    tconf.tokenAuditIndex = old_audit_index
+
+
+@pytest.fixture
+def addresses(helpers):
+    return helpers.wallet.create_new_addresses(2)
+
+
+def test_get_output_audit(helpers, addresses):
+    address_1, address_2 = addresses
+    mint_seq_no = get_seq_no(helpers.general.do_mint([{"address": address_1, "amount": 100},
+                                                      {"address": address_2, "amount": 10}]))
+
+    result = helpers.general.do_get_output_audit(mint_seq_no)
+    assert sorted(result[OUTPUTS], key=lambda o: o["address"]) == sorted([
+        {"address": address_1, "seqNo": mint_seq_no, "amount": 100, SPENT_BY: None},
+        {"address": address_2, "seqNo": mint_seq_no, "amount": 10, SPENT_BY: None},
+    ], key=lambda o: o["address"])
+
+    xfer_seq_no = get_seq_no(helpers.general.do_transfer([{"address": address_1, "seqNo": mint_seq_no}],
+                                                         [{"address": address_2, "amount": 100}]))
+
+    result = helpers.general.do_get_output_audit(mint_seq_no, address_1)
+    assert result[OUTPUTS] == [{"address": address_1, "seqNo": mint_seq_no, "amount": 100, SPENT_BY: xfer_seq_no}]
+    result = helpers.general.do_get_output_audit(xfer_seq_no)
+    assert result[OUTPUTS] == [{"address": address_2, "seqNo": xfer_seq_no, "amount": 100, SPENT_BY: None}]
@@ -0,0 +1,36 @@
+import pytest
+
+from plenum.common.txn_util import get_seq_no
+from sovtoken.constants import SEQNOS, TXNS, NEXT_SEQNO
+
+
+@pytest.fixture(scope="module")
+def tconf(tconf):
+    old_history_index = getattr(tconf, 'tokenHistoryIndex', False)
+    tconf.tokenHistoryIndex = True
+    yield tconf
+    tconf.tokenHistoryIndex = old_history_index
+
+
+@pytest.fixture
+def addresses(helpers):
+    return helpers.wallet.create_new_addresses(2)
+
+
+def test_get_txn_history(helpers, addresses):
+    address_1, address_2 = addresses
+    mint_seq_no = get_seq_no(helpers.general.do_mint([{"address": address_1, "amount": 100}]))
+    xfer_seq_no = get_seq_no(helpers.general.do_transfer([{"address": address_1, "seqNo": mint_seq_no}],
+                                                         [{"address": address_2, "amount": 100}]))
+
+    result = helpers.general.do_get_txn_history(address_1)
+    assert result[SEQNOS] == [mint_seq_no, xfer_seq_no]
+    assert result[NEXT_SEQNO] is None
+
+    result = helpers.general.do_get_txn_history(address_1, limit=1)
+    assert result[SEQNOS] == [mint_seq_no]
+    assert result[NEXT_SEQNO] == xfer_seq_no
+
+    result = helpers.general.do_get_txn_history(address_2, with_txns=True)
+    assert result[SEQNOS] == [xfer_seq_no]
+    assert [get_seq_no(txn) for txn in result[TXNS]] == [xfer_seq_no]
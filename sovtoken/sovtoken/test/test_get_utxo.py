@@ -7,7 +7,7 @@ from base58 import b58encode_check
 from plenum.common.exceptions import RequestNackedException
 from plenum.common.txn_util import get_seq_no, get_payload_data
 from plenum.common.util import randomString
-from sovtoken.constants import OUTPUTS, ADDRESS
+from sovtoken.constants import OUTPUTS, ADDRESS, NEXT_SEQNO
 
 @pytest.fixture
 def addresses(helpers):
@@ -113,3 +113,27 @@ def test_get_utxo_utxos_in_order(helpers, addresses):
             seq_nos.append(output["seqNo"])
 
         assert seq_nos == sorted(seq_nos)
+
+
+def test_get_utxo_pages(helpers, addresses):
+    """ Page through the utxos of an address with the `next` cursor """
+
+    address = addresses[0]
+    seq_nos = []
+    for amount in (10, 20, 30):
+        mint_result = helpers.general.do_mint([{"address": address, "amount": amount}])
+        seq_nos.append(get_seq_no(mint_result))
+
+    first_page = helpers.general.do_get_utxo_page(address, limit=2)
+    assert first_page[OUTPUTS] == [{"address": address, "seqNo": seq_nos[0], "amount": 10},
+                                   {"address": address, "seqNo": seq_nos[1], "amount": 20}]
+    assert first_page[NEXT_SEQNO] == seq_nos[2]
+
+    last_page = helpers.general.do_get_utxo_page(address, from_seq_no=first_page[NEXT_SEQNO], limit=2)
+    assert last_page[OUTPUTS] == [{"address": address, "seqNo": seq_nos[2], "amount": 30}]
+    assert last_page[NEXT_SEQNO] is None
+
+
+def test_get_utxo_invalid_page(helpers, addresses):
+    with pytest.raises(RequestNackedException):
+        helpers.general.do_get_utxo_page(addresses[0], limit=0)
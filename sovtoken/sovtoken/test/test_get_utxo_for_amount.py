@@ -0,0 +1,33 @@
+import pytest
+
+from plenum.common.txn_util import get_seq_no
+from sovtoken.constants import OUTPUTS, FEE, ADDRESS, SEQNO, AMOUNT
+
+
+@pytest.fixture(scope="module")
+def tconf(tconf):
+    old_amount_index = getattr(tconf, 'utxoCacheAmountIndex', False)
+    tconf.utxoCacheAmountIndex = True
+    yield tconf
+    tconf.utxoCacheAmountIndex = old_amount_index
+
+
+@pytest.fixture
+def address(helpers):
+    return helpers.wallet.create_address()
+
+
+def test_get_utxo_for_amount(helpers, address):
+    seq_nos = [get_seq_no(helpers.general.do_mint([{"address": address, "amount": amount}]))
+               for amount in (10, 40, 25)]
+
+    result = helpers.general.do_get_utxo_for_amount(address, 20)
+    assert result[OUTPUTS] == [{ADDRESS: address, SEQNO: seq_nos[2], AMOUNT: 25}]
+    assert result[FEE] == 0
+
+    result = helpers.general.do_get_utxo_for_amount(address, 45)
+    assert result[OUTPUTS] == [{ADDRESS: address, SEQNO: seq_nos[0], AMOUNT: 10},
+                               {ADDRESS: address, SEQNO: seq_nos[1], AMOUNT: 40}]
+
+    result = helpers.general.do_get_utxo_for_amount(address, 76)
+    assert result[OUTPUTS] == []
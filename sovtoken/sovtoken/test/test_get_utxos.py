@@ -0,0 +1,38 @@
+import pytest
+from base58 import b58encode_check
+
+from plenum.common.constants import STATE_PROOF
+from plenum.common.exceptions import RequestNackedException
+from plenum.common.txn_util import get_seq_no
+from sovtoken.constants import OUTPUTS, BALANCE
+
+
+@pytest.fixture
+def addresses(helpers):
+    return helpers.wallet.create_new_addresses(3)
+
+
+def test_empty_addresses(helpers):
+    with pytest.raises(RequestNackedException):
+        helpers.general.do_get_utxos([])
+
+
+def test_invalid_address(helpers, addresses):
+    with pytest.raises(RequestNackedException):
+        helpers.general.do_get_utxos([addresses[0], b58encode_check(b'1' * 33).decode()])
+
+
+def test_get_utxos_of_several_addresses(helpers, addresses):
+    address_1, address_2, address_3 = addresses
+    mint_result = helpers.general.do_mint([{"address": address_1, "amount": 1000},
+                                           {"address": address_2, "amount": 20}])
+    mint_seq_no = get_seq_no(mint_result)
+
+    result = helpers.general.do_get_utxos([address_1, address_2, address_3])
+    assert result[OUTPUTS] == {
+        address_1: [{"address": address_1, "seqNo": mint_seq_no, "amount": 1000}],
+        address_2: [{"address": address_2, "seqNo": mint_seq_no, "amount": 20}],
+        address_3: []
+    }
+    assert result[BALANCE] == {address_1: 1000, address_2: 20, address_3: 0}
+    assert result[STATE_PROOF]
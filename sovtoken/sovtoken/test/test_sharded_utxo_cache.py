@@ -0,0 +1,112 @@
+import pytest
+
+from sovtoken.exceptions import UTXOError
+from sovtoken.sharded_utxo_cache import ShardedUTXOCache
+from sovtoken.types import Output
+from storage.test.conftest import parametrised_storage
+
+VALID_ADDR_1 = '6baBEYA94sAphWBA5efEsaA6X2wCdyaH7PXuBtv2H5S1'
+VALID_ADDR_2 = '8kjqqnF3m6agp9auU7k4TWAhuGygFAgPzbNH3shp4HFL'
+
+
+@pytest.yield_fixture(params=[True, False], ids=['summary', 'no_summary'])  # noqa
+def utxo_cache(parametrised_storage, request) -> ShardedUTXOCache:
+    cache = ShardedUTXOCache(parametrised_storage, with_summary=request.param)
+    yield cache
+    cache.reject_batch()
+
+
+def test_add_and_get_outputs_sorted_by_seq_no(utxo_cache):
+    for seq_no, amount in [(19, 100), (4, 1), (256, 7), (6, 31)]:
+        utxo_cache.add_output(Output(VALID_ADDR_1, seq_no, amount), True)
+    utxo_cache.add_output(Output(VALID_ADDR_2, 5, 5), True)
+
+    assert utxo_cache.get_unspent_outputs(VALID_ADDR_1, True) == [Output(VALID_ADDR_1, 4, 1),
+                                                                  Output(VALID_ADDR_1, 6, 31),
+                                                                  Output(VALID_ADDR_1, 19, 100),
+                                                                  Output(VALID_ADDR_1, 256, 7)]
+    assert utxo_cache.get_unspent_outputs(VALID_ADDR_2, True) == [Output(VALID_ADDR_2, 5, 5)]
+    assert utxo_cache.get_summary(VALID_ADDR_1, True) == (4, 139)
+    assert utxo_cache.get_balance(VALID_ADDR_1, True) == 139
+
+
+def test_get_unspent_outputs_page(utxo_cache):
+    outputs = [Output(VALID_ADDR_1, seq_no, seq_no * 10) for seq_no in (3, 5, 8, 13, 21)]
+    for output in outputs:
+        utxo_cache.add_output(output, True)
+    utxo_cache.add_output(Output(VALID_ADDR_2, 4, 4), True)
+
+    assert utxo_cache.get_unspent_outputs_page(VALID_ADDR_1, is_committed=True) == (outputs, None)
+    assert utxo_cache.get_unspent_outputs_page(VALID_ADDR_1, 0, 2, True) == (outputs[:2], 8)
+    assert utxo_cache.get_unspent_outputs_page(VALID_ADDR_1, 9, 10, True) == (outputs[3:], None)
+
+    utxo_cache.spend_output(outputs[0])
+    assert utxo_cache.get_unspent_outputs_page(VALID_ADDR_1, 0, 2) == (outputs[1:3], 13)
+    assert utxo_cache.get_unspent_outputs_page(VALID_ADDR_1, 0, 2, True) == (outputs[:2], 8)
+
+
+def test_spend_output(utxo_cache):
+    output = Output(VALID_ADDR_1, 10, 10)
+    utxo_cache.add_output(output, True)
+    utxo_cache.spend_output(output, True)
+    assert utxo_cache.get_unspent_outputs(VALID_ADDR_1, True) == []
+    assert utxo_cache.get_summary(VALID_ADDR_1, True) == (0, 0)
+
+    with pytest.raises(UTXOError):
+        utxo_cache.spend_output(output, True)
+
+
+def test_spend_unadded_output_fails(utxo_cache):
+    with pytest.raises(UTXOError):
+        utxo_cache.spend_output(Output(VALID_ADDR_1, 10, None))
+
+
+def test_add_invalid_output(utxo_cache):
+    with pytest.raises(UTXOError):
+        utxo_cache.add_output((VALID_ADDR_1, 10, 10))
+
+
+def test_sum_inputs(utxo_cache):
+    utxo_cache.add_output(Output(VALID_ADDR_1, 10, 10), True)
+    utxo_cache.add_output(Output(VALID_ADDR_1, 11, 100), False)
+    utxo_cache.add_output(Output(VALID_ADDR_2, 11, 50), False)
+
+    assert utxo_cache.sum_inputs([{"address": VALID_ADDR_1, "seqNo": 10},
+                                  {"address": VALID_ADDR_1, "seqNo": 11},
+                                  {"address": VALID_ADDR_2, "seqNo": 11}]) == 160
+    with pytest.raises(UTXOError):
+        utxo_cache.sum_inputs([{"address": VALID_ADDR_1, "seqNo": 11}], True)
+
+
+def test_uncommitted_spend_is_hidden_until_commit(utxo_cache):
+    committed = Output(VALID_ADDR_1, 10, 10)
+    utxo_cache.add_output(committed, True)
+
+    utxo_cache.spend_output(committed)
+    new_output = Output(VALID_ADDR_1, 12, 10)
+    utxo_cache.add_output(new_output)
+    assert utxo_cache.get_unspent_outputs(VALID_ADDR_1) == [new_output]
+    assert utxo_cache.get_unspent_outputs(VALID_ADDR_1, True) == [committed]
+
+    utxo_cache.create_batch_from_current(b'root1')
+    assert utxo_cache.get_unspent_outputs(VALID_ADDR_1) == [new_output]
+    assert utxo_cache.get_summary(VALID_ADDR_1) == (1, 10)
+
+    utxo_cache.commit_batch()
+    assert utxo_cache.get_unspent_outputs(VALID_ADDR_1, True) == [new_output]
+    assert utxo_cache.get_summary(VALID_ADDR_1, True) == (1, 10)
+    with pytest.raises(UTXOError):
+        utxo_cache.sum_inputs([{"address": VALID_ADDR_1, "seqNo": 10}], True)
+
+
+def test_rejected_batch_is_discarded(utxo_cache):
+    committed = Output(VALID_ADDR_1, 10, 10)
+    utxo_cache.add_output(committed, True)
+
+    utxo_cache.spend_output(committed)
+    utxo_cache.add_output(Output(VALID_ADDR_1, 12, 10))
+    utxo_cache.create_batch_from_current(b'root1')
+    utxo_cache.reject_batch()
+
+    assert utxo_cache.get_unspent_outputs(VALID_ADDR_1) == [committed]
+    assert utxo_cache.get_summary(VALID_ADDR_1) == (1, 10)
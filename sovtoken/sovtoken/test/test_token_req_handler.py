@@ -17,6 +17,7 @@ from sovtoken.exceptions import ExtraFundsError, InsufficientFundsError, TokenVa
 from sovtoken.test.txn_response import TxnResponse, get_sorted_signatures
 from sovtoken.token_req_handler import TokenReqHandler
 from sovtoken.types import Output
+from sovtoken.utxo_cache import UTXOAmounts
 
 # Test Constants
 VALID_IDENTIFIER = "6ouriXMZkLeHsuXrN1X1fd"
@@ -311,7 +312,7 @@ def test_token_req_handler_onBatchCreated_success(
     key = token_handler_a.utxo_cache._create_key(output)
     assert token_handler_a.utxo_cache.un_committed[0][0] == state_root
     assert key in token_handler_a.utxo_cache.un_committed[0][1]
-    assert '{}:{}'.format(str(output.seqNo), str(output.amount)) in token_handler_a.utxo_cache.un_committed[0][1][key]
+    assert output in UTXOAmounts(address, token_handler_a.utxo_cache.un_committed[0][1][key]).as_output_list()
 
 
 def test_token_req_handler_onBatchRejected_success(addresses, token_handler_a):
@@ -368,7 +369,7 @@ def test_token_req_handler_get_query_response_success(
     assert results == {
         ADDRESS: address1,
         TXN_TYPE: GET_UTXO,
-        OUTPUTS: [Output(address=address1, seq_no=1, value=40)],
+        OUTPUTS: [{"address": address1, "seqNo": 1, "amount": 40}],
         IDENTIFIER: VALID_IDENTIFIER,
         TXN_PAYLOAD_METADATA_REQ_ID: request.reqId
     }
@@ -404,7 +405,7 @@ def test_token_req_handler_get_all_utxo_success(
         ADDRESS: address1,
         TXN_TYPE: GET_UTXO,
         OUTPUTS: [
-            Output(address=address1, seq_no=1, value=40)
+            {"address": address1, "seqNo": 1, "amount": 40}
         ],
         IDENTIFIER: VALID_IDENTIFIER,
         TXN_PAYLOAD_METADATA_REQ_ID: request.reqId
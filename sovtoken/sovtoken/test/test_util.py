@@ -1,9 +1,13 @@
+import pytest
 from base58 import b58decode
 
+from plenum.common.exceptions import UnknownIdentifier
+
 from plenum.common.signer_simple import SimpleSigner
 from sovtoken.types import Output
 from sovtoken.util import verkey_to_address, \
-    address_to_verkey, SortedItems
+    address_to_verkey, SortedItems, decode_address_to_vk_bytes, \
+    _cached_decode_address_to_vk_bytes
 
 
 def test_address_to_verkey_and_vice_versa():
@@ -18,6 +22,20 @@ def test_address_to_verkey_and_vice_versa():
         assert signer.verkey == verkey
 
 
+def test_decoded_addresses_are_cached():
+    address = verkey_to_address(SimpleSigner().verkey)
+    vk_bytes = decode_address_to_vk_bytes(address)
+    hits = _cached_decode_address_to_vk_bytes.cache_info().hits
+    assert decode_address_to_vk_bytes(address) == vk_bytes
+    assert decode_address_to_vk_bytes(address.encode()) == vk_bytes
+    assert _cached_decode_address_to_vk_bytes.cache_info().hits == hits + 2
+
+    # Invalid addresses are not cached and keep raising
+    for _ in range(2):
+        with pytest.raises(UnknownIdentifier):
+            decode_address_to_vk_bytes(address[:-1] + ('1' if address[-1] != '1' else '2'))
+
+
 def test_outputs_in_order():
     o1 = Output('a', 1, 8)
     o2 = Output('a', 2, 9)
@@ -9,7 +9,7 @@ from plenum.common.util import randomString
 
 from sovtoken.exceptions import UTXOError, UTXONotFound
 from sovtoken.types import Output
-from sovtoken.utxo_cache import UTXOCache
+from sovtoken.utxo_cache import UTXOCache, UTXOAmounts
 from storage.test.conftest import parametrised_storage
 
 # Test Constants
@@ -17,9 +17,9 @@ VALID_ADDR_1 = '6baBEYA94sAphWBA5efEsaA6X2wCdyaH7PXuBtv2H5S1'
 VALID_ADDR_2 = '8kjqqnF3m6agp9auU7k4TWAhuGygFAgPzbNH3shp4HFL'
 
 
-@pytest.yield_fixture()  # noqa
-def utxo_cache(parametrised_storage) -> UTXOCache:
-    cache = UTXOCache(parametrised_storage)
+@pytest.yield_fixture(params=[0, 2, 1000], ids=['no_lru', 'small_lru', 'lru'])  # noqa
+def utxo_cache(parametrised_storage, request) -> UTXOCache:
+    cache = UTXOCache(parametrised_storage, cache_size=request.param)
     yield cache
     cache.reject_batch()
 
@@ -205,4 +205,149 @@ def test_sum_inputs_different_addresses(utxo_cache):
 def test_create_key(utxo_cache):
     output = Output(VALID_ADDR_1, 10, 10)
     key = utxo_cache._create_key(output)
-    assert key == '6baBEYA94sAphWBA5efEsaA6X2wCdyaH7PXuBtv2H5S1'
\ No newline at end of file
+    assert key == '6baBEYA94sAphWBA5efEsaA6X2wCdyaH7PXuBtv2H5S1'
+
+def test_legacy_values_are_read_and_migrated(utxo_cache):
+    utxo_cache.set(VALID_ADDR_1, '19:100:4:1:6:31', is_committed=True)
+    utxo_cache.set(VALID_ADDR_2, '3:5', is_committed=True)
+
+    assert utxo_cache.get_unspent_outputs(VALID_ADDR_1, True) == [Output(VALID_ADDR_1, 4, 1),
+                                                                  Output(VALID_ADDR_1, 6, 31),
+                                                                  Output(VALID_ADDR_1, 19, 100)]
+    assert utxo_cache.sum_inputs([{"address": VALID_ADDR_1, "seqNo": 6},
+                                  {"address": VALID_ADDR_2, "seqNo": 3}], True) == 36
+
+    # A write to the address rewrites the value in the binary format
+    utxo_cache.spend_output(Output(VALID_ADDR_1, 6, None), True)
+    assert not UTXOAmounts.is_legacy(utxo_cache.get(VALID_ADDR_1, is_committed=True))
+
+    assert utxo_cache.migrate_legacy_values() == 1
+    assert not UTXOAmounts.is_legacy(utxo_cache.get(VALID_ADDR_2, is_committed=True))
+    assert utxo_cache.migrate_legacy_values() == 0
+    assert utxo_cache.get_unspent_outputs(VALID_ADDR_2, True) == [Output(VALID_ADDR_2, 3, 5)]
+    assert utxo_cache.get_unspent_outputs(VALID_ADDR_1, True) == [Output(VALID_ADDR_1, 4, 1),
+                                                                  Output(VALID_ADDR_1, 19, 100)]
+
+
+def test_lru_uncommitted_changes_survive_eviction_and_batches(parametrised_storage):
+    utxo_cache = UTXOCache(parametrised_storage, cache_size=1)
+    output1 = Output(VALID_ADDR_1, 10, 10)
+    output2 = Output(VALID_ADDR_2, 11, 20)
+    utxo_cache.add_output(output1)
+    # Evicts the dirty entry of the first address, it is written back to the current batch
+    utxo_cache.add_output(output2)
+    assert utxo_cache.cache_evictions == 1
+    assert utxo_cache.get_unspent_outputs(VALID_ADDR_1) == [output1]
+
+    utxo_cache.create_batch_from_current(b'root1')
+    assert UTXOAmounts(VALID_ADDR_2, utxo_cache.un_committed[0][1][VALID_ADDR_2]).as_output_list() == [output2]
+    assert utxo_cache.get_unspent_outputs(VALID_ADDR_1, True) == []
+
+    utxo_cache.commit_batch()
+    assert utxo_cache.get_unspent_outputs(VALID_ADDR_1, True) == [output1]
+    assert utxo_cache.get_unspent_outputs(VALID_ADDR_2, True) == [output2]
+
+
+def test_lru_rejected_batches_are_not_served_from_cache(parametrised_storage):
+    utxo_cache = UTXOCache(parametrised_storage, cache_size=10)
+    committed = Output(VALID_ADDR_1, 10, 10)
+    utxo_cache.add_output(committed, True)
+
+    utxo_cache.spend_output(committed)
+    utxo_cache.add_output(Output(VALID_ADDR_1, 12, 5))
+    utxo_cache.create_batch_from_current(b'root1')
+    utxo_cache.add_output(Output(VALID_ADDR_1, 13, 5))
+    assert utxo_cache.sum_inputs([{"address": VALID_ADDR_1, "seqNo": 13}]) == 5
+
+    utxo_cache.reject_batch()
+    assert utxo_cache.get_unspent_outputs(VALID_ADDR_1) == [committed]
+    assert utxo_cache.sum_inputs([{"address": VALID_ADDR_1, "seqNo": 10}]) == 10
+    assert utxo_cache.get_unspent_outputs(VALID_ADDR_1, True) == [committed]
+
+
+def test_lru_counters(parametrised_storage):
+    utxo_cache = UTXOCache(parametrised_storage, cache_size=10)
+    utxo_cache.add_output(Output(VALID_ADDR_1, 10, 10), True)
+    assert utxo_cache.cache_stats['misses'] == 1
+    utxo_cache.sum_inputs([{"address": VALID_ADDR_1, "seqNo": 10}], True)
+    utxo_cache.get_unspent_outputs(VALID_ADDR_1, True)
+    assert utxo_cache.cache_stats['hits'] == 2
+    assert utxo_cache.cache_stats['committed_size'] == 1
+
+
+@pytest.mark.parametrize('is_committed', [True, False])
+def test_failed_update_outputs_changes_nothing(utxo_cache, is_committed):
+    utxo_cache.add_output(Output(VALID_ADDR_1, 1, 10), True)
+    utxo_cache.add_output(Output(VALID_ADDR_1, 2, 20), True)
+    # Read once so the outputs of the address are cached
+    assert utxo_cache.get_balance(VALID_ADDR_1, is_committed) == 30
+    assert len(utxo_cache.get_unspent_outputs(VALID_ADDR_1, is_committed)) == 2
+
+    with pytest.raises(UTXONotFound):
+        utxo_cache.update_outputs(VALID_ADDR_1, [(1, None), (99, None)], is_committed=is_committed)
+    assert utxo_cache.get_unspent_outputs(VALID_ADDR_1, is_committed) == [Output(VALID_ADDR_1, 1, 10),
+                                                                          Output(VALID_ADDR_1, 2, 20)]
+    assert utxo_cache.get_balance(VALID_ADDR_1, is_committed) == 30
+    assert utxo_cache.sum_inputs([{"address": VALID_ADDR_1, "seqNo": 1}], is_committed) == 10
+
+
+def test_balance_follows_outputs(utxo_cache):
+    assert utxo_cache.get_balance(VALID_ADDR_1) == 0
+    utxo_cache.add_output(Output(VALID_ADDR_1, 10, 10), True)
+    utxo_cache.add_output(Output(VALID_ADDR_1, 11, 20), True)
+    # Re-applying an output does not count it twice
+    utxo_cache.add_output(Output(VALID_ADDR_1, 11, 20), True)
+    assert utxo_cache.get_balance(VALID_ADDR_1, True) == 30
+
+    utxo_cache.spend_output(Output(VALID_ADDR_1, 10, None))
+    utxo_cache.add_output(Output(VALID_ADDR_2, 12, 5))
+    assert utxo_cache.get_balance(VALID_ADDR_1) == 20
+    assert utxo_cache.get_balance(VALID_ADDR_1, True) == 30
+    assert utxo_cache.get_balance(VALID_ADDR_2) == 5
+
+    utxo_cache.create_batch_from_current(b'root1')
+    utxo_cache.commit_batch()
+    assert utxo_cache.get_balance(VALID_ADDR_1, True) == 20
+    assert utxo_cache.get_balance(VALID_ADDR_2, True) == 5
+    assert utxo_cache.get_unspent_outputs(VALID_ADDR_1, True) == [Output(VALID_ADDR_1, 11, 20)]
+
+
+def test_balance_of_rejected_batch_is_discarded(utxo_cache):
+    utxo_cache.add_output(Output(VALID_ADDR_1, 10, 10), True)
+    utxo_cache.add_output(Output(VALID_ADDR_1, 11, 20))
+    utxo_cache.create_batch_from_current(b'root1')
+    assert utxo_cache.get_balance(VALID_ADDR_1) == 30
+    utxo_cache.reject_batch()
+    assert utxo_cache.get_balance(VALID_ADDR_1) == 10
+
+
+def test_ensure_balance_index(utxo_cache):
+    utxo_cache._store.put(VALID_ADDR_1, UTXOAmounts(VALID_ADDR_1, '1:10:2:20').encode())
+    utxo_cache._store.put(VALID_ADDR_2, '3:7')
+    assert utxo_cache.get_balance(VALID_ADDR_1, True) == 0
+
+    assert utxo_cache.ensure_balance_index() == 2
+    assert utxo_cache.get_balance(VALID_ADDR_1, True) == 30
+    assert utxo_cache.get_balance(VALID_ADDR_2, True) == 7
+    assert utxo_cache.ensure_balance_index() == 0
+
+    # Index keys are not taken for addresses by the legacy migration
+    assert utxo_cache.migrate_legacy_values() == 1
+    assert utxo_cache.get_balance(VALID_ADDR_2, True) == 7
+
+
+def test_get_unspent_outputs_page(utxo_cache):
+    outputs = [Output(VALID_ADDR_1, seq_no, seq_no * 10) for seq_no in (3, 5, 8, 13, 21)]
+    for output in outputs:
+        utxo_cache.add_output(output, True)
+
+    assert utxo_cache.get_unspent_outputs_page(VALID_ADDR_1, is_committed=True) == (outputs, None)
+    assert utxo_cache.get_unspent_outputs_page(VALID_ADDR_1, 0, 2, True) == (outputs[:2], 8)
+    assert utxo_cache.get_unspent_outputs_page(VALID_ADDR_1, 8, 2, True) == (outputs[2:4], 21)
+    assert utxo_cache.get_unspent_outputs_page(VALID_ADDR_1, 9, 10, True) == (outputs[3:], None)
+    assert utxo_cache.get_unspent_outputs_page(VALID_ADDR_1, 22, 10, True) == ([], None)
+    assert utxo_cache.get_unspent_outputs_page(VALID_ADDR_2, 0, 10, True) == ([], None)
+
+    utxo_cache.add_output(Output(VALID_ADDR_1, 4, 1))
+    assert utxo_cache.get_unspent_outputs_page(VALID_ADDR_1, 0, 2) == ([outputs[0], Output(VALID_ADDR_1, 4, 1)], 5)
+    assert utxo_cache.get_unspent_outputs_page(VALID_ADDR_1, 0, 2, True) == (outputs[:2], 8)
@@ -0,0 +1,9 @@
+import pytest
+
+from sovtoken.test.helpers.helper_handler_env import TokenHandlerEnv
+
+
+@pytest.fixture
+def env():
+    # A token request handler keeping all the indexes of the utxo cache and the token ledger
+    return TokenHandlerEnv(audit_index=True, history_index=True, amount_index=True)
@@ -0,0 +1,239 @@
+import pytest
+
+from common.serializers.serialization import state_roots_serializer, proof_nodes_serializer
+from plenum.common.constants import STATE_PROOF, ROOT_HASH, PROOF_NODES
+from sovtoken.constants import GET_UTXO_FOR_AMOUNT, ADDRESS, AMOUNT, SEQNO, OUTPUTS, FEE, FEE_TXN_TYPE, XFER_PUBLIC
+from sovtoken.exceptions import UTXOError
+from sovtoken.test.helpers.helper_handler_env import TokenHandlerEnv
+from sovtoken.token_req_handler import TokenReqHandler
+from sovtoken.types import Output
+from sovtoken.utxo_cache import UTXOCache, UTXOAmountOrder
+from state.pruning_state import PruningState
+from storage.kv_in_memory import KeyValueStorageInMemory
+
+ADDRESS_1 = '6baBEYA94sAphWBA5efEsaA6X2wCdyaH7PXuBtv2H5S1'
+ADDRESS_2 = '2FKYJkgXRZtjhFpTMHNxDi6F2YrmhjanLBE2Uz8TpZQ'
+
+
+def amount_order(*outputs) -> UTXOAmountOrder:
+    # Order of `(seq no, amount)` outputs
+    order = UTXOAmountOrder(ADDRESS_1)
+    for seq_no, amount in outputs:
+        order.add(seq_no, amount)
+    return order
+
+
+def indexed(cache: UTXOCache, address=ADDRESS_1, is_committed=False):
+    order = cache.get_outputs_by_amount(address, is_committed=is_committed)
+    return list(zip(order.seq_nos, order.amounts))
+
+
+def test_amount_order():
+    order = amount_order((1, 30), (2, 10), (3, 20), (4, 10))
+    assert order.amounts == [10, 10, 20, 30]
+    assert order.seq_nos == [2, 4, 3, 1]
+    order.remove(4, 10)
+    order.remove(1, 30)
+    # Missing outputs are ignored
+    order.remove(3, 25)
+    assert list(zip(order.seq_nos, order.amounts)) == [(2, 10), (3, 20)]
+    assert UTXOAmountOrder(ADDRESS_1, order.encode()).seq_nos == [2, 3]
+
+
+@pytest.mark.parametrize('target, expected', [
+    # The smallest output covering the target
+    (5, [(2, 5)]),
+    (7, [(3, 9)]),
+    (40, [(5, 40)]),
+    # The largest outputs, the last swapped for a smaller one covering the rest
+    (41, [(5, 40), (1, 1)]),
+    (47, [(5, 40), (3, 9)]),
+    (58, [(5, 40), (4, 20)]),
+    (70, [(5, 40), (4, 20), (3, 9), (1, 1)]),
+    (75, [(5, 40), (4, 20), (3, 9), (2, 5), (1, 1)]),
+    # Not enough
+    (76, []),
+])
+def test_select(target, expected):
+    order = amount_order((1, 1), (2, 5), (3, 9), (4, 20), (5, 40))
+    selected = order.select(target)
+    assert selected == expected
+    if selected:
+        assert sum(a for _, a in selected) >= target
+
+
+def test_select_limit():
+    order = amount_order(*[(seq_no, 10) for seq_no in range(1, 11)])
+    assert len(order.select(100)) == 10
+    assert order.select(100, limit=9) == []
+    assert len(order.select(90, limit=9)) == 9
+
+
+@pytest.mark.parametrize('cache_size', [0, 10])
+def test_index_follows_cache(cache_size):
+    cache = UTXOCache(KeyValueStorageInMemory(), cache_size=cache_size, amount_index=True)
+    cache.add_output(Output(ADDRESS_1, 1, 30), is_committed=True)
+    cache.add_output(Output(ADDRESS_1, 2, 10), is_committed=True)
+    assert indexed(cache, is_committed=True) == [(2, 10), (1, 30)]
+
+    cache.spend_output(Output(ADDRESS_1, 1, None))
+    cache.update_outputs(ADDRESS_1, [(3, 5), (4, 50), (3, None), (5, 20)])
+    # Output re-applied with another amount
+    cache.add_output(Output(ADDRESS_1, 2, 15))
+    assert indexed(cache) == [(2, 15), (5, 20), (4, 50)]
+    assert indexed(cache, is_committed=True) == [(2, 10), (1, 30)]
+
+    cache.create_batch_from_current(b'1')
+    cache.reject_batch()
+    assert indexed(cache) == [(2, 10), (1, 30)]
+
+    cache.spend_output(Output(ADDRESS_1, 2, None))
+    cache.create_batch_from_current(b'2')
+    cache.commit_batch()
+    assert indexed(cache, is_committed=True) == [(1, 30)]
+
+
+def test_index_matches_sorted_outputs():
+    kv = KeyValueStorageInMemory()
+    cache = UTXOCache(kv)
+    for seq_no, amount in [(1, 7), (2, 3), (3, 7), (4, 1)]:
+        cache.add_output(Output(ADDRESS_1, seq_no, amount), is_committed=True)
+    without_index = indexed(cache, is_committed=True)
+    assert without_index == [(4, 1), (2, 3), (1, 7), (3, 7)]
+
+    # Built on the first start with the index enabled
+    cache = UTXOCache(kv, amount_index=True)
+    assert cache.ensure_amount_index() == 1
+    assert cache.ensure_amount_index() == 0
+    assert indexed(cache, is_committed=True) == without_index
+
+    # Disabled and enabled again, the records left are replaced
+    cache = UTXOCache(kv)
+    cache.remove_meta(UTXOCache.AMOUNT_INDEX_MARKER)
+    cache.spend_output(Output(ADDRESS_1, 4, None), is_committed=True)
+    cache = UTXOCache(kv, amount_index=True)
+    assert cache.ensure_amount_index() == 1
+    assert indexed(cache, is_committed=True) == without_index[1:]
+
+
+def test_index_rebuilt_with_cache():
+    cache = UTXOCache(KeyValueStorageInMemory(), amount_index=True)
+    cache.add_output(Output(ADDRESS_1, 1, 5), is_committed=True)
+    cache.rebuild([(ADDRESS_1, [2, 3], [8, 4])])
+    assert indexed(cache, is_committed=True) == [(3, 4), (2, 8)]
+    assert cache.has_marker(UTXOCache.AMOUNT_INDEX_MARKER)
+
+    cache.amount_index = False
+    cache.rebuild([(ADDRESS_1, [2], [8])])
+    assert not cache.has_marker(UTXOCache.AMOUNT_INDEX_MARKER)
+    with pytest.raises(KeyError):
+        cache.get(UTXOCache._amount_key(ADDRESS_1), is_committed=True)
+
+
+
+def test_dust_outputs():
+    cache = UTXOCache(KeyValueStorageInMemory(), amount_index=True, dust_threshold=10)
+    cache.update_outputs(ADDRESS_1, [(1, 3), (2, 50), (3, 9), (4, 10)], is_committed=True)
+    assert cache.get_dust_outputs(ADDRESS_1, is_committed=True) == [Output(ADDRESS_1, 1, 3), Output(ADDRESS_1, 3, 9)]
+    assert cache.get_dust_outputs(ADDRESS_1, threshold=4, is_committed=True) == [Output(ADDRESS_1, 1, 3)]
+    assert cache.get_dust_outputs(ADDRESS_2, is_committed=True) == []
+    # Same without the index
+    cache.amount_index = False
+    assert cache.get_dust_outputs(ADDRESS_1, is_committed=True) == [Output(ADDRESS_1, 1, 3), Output(ADDRESS_1, 3, 9)]
+    with pytest.raises(UTXOError):
+        cache.get_dust_count()
+
+
+@pytest.mark.parametrize('cache_size', [0, 10])
+def test_dust_count_follows_cache(cache_size):
+    cache = UTXOCache(KeyValueStorageInMemory(), cache_size=cache_size, amount_index=True, dust_threshold=10)
+    cache.update_outputs(ADDRESS_1, [(1, 3), (2, 50)], is_committed=True)
+    cache.add_output(Output(ADDRESS_2, 3, 1), is_committed=True)
+    assert cache.get_dust_count(is_committed=True) == 2
+
+    cache.spend_output(Output(ADDRESS_1, 1, None))
+    cache.update_outputs(ADDRESS_2, [(4, 5), (5, 100), (4, None)])
+    # Output re-applied with an amount over the threshold
+    cache.add_output(Output(ADDRESS_2, 3, 20))
+    assert cache.get_dust_count() == 0
+    assert cache.get_dust_count(is_committed=True) == 2
+
+    cache.create_batch_from_current(b'1')
+    cache.reject_batch()
+    assert cache.get_dust_count() == 2
+
+    cache.add_output(Output(ADDRESS_1, 6, 7))
+    cache.create_batch_from_current(b'2')
+    cache.commit_batch()
+    assert cache.get_dust_count(is_committed=True) == 3
+
+
+def test_dust_count_recounted():
+    kv = KeyValueStorageInMemory()
+    cache = UTXOCache(kv)
+    cache.update_outputs(ADDRESS_1, [(1, 3), (2, 50), (3, 9)], is_committed=True)
+    cache.update_outputs(ADDRESS_2, [(4, 8)], is_committed=True)
+
+    cache = UTXOCache(kv, amount_index=True, dust_threshold=10)
+    cache.ensure_amount_index()
+    assert cache.ensure_dust_count() == 3
+    assert cache.ensure_dust_count() is None
+    assert cache.get_dust_count(is_committed=True) == 3
+
+    # A new threshold is counted again
+    cache = UTXOCache(kv, amount_index=True, dust_threshold=5)
+    assert cache.ensure_amount_index() == 0
+    assert cache.ensure_dust_count() == 1
+
+    # Not kept for a while, counted again once kept
+    cache = UTXOCache(kv, amount_index=True)
+    assert cache.ensure_dust_count() is None
+    cache.spend_output(Output(ADDRESS_1, 1, None), is_committed=True)
+    cache = UTXOCache(kv, amount_index=True, dust_threshold=5)
+    assert cache.ensure_dust_count() == 0
+
+    cache.rebuild([(ADDRESS_1, [2, 3], [50, 4]), (ADDRESS_2, [4], [1])])
+    assert cache.get_dust_count(is_committed=True) == 2
+    assert cache.ensure_dust_count() is None
+    cache.dust_threshold = 0
+    cache.rebuild([(ADDRESS_1, [2], [50])])
+    assert cache.get_meta(UTXOCache.DUST_THRESHOLD_META) is None
+    with pytest.raises(KeyError):
+        cache.get(UTXOCache.DUST_COUNT_KEY, is_committed=True)
+
+
+def verify_outputs_proof(reply):
+    proof = reply[STATE_PROOF]
+    key_values = {TokenReqHandler.create_state_key(o[ADDRESS], o[SEQNO]): str(o[AMOUNT]).encode()
+                  for o in reply[OUTPUTS]}
+    return PruningState.verify_state_proof_multi(state_roots_serializer.deserialize(proof[ROOT_HASH]),
+                                                 key_values, proof_nodes_serializer.deserialize(proof[PROOF_NODES]),
+                                                 serialized=True)
+
+
+@pytest.mark.parametrize('amount_index', [False, True])
+def test_get_utxo_for_amount(amount_index):
+    env = TokenHandlerEnv(amount_index=amount_index)
+    address = env.new_address()
+    seq_nos = [env.mint([(address, amount)]) for amount in (3, 50, 8, 20)]
+
+    reply = env.handler.get_query_response(env.query_request(GET_UTXO_FOR_AMOUNT, {ADDRESS: address, AMOUNT: 9}))
+    assert reply[OUTPUTS] == [{ADDRESS: address, SEQNO: seq_nos[3], AMOUNT: 20}]
+    assert reply[FEE] == 0
+    assert verify_outputs_proof(reply)
+
+    reply = env.handler.get_query_response(env.query_request(GET_UTXO_FOR_AMOUNT, {ADDRESS: address, AMOUNT: 55}))
+    assert reply[OUTPUTS] == [{ADDRESS: address, SEQNO: seq_nos[1], AMOUNT: 50},
+                              {ADDRESS: address, SEQNO: seq_nos[2], AMOUNT: 8}]
+    assert verify_outputs_proof(reply)
+    assert env.handler.get_query_response(
+        env.query_request(GET_UTXO_FOR_AMOUNT, {ADDRESS: address, AMOUNT: 82}))[OUTPUTS] == []
+
+    # The fee of the txn type is added to the amount
+    env.handler.get_committed_fee = lambda txn_type: {XFER_PUBLIC: 1}.get(txn_type, 0)
+    request = env.query_request(GET_UTXO_FOR_AMOUNT, {ADDRESS: address, AMOUNT: 80, FEE_TXN_TYPE: XFER_PUBLIC})
+    reply = env.handler.get_query_response(request)
+    assert reply[FEE] == 1
+    assert sum(o[AMOUNT] for o in reply[OUTPUTS]) == 81
+    env.handler.get_committed_fee = lambda txn_type: 5
+    assert env.handler.get_query_response(request)[OUTPUTS] == []
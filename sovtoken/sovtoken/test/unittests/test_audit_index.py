@@ -0,0 +1,75 @@
+import pytest
+
+from plenum.common.exceptions import InvalidClientRequest
+from sovtoken.audit_index import AuditIndex
+from sovtoken.constants import GET_OUTPUT_AUDIT, SEQNO, ADDRESS, AMOUNT, OUTPUTS, SPENT_BY
+from sovtoken.test.helpers.helper_handler_env import TokenHandlerEnv
+from sovtoken.utxo_cache import UTXOCache
+from storage.kv_in_memory import KeyValueStorageInMemory
+
+
+def test_spent_and_created_outputs(env):
+    address_1, address_2 = env.new_address(), env.new_address()
+    mint_seq_no = env.mint([(address_1, 10), (address_2, 5)])
+    env.pay(address_1, mint_seq_no, 10, address_2)
+    env.commit_batch(1)
+    xfer_seq_no = env.ledger.size
+
+    index = env.handler.audit_index
+    assert index.get_created(mint_seq_no) == [(address_1, 10), (address_2, 5)]
+    assert index.get_created(xfer_seq_no) == [(address_2, 10)]
+    assert index.get_spent_by(address_1, mint_seq_no) == xfer_seq_no
+    assert index.get_spent_by(address_2, mint_seq_no) is None
+
+    result = env.handler.get_query_response(env.query_request(GET_OUTPUT_AUDIT, {SEQNO: mint_seq_no}))
+    assert result[OUTPUTS] == [
+        {ADDRESS: address_1, SEQNO: mint_seq_no, AMOUNT: 10, SPENT_BY: xfer_seq_no},
+        {ADDRESS: address_2, SEQNO: mint_seq_no, AMOUNT: 5, SPENT_BY: None},
+    ]
+    result = env.handler.get_query_response(env.query_request(GET_OUTPUT_AUDIT, {SEQNO: mint_seq_no, ADDRESS: address_2}))
+    assert result[OUTPUTS] == [{ADDRESS: address_2, SEQNO: mint_seq_no, AMOUNT: 5, SPENT_BY: None}]
+    assert env.handler.get_query_response(env.query_request(GET_OUTPUT_AUDIT, {SEQNO: xfer_seq_no + 1}))[OUTPUTS] == []
+
+
+def test_uncommitted_entries_follow_batches(env):
+    address_1, address_2 = env.new_address(), env.new_address()
+    mint_seq_no = env.mint([(address_1, 10)])
+    env.pay(address_1, mint_seq_no, 10, address_2)
+    index = env.handler.audit_index
+
+    assert index.get_spent_by(address_1, mint_seq_no, is_committed=False) == mint_seq_no + 1
+    assert index.get_spent_by(address_1, mint_seq_no) is None
+    assert index.get_created(mint_seq_no + 1) == []
+
+    env.handler.onBatchRejected()
+    assert index.get_spent_by(address_1, mint_seq_no, is_committed=False) is None
+    assert index.get_created(mint_seq_no + 1, is_committed=False) == []
+
+
+def test_index_built_from_ledger(env):
+    address_1, address_2 = env.new_address(), env.new_address()
+    mint_seq_no = env.mint([(address_1, 10), (address_2, 5)])
+    env.pay(address_1, mint_seq_no, 10, address_2)
+    env.commit_batch(1)
+
+    utxo_cache = UTXOCache(KeyValueStorageInMemory())
+    index = AuditIndex(utxo_cache)
+    assert index.ensure_index(env.ledger, chunk_size=1) == 2
+    assert index.ensure_index(env.ledger) == 0
+    for seq_no in (mint_seq_no, mint_seq_no + 1):
+        assert index.get_created(seq_no) == env.handler.audit_index.get_created(seq_no)
+    assert index.get_spent_by(address_1, mint_seq_no) == mint_seq_no + 1
+
+
+def test_index_kept_on_utxo_cache_rebuild(env):
+    address = env.new_address()
+    mint_seq_no = env.mint([(address, 10)])
+    env.utxo_cache.rebuild([(address, [mint_seq_no], [10])])
+    assert env.handler.audit_index.get_created(mint_seq_no) == [(address, 10)]
+
+
+def test_query_rejected_when_index_disabled():
+    request = TokenHandlerEnv.query_request(GET_OUTPUT_AUDIT, {SEQNO: 1})
+    with pytest.raises(InvalidClientRequest):
+        TokenHandlerEnv().handler.doStaticValidation(request)
+    TokenHandlerEnv(audit_index=True).handler.doStaticValidation(request)
@@ -0,0 +1,79 @@
+import pytest
+
+from sovtoken.catchup import TokenCatchupApplier
+from sovtoken.constants import TOKEN_LEDGER_ID
+from sovtoken.test.helpers.helper_handler_env import TokenHandlerEnv, CatchupNode, token_txns
+
+NUM_TXNS = 60
+NUM_ADDRESSES = 10
+
+
+@pytest.fixture(scope='module')
+def expected():
+    # State and utxo cache after applying the txns one by one
+    env = TokenHandlerEnv()
+    for txn in token_txns(NUM_TXNS, NUM_ADDRESSES):
+        env.handler.updateState([txn], isCommitted=True)
+        env.state.commit(rootHash=env.state.headHash)
+    return env
+
+
+def applier_of(env, chunk_size):
+    return TokenCatchupApplier(CatchupNode(env.handler), TOKEN_LEDGER_ID, env.ledger, env.state,
+                               env.utxo_cache, env.handler.tracker, chunk_size=chunk_size)
+
+
+def outputs_of(utxo_cache):
+    return sorted(utxo_cache.iter_committed_outputs(), key=lambda o: (o.address, o.seqNo))
+
+
+def assert_same_outputs(env, expected):
+    assert env.state.committedHeadHash == expected.state.committedHeadHash
+    assert outputs_of(env.utxo_cache) == outputs_of(expected.utxo_cache)
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 1000])
+@pytest.mark.parametrize('utxo_cache_size', [0, 3])
+def test_chunked_catchup_matches_txn_by_txn(expected, chunk_size, utxo_cache_size):
+    env = TokenHandlerEnv(utxo_cache_size=utxo_cache_size)
+    applier = applier_of(env, chunk_size)
+    applier.pre_catchup()
+    for txn in token_txns(NUM_TXNS, NUM_ADDRESSES):
+        env.ledger.add(txn)
+        applier.add_txn(TOKEN_LEDGER_ID, txn)
+    applier.post_catchup()
+
+    assert_same_outputs(env, expected)
+    assert env.handler.tracker.last_committed == (env.state.committedHeadHash, NUM_TXNS)
+    assert env.utxo_cache.un_committed == []
+    assert env.utxo_cache.get_meta(TokenCatchupApplier.AppliedSeqNoMeta) is None
+
+
+def test_tracker_and_meta_updated_once_per_chunk():
+    env = TokenHandlerEnv()
+    applier = applier_of(env, 7)
+    applier.pre_catchup()
+    for txn in token_txns(10, NUM_ADDRESSES):
+        applier.add_txn(TOKEN_LEDGER_ID, txn)
+
+    # The last 3 txns are buffered
+    assert env.handler.tracker.last_committed == (env.state.committedHeadHash, 7)
+    assert env.utxo_cache.get_meta(TokenCatchupApplier.AppliedSeqNoMeta) == '7'
+
+
+def test_interrupted_catchup_is_completed_by_next_one(expected):
+    env = TokenHandlerEnv()
+    applier = applier_of(env, 1000)
+    applier.pre_catchup()
+    for txn in token_txns(NUM_TXNS, NUM_ADDRESSES):
+        env.ledger.add(txn)
+        applier.add_txn(TOKEN_LEDGER_ID, txn)
+    # The node stops with all txns buffered, they are in the ledger only
+    assert env.utxo_cache.get_meta(TokenCatchupApplier.AppliedSeqNoMeta) == '0'
+
+    applier = applier_of(env, 1000)
+    applier.pre_catchup()
+    assert_same_outputs(env, expected)
+    assert env.utxo_cache.get_meta(TokenCatchupApplier.AppliedSeqNoMeta) == str(NUM_TXNS)
+    applier.post_catchup()
+    assert env.utxo_cache.get_meta(TokenCatchupApplier.AppliedSeqNoMeta) is None
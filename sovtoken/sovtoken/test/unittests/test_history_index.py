@@ -0,0 +1,103 @@
+import pytest
+
+from plenum.common.exceptions import InvalidClientRequest
+from plenum.common.txn_util import get_seq_no
+from sovtoken.constants import GET_TXN_HISTORY, ADDRESS, FROM_SEQNO, LIMIT, WITH_TXNS, SEQNOS, TXNS, NEXT_SEQNO
+from sovtoken.history_index import HistoryIndex, encode_seq_nos, decode_seq_nos
+from sovtoken.test.helpers.helper_handler_env import TokenHandlerEnv
+from sovtoken.utxo_cache import UTXOCache
+from storage.kv_in_memory import KeyValueStorageInMemory
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(HistoryIndex, 'CHUNK_SIZE', 3)
+
+
+def test_seq_nos_encoding():
+    seq_nos = [1, 2, 127, 128, 129, 300, 2 ** 32, 2 ** 32 + 1]
+    encoded = encode_seq_nos(seq_nos)
+    assert decode_seq_nos(encoded) == seq_nos
+    # Small deltas take a byte each
+    assert len(encode_seq_nos([1000, 1001, 1005, 1100])) == 5
+    assert decode_seq_nos(encode_seq_nos([])) == []
+
+
+def test_pages_across_chunks(small_chunks):
+    index = HistoryIndex(UTXOCache(KeyValueStorageInMemory()))
+    seq_nos = list(range(3, 60, 4))
+    for seq_no in seq_nos:
+        index._append('addr', seq_no,
+                      lambda key: index._read(key),
+                      lambda key, value: index.utxo_cache.set(key, value, is_committed=True))
+    assert index.get_count('addr') == len(seq_nos)
+    assert index.get_page('addr') == (seq_nos, None)
+    assert index.get_page('addr', limit=4) == (seq_nos[:4], seq_nos[4])
+    assert index.get_page('addr', from_seq_no=seq_nos[4], limit=4) == (seq_nos[4:8], seq_nos[8])
+    assert index.get_page('addr', from_seq_no=seq_nos[4] + 1) == (seq_nos[5:], None)
+    assert index.get_page('addr', from_seq_no=seq_nos[-1] + 1) == ([], None)
+    assert index.get_page('other') == ([], None)
+
+
+def test_history_of_addresses(env):
+    address_1, address_2, address_3 = env.new_address(), env.new_address(), env.new_address()
+    mint_seq_no = env.mint([(address_1, 10), (address_2, 5)])
+    env.apply_batch([env.xfer([(address_1, mint_seq_no)], [(address_3, 10)]),
+                     env.xfer([(address_2, mint_seq_no)], [(address_3, 5)])])
+    env.commit_batch(2)
+
+    index = env.handler.history_index
+    assert index.get_page(address_1) == ([mint_seq_no, mint_seq_no + 1], None)
+    assert index.get_page(address_2) == ([mint_seq_no, mint_seq_no + 2], None)
+    assert index.get_page(address_3) == ([mint_seq_no + 1, mint_seq_no + 2], None)
+
+    result = env.handler.get_query_response(env.query_request(GET_TXN_HISTORY, {ADDRESS: address_3, LIMIT: 1}))
+    assert result[SEQNOS] == [mint_seq_no + 1]
+    assert result[NEXT_SEQNO] == mint_seq_no + 2
+    assert TXNS not in result
+    result = env.handler.get_query_response(env.query_request(GET_TXN_HISTORY, {ADDRESS: address_3,
+                                                                                 FROM_SEQNO: mint_seq_no + 2,
+                                                                                 WITH_TXNS: True}))
+    assert result[SEQNOS] == [mint_seq_no + 2]
+    assert result[NEXT_SEQNO] is None
+    assert [get_seq_no(txn) for txn in result[TXNS]] == [mint_seq_no + 2]
+
+
+def test_uncommitted_appends_follow_batches(env, small_chunks):
+    address_1, address_2 = env.new_address(), env.new_address()
+    mint_seq_no = env.mint([(address_1, 10)])
+    env.pay(address_1, mint_seq_no, 10, address_2)
+    index = env.handler.history_index
+
+    assert index.get_page(address_1, is_committed=False) == ([mint_seq_no, mint_seq_no + 1], None)
+    assert index.get_page(address_1) == ([mint_seq_no], None)
+    assert index.get_count(address_2) == 0
+
+    env.handler.onBatchRejected()
+    assert index.get_page(address_1, is_committed=False) == ([mint_seq_no], None)
+    assert index.get_count(address_2, is_committed=False) == 0
+
+
+def test_index_built_from_ledger(env, small_chunks):
+    addresses = [env.new_address() for _ in range(2)]
+    seq_nos = [env.mint([(address, 10) for address in addresses]) for _ in range(4)]
+
+    utxo_cache = UTXOCache(KeyValueStorageInMemory())
+    index = HistoryIndex(utxo_cache)
+    assert index.ensure_index(env.ledger, chunk_size=3) == 4
+    assert index.ensure_index(env.ledger) == 0
+    for address in addresses:
+        assert index.get_page(address) == (seq_nos, None)
+        assert index.get_page(address) == env.handler.history_index.get_page(address)
+
+    # An index enabled again starts over instead of appending to the old history
+    utxo_cache.remove_meta(HistoryIndex.INDEX_MARKER)
+    assert index.ensure_index(env.ledger) == 4
+    assert index.get_page(addresses[0]) == (seq_nos, None)
+
+
+def test_query_rejected_when_index_disabled():
+    request = TokenHandlerEnv.query_request(GET_TXN_HISTORY, {ADDRESS: TokenHandlerEnv().new_address()})
+    with pytest.raises(InvalidClientRequest):
+        TokenHandlerEnv().handler.doStaticValidation(request)
+    TokenHandlerEnv(history_index=True).handler.doStaticValidation(request)
@@ -0,0 +1,79 @@
+from datetime import datetime
+from types import SimpleNamespace
+
+from plenum.common.metrics_collector import KvStoreMetricsFormat, MetricsEvent, NullMetricsCollector, \
+    MetricsName
+from plenum.common.value_accumulator import ValueAccumulator
+from plenum.test.metrics.helper import MockMetricsCollector
+from sovtoken.metrics import TokenMetricsName, get_metrics, decode_metrics_event
+from sovtoken.test.helpers.helper_handler_env import TokenHandlerEnv
+from sovtoken.types import Output
+from sovtoken.utxo_cache import UTXOCache
+from storage.kv_in_memory import KeyValueStorageInMemory
+
+VALID_ADDR = '6baBEYA94sAphWBA5efEsaA6X2wCdyaH7PXuBtv2H5S1'
+
+
+def events_by_name(metrics: MockMetricsCollector) -> dict:
+    metrics.flush_accumulated()
+    return {event.name: event for event in metrics.events}
+
+
+def test_token_request_metrics():
+    env = TokenHandlerEnv()
+    request = env.funded_xfer(3)
+    metrics = MockMetricsCollector()
+    env.handler.metrics = env.authnr.metrics = metrics
+
+    env.authnr.authenticate(request.as_dict)
+    env.handler.validate(request)
+    env.apply_batch([request])
+    env.commit_batch(1)
+    env.handler.get_query_response(env.get_utxo(request.operation['outputs'][0]['address']))
+
+    events = events_by_name(metrics)
+    assert events[TokenMetricsName.SIGNATURE_VERIFICATIONS].sum == 3
+    for name in (TokenMetricsName.XFER_PUBLIC_AUTHENTICATE_TIME,
+                 TokenMetricsName.XFER_PUBLIC_VALIDATE_TIME,
+                 TokenMetricsName.XFER_PUBLIC_UPDATE_STATE_TIME,
+                 TokenMetricsName.TOKEN_UPDATE_STATE_FLUSH_TIME,
+                 TokenMetricsName.TOKEN_BATCH_CREATED_TIME,
+                 TokenMetricsName.TOKEN_BATCH_COMMITTED_TIME,
+                 TokenMetricsName.GET_UTXO_TIME):
+        assert events[name].count == 1
+    # The outputs and the balance of the sender and of the receiver are written once
+    assert events[TokenMetricsName.UTXO_CACHE_WRITES].sum == 4
+    assert events[TokenMetricsName.UTXO_CACHE_READS].sum > 0
+    assert events[TokenMetricsName.STATE_PROOF_SIZE].sum > 0
+
+
+def test_utxo_cache_reports_only_new_reads_and_writes():
+    utxo_cache = UTXOCache(KeyValueStorageInMemory())
+    metrics = MockMetricsCollector()
+    utxo_cache.add_output(Output(VALID_ADDR, 1, 10))
+    utxo_cache.add_output(Output(VALID_ADDR, 2, 10))
+
+    utxo_cache.report_metrics(metrics)
+    utxo_cache.report_metrics(metrics)
+    metrics.flush_accumulated()
+    writes = [e for e in metrics.events if e.name == TokenMetricsName.UTXO_CACHE_WRITES]
+    assert writes[0].count == 2
+    assert writes[0].sum == utxo_cache.writes == 4
+
+
+def test_get_metrics_enabled_from_config():
+    node = SimpleNamespace(config=SimpleNamespace(tokenMetricsEnabled=True), metrics=MockMetricsCollector())
+    assert get_metrics(node) is node.metrics
+
+    node.config.tokenMetricsEnabled = False
+    assert isinstance(get_metrics(node), NullMetricsCollector)
+
+
+def test_decode_token_metrics_event():
+    ts = datetime(2018, 10, 1, 12, 30, 15)
+    for value in (4.5, ValueAccumulator([1.0, 2.0, 6.0])):
+        event = MetricsEvent(ts, TokenMetricsName.FEES_CAN_PAY_TIME, value)
+        assert decode_metrics_event(*KvStoreMetricsFormat.encode(event)) == event
+
+    event = MetricsEvent(ts, MetricsName.LOOPER_RUN_TIME_SPENT, 1.0)
+    assert decode_metrics_event(*KvStoreMetricsFormat.encode(event)) == event
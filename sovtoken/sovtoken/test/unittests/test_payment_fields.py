@@ -0,0 +1,73 @@
+from collections import OrderedDict
+
+import pytest
+from base58 import b58encode_check
+
+from plenum.common.messages.fields import IterableField
+from sovtoken.messages.fields import PublicOutputsField, PublicInputsField
+from sovtoken.test.constants import VALID_ADDR_1, VALID_ADDR_2
+
+INVALID_LENGTH_ADDR = b58encode_check(b'1' * 33).decode()
+
+
+def legacy_validate(field, val, unique_key):
+    # Element by element validation followed by the uniqueness check, as the fields used to do
+    if not isinstance(val, (list, tuple)):
+        return field.validate(val)
+    error = IterableField._specific_validation(field, val)
+    if error:
+        return error
+    if len(val) != len({unique_key(a) for a in val}):
+        return field.unique_error
+
+
+OUTPUTS_CASES = [
+    [],
+    [{"address": VALID_ADDR_1, "amount": 10}],
+    [{"address": VALID_ADDR_1, "amount": 10}, {"address": VALID_ADDR_2, "amount": 20}],
+    [{"address": VALID_ADDR_1, "amount": 10}, {"address": VALID_ADDR_1, "amount": 20}],
+    [{"address": VALID_ADDR_1, "amount": 10}, {"address": VALID_ADDR_1, "amount": 0}],
+    [{"address": VALID_ADDR_1, "amount": 0}],
+    [{"address": VALID_ADDR_1, "amount": -3}],
+    [{"address": VALID_ADDR_1, "amount": "10"}],
+    [{"address": VALID_ADDR_1, "amount": 1.5}],
+    [{"address": VALID_ADDR_1, "amount": True}],
+    [{"address": INVALID_LENGTH_ADDR, "amount": 10}],
+    [{"address": 10, "amount": 10}],
+    [{"address": [VALID_ADDR_1], "amount": 10}],
+    [{"address": VALID_ADDR_1, "amount": 10}, [VALID_ADDR_2, 20]],
+    [OrderedDict([("address", VALID_ADDR_1), ("amount", 10)])],
+    "not a list",
+]
+
+INPUTS_CASES = [
+    [],
+    [{"address": VALID_ADDR_1, "seqNo": 1}],
+    [{"address": VALID_ADDR_1, "seqNo": 1}, {"address": VALID_ADDR_1, "seqNo": 2}],
+    [{"address": VALID_ADDR_1, "seqNo": 1}, {"address": VALID_ADDR_1, "seqNo": 1}],
+    [{"address": VALID_ADDR_1, "seqNo": 1}, {"address": VALID_ADDR_1, "seqNo": 1},
+     {"address": VALID_ADDR_2, "seqNo": 0}],
+    [{"address": VALID_ADDR_1, "seqNo": 0}],
+    [{"address": VALID_ADDR_1, "seqNo": "1"}],
+    [{"address": INVALID_LENGTH_ADDR, "seqNo": 1}],
+    [{"address": VALID_ADDR_1, "seqNo": 1}, None],
+]
+
+
+@pytest.mark.parametrize('field', [PublicOutputsField(), PublicOutputsField(min_length=2, max_length=2)])
+@pytest.mark.parametrize('outputs', OUTPUTS_CASES)
+def test_outputs_errors_unchanged(field, outputs):
+    assert field.validate(outputs) == legacy_validate(field, outputs, lambda a: a["address"])
+
+
+@pytest.mark.parametrize('field', [PublicInputsField(), PublicInputsField(min_length=1)])
+@pytest.mark.parametrize('inputs', INPUTS_CASES)
+def test_inputs_errors_unchanged(field, inputs):
+    assert field.validate(inputs) == legacy_validate(field, inputs, lambda a: (a["address"], a["seqNo"]))
+
+
+def test_missing_keys_raise():
+    with pytest.raises(KeyError):
+        PublicOutputsField().validate([{"address": VALID_ADDR_1}])
+    with pytest.raises(KeyError):
+        PublicInputsField().validate([{"seqNo": 1}])
@@ -0,0 +1,52 @@
+import pytest
+
+from plenum.common.exceptions import InsufficientCorrectSignatures, InvalidSignatureFormat
+from plenum.common.signer_simple import SimpleSigner
+from sovtoken.client_authnr import TokenAuthNr, AddressSigVerifier
+from sovtoken.util import verkey_to_address
+
+DIGEST = '6ad4e1b4b1c2ba4d2d0b77a9ae5b4c2c'
+
+
+@pytest.fixture(params=[1, 1000], ids=['parallel', 'sequential'])
+def threshold(request, monkeypatch):
+    monkeypatch.setattr(TokenAuthNr, 'ParallelVerificationThreshold', request.param)
+    return request.param
+
+
+def payment(num_inputs, *extra):
+    signers = [SimpleSigner() for _ in range(num_inputs)]
+    inputs = [{"address": verkey_to_address(s.verkey), "seqNo": i} for i, s in enumerate(signers)]
+    outputs = [{"address": inputs[0]["address"], "amount": 10}]
+    signatures = [s.sign([inp, outputs, *extra]) for s, inp in zip(signers, inputs)]
+    return inputs, outputs, signatures
+
+
+@pytest.mark.parametrize('extra', [(), (DIGEST,)], ids=['no_extra', 'digest'])
+def test_all_signatures_correct(threshold, extra):
+    inputs, outputs, signatures = payment(20, *extra)
+    correct = TokenAuthNr.verify_signtures_on_payments(inputs, outputs, signatures,
+                                                       AddressSigVerifier, *extra)
+    assert correct == [inp["address"] for inp in inputs]
+
+
+def test_wrong_signatures(threshold):
+    inputs, outputs, signatures = payment(20)
+    signatures[3], signatures[17] = signatures[17], signatures[3]
+    with pytest.raises(InsufficientCorrectSignatures) as e:
+        TokenAuthNr.verify_signtures_on_payments(inputs, outputs, signatures, AddressSigVerifier)
+    assert e.value.args == (18, 20)
+
+
+def test_signature_over_other_outputs(threshold):
+    inputs, outputs, signatures = payment(20)
+    outputs[0]["amount"] += 1
+    with pytest.raises(InsufficientCorrectSignatures):
+        TokenAuthNr.verify_signtures_on_payments(inputs, outputs, signatures, AddressSigVerifier)
+
+
+def test_invalid_signature_format(threshold):
+    inputs, outputs, signatures = payment(20)
+    signatures[10] = '0OIl'
+    with pytest.raises(InvalidSignatureFormat):
+        TokenAuthNr.verify_signtures_on_payments(inputs, outputs, signatures, AddressSigVerifier)
@@ -0,0 +1,188 @@
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from common.serializers.serialization import state_roots_serializer, proof_nodes_serializer
+from plenum.common.constants import STATE_PROOF, ROOT_HASH, PROOF_NODES
+from plenum.common.types import f
+from sovtoken.constants import OUTPUTS, ADDRESS, SEQNO, AMOUNT, GET_UTXO
+from sovtoken.query_executor import QueryExecutor, process_queries_in_executor
+from sovtoken.test.helpers.helper_handler_env import TokenHandlerEnv, FixedMultiSignature
+from sovtoken.token_req_handler import TokenReqHandler
+from sovtoken.util import TrieView, iter_trie_items
+from state.pruning_state import PruningState
+from state.trie import pruning_trie
+
+
+@pytest.fixture()
+def executor():
+    executor = QueryExecutor(max_workers=4, max_pending=100)
+    yield executor
+    executor.stop()
+
+
+def funded_env(num_addresses, num_outputs=5, reply_cache_size=100):
+    env = TokenHandlerEnv(reply_cache_size=reply_cache_size)
+    addresses = [env.new_address() for _ in range(num_addresses)]
+    for address in addresses:
+        env.fund(address, num_outputs)
+    return env, addresses
+
+
+def verify_outputs_proof(reply):
+    proof = reply[STATE_PROOF]
+    key_values = {TokenReqHandler.create_state_key(o[ADDRESS], o[SEQNO]): str(o[AMOUNT]).encode()
+                  for o in reply[OUTPUTS]}
+    return PruningState.verify_state_proof_multi(state_roots_serializer.deserialize(proof[ROOT_HASH]),
+                                                 key_values, proof_nodes_serializer.deserialize(proof[PROOF_NODES]),
+                                                 serialized=True)
+
+
+def run_all(executor, count):
+    # Delivers replies like the node does until `count` of them were sent
+    delivered = 0
+    while delivered < count:
+        delivered += executor.service()
+    assert executor.pending == 0
+
+
+def test_replies_made_in_threads_match_replies_of_node_thread(executor):
+    env, addresses = funded_env(num_addresses=20)
+    requests = [env.get_utxo(address) for address in addresses]
+    replies = {}
+    for request in requests:
+        assert env.handler.get_query_response_async(request, executor,
+                                                    lambda r: replies.setdefault(r[f.REQ_ID.nm], r))
+    run_all(executor, len(requests))
+
+    for request in requests:
+        reply = replies[request.reqId]
+        assert len(reply[OUTPUTS]) == 5
+        assert verify_outputs_proof(reply)
+        expected = env.handler.get_all_utxo(request)
+        assert reply[OUTPUTS] == expected[OUTPUTS]
+        assert reply[STATE_PROOF][ROOT_HASH] == expected[STATE_PROOF][ROOT_HASH]
+
+    # Delivered replies are cached, the same queries are answered on the node's thread
+    assert env.handler.reply_cache.stats['size'] == len(requests)
+    assert not env.handler.get_query_response_async(env.get_utxo(addresses[0]), executor, None)
+    assert env.handler.get_query_response(env.get_utxo(addresses[0]))[OUTPUTS] == replies[requests[0].reqId][OUTPUTS]
+
+
+def test_proofs_recorded_per_view():
+    env, addresses = funded_env(num_addresses=8, num_outputs=20)
+    root = env.state.committedHead
+    root_hash = bytes(env.state.committedHeadHash)
+    start = threading.Barrier(len(addresses))
+
+    def query(address):
+        start.wait()
+        return env.handler._get_all_utxo_at(env.get_utxo(address), TrieView(env.state, root), root_hash,
+                                            FixedMultiSignature(), env.handler.metrics)
+
+    # Switch threads often so that their proofs are recorded at the same time
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        with ThreadPoolExecutor(max_workers=len(addresses)) as pool:
+            replies = list(pool.map(query, addresses * 3))
+    finally:
+        sys.setswitchinterval(switch_interval)
+    assert all(verify_outputs_proof(reply) for reply in replies)
+    assert all(len(reply[OUTPUTS]) == 20 for reply in replies)
+    # The module level proof constructor of the trie is not used
+    assert not pruning_trie.proving
+    assert not pruning_trie.proof.mode
+
+
+def test_view_of_empty_committed_state():
+    env = TokenHandlerEnv()
+    address = env.new_address()
+    env.apply_batch([env.mint_request([(address, 10)])])
+
+    # The blank root of the empty committed state is a root like any other
+    _, items = TrieView(env.state, env.state.committedHead).items_with_prefix(address.encode())
+    assert items == []
+    assert list(iter_trie_items(env.state, env.state.committedHead)) == []
+
+
+def test_query_made_at_committed_root_of_submission(executor):
+    env, [address] = funded_env(num_addresses=1)
+    before = env.state.committedHeadHash
+    gate = threading.Event()
+    replies = []
+
+    # The job only starts after another batch is committed
+    submit = executor._pool.submit
+    executor._pool.submit = lambda job: submit(lambda: gate.wait() and job())
+    assert env.handler.get_query_response_async(env.get_utxo(address), executor, replies.append)
+    env.apply_batch([env.mint_request([(address, 7)])])
+    env.commit_batch(1)
+    gate.set()
+    run_all(executor, 1)
+
+    [reply] = replies
+    assert len(reply[OUTPUTS]) == 5
+    assert state_roots_serializer.deserialize(reply[STATE_PROOF][ROOT_HASH]) == before
+    assert verify_outputs_proof(reply)
+    # The reply is not used for the new committed root
+    assert not env.handler.reply_cache.has_reply(env.get_utxo(address), bytes(env.state.committedHeadHash))
+
+
+def test_pending_queries_are_capped():
+    env, addresses = funded_env(num_addresses=3)
+    executor = QueryExecutor(max_workers=1, max_pending=2)
+    gate = threading.Event()
+    submit = executor._pool.submit
+    executor._pool.submit = lambda job: submit(lambda: gate.wait() and job())
+    replies = []
+    try:
+        assert env.handler.get_query_response_async(env.get_utxo(addresses[0]), executor, replies.append)
+        assert env.handler.get_query_response_async(env.get_utxo(addresses[1]), executor, replies.append)
+        assert not env.handler.get_query_response_async(env.get_utxo(addresses[2]), executor, replies.append)
+        # Paged queries are always answered on the node's thread
+        assert not env.handler.get_query_response_async(env.get_utxo(addresses[2], limit=1), executor,
+                                                        replies.append)
+        gate.set()
+        run_all(executor, 2)
+        assert len(replies) == 2
+        assert env.handler.get_query_response_async(env.get_utxo(addresses[2]), executor, replies.append)
+        run_all(executor, 1)
+    finally:
+        executor.stop()
+    assert len(replies) == 3
+
+
+class QueryNode:
+    def __init__(self, handlers):
+        self.handlers = handlers
+        self.replies = []
+        self.queried = []
+
+    def get_req_handler(self, ledger_id=None, txn_type=None):
+        return self.handlers[txn_type]
+
+    def process_query(self, request, frm):
+        self.queried.append(request)
+
+    def send_ack_to_client(self, req_key, frm):
+        pass
+
+    def transmitToClient(self, msg, frm):
+        self.replies.append(msg)
+
+
+def test_only_served_handlers_use_executor(executor):
+    env, [address] = funded_env(num_addresses=1)
+    node = QueryNode({GET_UTXO: env.handler})
+    process_queries_in_executor(node, executor)
+
+    node.process_query(env.get_utxo(address), 'client')
+    assert node.queried and executor.pending == 0
+
+    executor.serve(env.handler)
+    node.process_query(env.get_utxo(address), 'client')
+    run_all(executor, 1)
+    assert len(node.queried) == 1
+    assert len(node.replies) == 1
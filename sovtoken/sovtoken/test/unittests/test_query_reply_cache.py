@@ -0,0 +1,98 @@
+import pytest
+
+from plenum.common.constants import TXN_TYPE, CURRENT_PROTOCOL_VERSION, STATE_PROOF
+from plenum.common.request import Request
+from plenum.common.types import f
+from plenum.test.metrics.helper import MockMetricsCollector
+from sovtoken.constants import OUTPUTS, GET_BALANCE, ADDRESS, BALANCE, AMOUNT, GET_UTXO_FOR_AMOUNT
+from sovtoken.metrics import TokenMetricsName
+from sovtoken.test.helpers.helper_handler_env import TokenHandlerEnv, IDENTIFIER
+
+
+class NoMultiSigStore:
+    def get(self, root_hash):
+        return None
+
+
+def funded_env(reply_cache_size=10, num_addresses=1):
+    env = TokenHandlerEnv(reply_cache_size=reply_cache_size)
+    addresses = [env.new_address() for _ in range(num_addresses)]
+    for address in addresses:
+        env.fund(address, 3)
+    return env, addresses
+
+
+def get_balance(address) -> Request:
+    return Request(IDENTIFIER, Request.gen_req_id(), {TXN_TYPE: GET_BALANCE, ADDRESS: address},
+                   protocolVersion=CURRENT_PROTOCOL_VERSION)
+
+
+def test_identical_queries_are_answered_from_cache():
+    env, [address] = funded_env()
+    metrics = MockMetricsCollector()
+    env.handler.reply_cache.metrics = metrics
+
+    first = env.handler.get_query_response(env.get_utxo(address))
+    request = env.get_utxo(address)
+    second = env.handler.get_query_response(request)
+
+    assert second[OUTPUTS] == first[OUTPUTS]
+    assert second[STATE_PROOF] == first[STATE_PROOF]
+    assert second[f.REQ_ID.nm] == request.reqId
+    assert env.handler.reply_cache.stats == {'hits': 1, 'misses': 1, 'size': 1}
+    metrics.flush_accumulated()
+    hit_rate = [e for e in metrics.events if e.name == TokenMetricsName.QUERY_REPLY_CACHE_HIT][0]
+    assert (hit_rate.count, hit_rate.sum) == (2, 1)
+
+    # Queries with other parameters are cached apart
+    page = env.handler.get_query_response(env.get_utxo(address, limit=1))
+    assert len(page[OUTPUTS]) == 1
+    assert env.handler.reply_cache.stats['misses'] == 2
+
+
+def test_cache_invalidated_when_committed_root_changes():
+    env, [address] = funded_env()
+    before = env.handler.get_query_response(env.get_utxo(address))
+    balance = env.handler.get_query_response(get_balance(address))[BALANCE]
+
+    # Uncommitted changes do not change the replies
+    env.apply_batch([env.mint_request([(address, 5)])])
+    assert env.handler.get_query_response(env.get_utxo(address))[OUTPUTS] == before[OUTPUTS]
+    assert env.handler.get_query_response(get_balance(address))[BALANCE] == balance
+
+    env.commit_batch(1)
+    after = env.handler.get_query_response(env.get_utxo(address))
+    assert len(after[OUTPUTS]) == len(before[OUTPUTS]) + 1
+    assert env.handler.get_query_response(get_balance(address))[BALANCE] == balance + 5
+
+
+def test_cache_is_bounded():
+    env, addresses = funded_env(reply_cache_size=2, num_addresses=3)
+    for address in addresses:
+        env.handler.get_query_response(env.get_utxo(address))
+    env.handler.get_query_response(env.get_utxo(addresses[0]))
+
+    # The least recently used reply was evicted
+    assert env.handler.reply_cache.stats == {'hits': 0, 'misses': 4, 'size': 2}
+
+
+@pytest.mark.parametrize('query', [
+    lambda env, address: env.get_utxo(address),
+    lambda env, address: env.query_request(GET_UTXO_FOR_AMOUNT, {ADDRESS: address, AMOUNT: 15}),
+])
+def test_replies_without_proof_are_not_cached(query):
+    env, [address] = funded_env()
+    env.handler.bls_store = NoMultiSigStore()
+
+    reply = env.handler.get_query_response(query(env, address))
+    assert OUTPUTS in reply and STATE_PROOF not in reply
+    assert env.handler.reply_cache.stats['size'] == 0
+    env.handler.get_query_response(get_balance(address))
+    assert env.handler.reply_cache.stats['size'] == 1
+
+
+def test_cache_disabled():
+    env, [address] = funded_env(reply_cache_size=0)
+    env.handler.get_query_response(env.get_utxo(address))
+    env.handler.get_query_response(env.get_utxo(address))
+    assert env.handler.reply_cache.stats == {'hits': 0, 'misses': 0, 'size': 0}
@@ -0,0 +1,316 @@
+import hashlib
+import json
+import os
+from concurrent.futures import Future
+
+import pytest
+
+from common.serializers.serialization import state_roots_serializer
+from crypto.bls.bls_multi_signature import MultiSignature, MultiSignatureValue
+from plenum.server.quorums import Quorum
+from sovtoken.catchup import TokenCatchupApplier
+from sovtoken.constants import TOKEN_LEDGER_ID
+from sovtoken.exceptions import TokenSnapshotError
+from sovtoken.snapshot import create_snapshot, load_snapshot, list_snapshots, TokenSnapshotter, \
+    MANIFEST_FILE, STATE_FILE, _file_digest, _read_nodes, _LENGTH
+from sovtoken.test.helpers.helper_handler_env import TokenHandlerEnv, CatchupNode, token_txns
+from sovtoken.utxo_cache_rebuild import verify_utxo_cache
+
+NUM_TXNS = 40
+SNAPSHOT_AT = 25
+NUM_ADDRESSES = 10
+
+# BLS keys of the pool at `POOL_ROOT`, a multi-signature needs 3 of the 4 nodes
+POOL_ROOT = state_roots_serializer.serialize(b'\x01' * 32)
+BLS_KEYS = {'Alpha': 'key_alpha', 'Beta': 'key_beta', 'Gamma': 'key_gamma', 'Delta': 'key_delta'}
+QUORUM = Quorum(3)
+
+
+def bls_signature(message: bytes, keys) -> str:
+    # Stands in for the BLS multi-signature, made from the message and the keys of the participants
+    return hashlib.sha256(message + ''.join(sorted(keys)).encode()).hexdigest()
+
+
+class BlsKeyRegister:
+    def get_key_by_name(self, node_name, pool_state_root_hash=None):
+        # As the register of the pool, a pool state the node does not have is a missing trie node
+        if pool_state_root_hash != state_roots_serializer.deserialize(POOL_ROOT):
+            raise KeyError(pool_state_root_hash)
+        return BLS_KEYS.get(node_name)
+
+
+class BlsCryptoVerifier:
+    def verify_multi_sig(self, signature, message, pks):
+        return signature == bls_signature(message, pks)
+
+
+class BlsBft:
+    bls_key_register = BlsKeyRegister()
+    bls_crypto_verifier = BlsCryptoVerifier()
+
+
+class MultiSigStore:
+    # Has a multi-signature of the pool for every root in `roots`, over the current ledger root
+    def __init__(self, ledger, roots=None, participants=('Alpha', 'Beta', 'Gamma')):
+        self.ledger = ledger
+        self.roots = roots
+        self.participants = list(participants)
+
+    def get(self, root_hash):
+        if self.roots is not None and root_hash not in self.roots:
+            return None
+        value = MultiSignatureValue(TOKEN_LEDGER_ID, root_hash, POOL_ROOT, self.ledger.root_hash, 0)
+        signature = bls_signature(value.as_single_value(), [BLS_KEYS[name] for name in self.participants])
+        return MultiSignature(signature, self.participants, value)
+
+
+def applier_of(env):
+    return TokenCatchupApplier(CatchupNode(env.handler), TOKEN_LEDGER_ID, env.ledger, env.state,
+                               env.utxo_cache, env.handler.tracker)
+
+
+def caught_up_env(num_txns):
+    env = TokenHandlerEnv()
+    applier = applier_of(env)
+    applier.pre_catchup()
+    for txn in token_txns(num_txns, NUM_ADDRESSES):
+        env.ledger.add(txn)
+        applier.add_txn(TOKEN_LEDGER_ID, txn)
+    applier.post_catchup()
+    return env
+
+
+def outputs_of(utxo_cache):
+    return sorted(utxo_cache.iter_committed_outputs(), key=lambda o: (o.address, o.seqNo))
+
+
+def load(path, env):
+    return load_snapshot(path, env.ledger, env.state, env.utxo_cache, bls_bft=BlsBft(), quorum=QUORUM)
+
+
+def edit_manifest(path, edit):
+    with open(os.path.join(path, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    edit(manifest)
+    with open(os.path.join(path, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f)
+
+
+@pytest.fixture(scope='module')
+def expected():
+    return caught_up_env(NUM_TXNS)
+
+
+@pytest.fixture()
+def snapshot(tmpdir_factory):
+    env = caught_up_env(SNAPSHOT_AT)
+    path = create_snapshot(str(tmpdir_factory.mktemp('snapshots')), env.ledger, env.state,
+                           bls_store=MultiSigStore(env.ledger))
+    return env, path
+
+
+def test_load_snapshot_restores_state_and_outputs(snapshot):
+    source, path = snapshot
+    env = TokenHandlerEnv()
+    for txn in token_txns(SNAPSHOT_AT, NUM_ADDRESSES):
+        env.ledger.add(txn)
+
+    manifest = load(path, env)
+
+    assert manifest['seq_no'] == SNAPSHOT_AT
+    assert manifest['multi_signature']['value']['state_root_hash'] == manifest['state_root']
+    assert env.state.committedHeadHash == source.state.committedHeadHash
+    # The utxo cache is built from the loaded state
+    assert outputs_of(env.utxo_cache) == outputs_of(source.utxo_cache)
+    for output in outputs_of(source.utxo_cache):
+        assert env.utxo_cache.get_balance(output.address) == source.utxo_cache.get_balance(output.address)
+    assert verify_utxo_cache(env.utxo_cache, env.state) == []
+    # The ledger is at the snapshot, nothing is left for catch-up
+    assert env.utxo_cache.get_meta(TokenCatchupApplier.SnapshotSeqNoMeta) is None
+
+
+def test_bootstrap_applies_only_txns_after_snapshot(snapshot, expected):
+    _, path = snapshot
+    env = TokenHandlerEnv()
+    load(path, env)
+    assert env.utxo_cache.get_meta(TokenCatchupApplier.SnapshotSeqNoMeta) == str(SNAPSHOT_AT)
+
+    applier = applier_of(env)
+    applier.pre_catchup()
+    for txn in token_txns(NUM_TXNS, NUM_ADDRESSES):
+        env.ledger.add(txn)
+        applier.add_txn(TOKEN_LEDGER_ID, txn)
+    applier.post_catchup()
+
+    assert env.state.committedHeadHash == expected.state.committedHeadHash
+    assert outputs_of(env.utxo_cache) == outputs_of(expected.utxo_cache)
+    assert env.utxo_cache.get_meta(TokenCatchupApplier.SnapshotSeqNoMeta) is None
+    assert env.utxo_cache.get_meta(TokenCatchupApplier.SnapshotTxnRootMeta) is None
+
+
+def test_bootstrap_with_other_ledger_fails(snapshot):
+    _, path = snapshot
+    env = TokenHandlerEnv()
+    load(path, env)
+
+    applier = applier_of(env)
+    applier.pre_catchup()
+    with pytest.raises(TokenSnapshotError):
+        for txn in token_txns(NUM_TXNS, NUM_ADDRESSES + 1):
+            env.ledger.add(txn)
+            applier.add_txn(TOKEN_LEDGER_ID, txn)
+
+
+def test_load_snapshot_checks_ledger_root(snapshot):
+    _, path = snapshot
+    env = TokenHandlerEnv()
+    for txn in token_txns(SNAPSHOT_AT, NUM_ADDRESSES + 1):
+        env.ledger.add(txn)
+
+    with pytest.raises(TokenSnapshotError):
+        load(path, env)
+
+
+def test_load_snapshot_into_non_empty_state_fails(snapshot, expected):
+    _, path = snapshot
+    with pytest.raises(TokenSnapshotError):
+        load(path, expected)
+
+
+def test_load_snapshot_checks_checksums(snapshot):
+    _, path = snapshot
+    with open(os.path.join(path, STATE_FILE), 'ab') as f:
+        f.write(_LENGTH.pack(1) + b'x')
+
+    env = TokenHandlerEnv()
+    with pytest.raises(TokenSnapshotError):
+        load(path, env)
+    assert env.state.isEmpty
+
+
+def set_multi_sig_value(name, value):
+    def edit(manifest):
+        manifest['multi_signature']['value'][name] = value
+    return edit
+
+
+def set_multi_sig(name, value):
+    def edit(manifest):
+        manifest['multi_signature'][name] = value
+    return edit
+
+
+@pytest.mark.parametrize('edit', [
+    # Over other roots than the ones of the manifest
+    set_multi_sig_value('state_root_hash', state_roots_serializer.serialize(b'\x00' * 32)),
+    set_multi_sig_value('txn_root_hash', state_roots_serializer.serialize(b'\x00' * 32)),
+    # Not what was signed
+    set_multi_sig_value('timestamp', 1),
+    set_multi_sig('signature', 'x' * 64),
+    # Pool state not caught up yet, or without the keys of the participants
+    set_multi_sig_value('pool_state_root_hash', state_roots_serializer.serialize(b'\x02' * 32)),
+    set_multi_sig('participants', ['Alpha', 'Beta', 'Gamma', 'Omega']),
+    # Not enough participants
+    set_multi_sig('participants', ['Alpha', 'Beta']),
+    lambda manifest: manifest.update(multi_signature=None),
+])
+def test_load_snapshot_checks_multi_signature(snapshot, edit):
+    _, path = snapshot
+    edit_manifest(path, edit)
+
+    env = TokenHandlerEnv()
+    with pytest.raises(TokenSnapshotError):
+        load(path, env)
+    assert env.state.isEmpty
+
+
+def test_load_snapshot_with_missing_nodes_fails(snapshot):
+    _, path = snapshot
+    # A node is left out of the state file and the digest updated, as a tampered snapshot would be
+    state_path = os.path.join(path, STATE_FILE)
+    nodes = list(_read_nodes(state_path))
+    with open(state_path, 'wb') as f:
+        for node in nodes[:-1]:
+            f.write(_LENGTH.pack(len(node)) + node)
+    edit_manifest(path, lambda manifest: manifest['files'].update({STATE_FILE: _file_digest(state_path)}))
+
+    env = TokenHandlerEnv()
+    with pytest.raises(TokenSnapshotError):
+        load(path, env)
+    assert env.state.isEmpty
+
+
+def test_load_unsigned_snapshot_only_without_verification(tmpdir):
+    source = caught_up_env(SNAPSHOT_AT)
+    path = create_snapshot(str(tmpdir), source.ledger, source.state)
+    env = TokenHandlerEnv()
+    with pytest.raises(TokenSnapshotError):
+        load(path, env)
+
+    load_snapshot(path, env.ledger, env.state, env.utxo_cache, bls_bft=None)
+    assert env.state.committedHeadHash == source.state.committedHeadHash
+    assert outputs_of(env.utxo_cache) == outputs_of(source.utxo_cache)
+
+
+def test_snapshotter_takes_signed_snapshots_every_interval(tmpdir):
+    env = TokenHandlerEnv()
+    signed = set()
+    snapshotter = TokenSnapshotter(str(tmpdir), 10, env.ledger, env.state, MultiSigStore(env.ledger, signed),
+                                   keep=2)
+    applier = applier_of(env)
+    applier.pre_catchup()
+    for txn in token_txns(NUM_TXNS, NUM_ADDRESSES):
+        env.ledger.add(txn)
+        applier.add_txn(TOKEN_LEDGER_ID, txn)
+        applier.flush()
+        if env.ledger.size % 5 == 0:
+            # Only every other root gets a multi-signature
+            if env.ledger.size % 10 == 5:
+                signed.add(state_roots_serializer.serialize(bytes(env.state.committedHeadHash)))
+            snapshotter.post_batch_committed(TOKEN_LEDGER_ID, 0, [], None, None)
+            snapshotter.wait()
+
+    # Roots at 10, 20, 30 and 40 are not signed, snapshots are taken at the next signed ones
+    assert list_snapshots(str(tmpdir)) == [25, 35]
+    assert snapshotter.last_seq_no == 35
+
+
+class DeferredExecutor:
+    # Runs the submitted jobs when told to
+    def __init__(self):
+        self.jobs = []
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        self.jobs.append((future, lambda: fn(*args, **kwargs)))
+        return future
+
+    def run(self):
+        for future, job in self.jobs:
+            future.set_result(job())
+        self.jobs = []
+
+
+def test_snapshotter_writes_in_executor(tmpdir):
+    env = TokenHandlerEnv()
+    executor = DeferredExecutor()
+    snapshotter = TokenSnapshotter(str(tmpdir), 10, env.ledger, env.state, None, executor=executor)
+    applier = applier_of(env)
+    applier.pre_catchup()
+    for txn in token_txns(NUM_TXNS, NUM_ADDRESSES):
+        env.ledger.add(txn)
+        applier.add_txn(TOKEN_LEDGER_ID, txn)
+        applier.flush()
+        snapshotter.post_batch_committed(TOKEN_LEDGER_ID, 0, [], None, None)
+        if env.ledger.size == 25:
+            assert list_snapshots(str(tmpdir)) == []
+            executor.run()
+
+    # No snapshot is taken while the one at 10 is written, the next one is of the root at 26
+    # even though it is written once the ledger is at 40
+    assert list_snapshots(str(tmpdir)) == [10]
+    executor.run()
+    assert list_snapshots(str(tmpdir)) == [10, 26]
+    env = TokenHandlerEnv()
+    load_snapshot(os.path.join(str(tmpdir), '26'), env.ledger, env.state, env.utxo_cache, bls_bft=None)
+    assert env.state.committedHeadHash == caught_up_env(26).state.committedHeadHash
@@ -0,0 +1,101 @@
+import pytest
+
+from sovtoken.token_req_handler import TokenReqHandler
+from sovtoken.types import Output
+from sovtoken.util import remove_state_key
+from sovtoken.utxo_cache import UTXOCache
+from state.pruning_state import PruningState
+from storage.kv_in_memory import KeyValueStorageInMemory
+
+VALID_ADDR_1 = '6baBEYA94sAphWBA5efEsaA6X2wCdyaH7PXuBtv2H5S1'
+
+
+@pytest.fixture
+def state():
+    return PruningState(KeyValueStorageInMemory())
+
+
+@pytest.fixture
+def utxo_cache():
+    return UTXOCache(KeyValueStorageInMemory())
+
+
+def test_remove_state_key(state):
+    keys = [TokenReqHandler.create_state_key(VALID_ADDR_1, seq_no) for seq_no in range(1, 20)]
+    expected = PruningState(KeyValueStorageInMemory())
+    for i, key in enumerate(keys):
+        state.set(key, str(i + 1).encode())
+        if i % 3:
+            expected.set(key, str(i + 1).encode())
+    state.commit(rootHash=state.headHash)
+    committed_root = state.committedHeadHash
+
+    for key in keys[::3]:
+        remove_state_key(state, key)
+    assert state.headHash == expected.headHash
+    assert state.as_dict == expected.as_dict
+    # Removing a missing key changes nothing
+    remove_state_key(state, keys[0])
+    assert state.headHash == expected.headHash
+    # The nodes of the committed root are still there
+    assert state.committedHeadHash == committed_root
+    assert state.get(keys[0], isCommitted=True) == b'1'
+    # Proofs of the remaining keys verify against the new root
+    proof = state.generate_state_proof(keys[1], root=state.head, serialize=True)
+    assert PruningState.verify_state_proof(state.headHash, keys[1], b'2', proof, serialized=True)
+
+
+def test_remove_state_key_needs_trie_methods(state, monkeypatch):
+    key = TokenReqHandler.create_state_key(VALID_ADDR_1, 1)
+    state.set(key, b'1')
+    monkeypatch.delattr(type(state._trie), 'replace_root_hash')
+    with pytest.raises(NotImplementedError):
+        remove_state_key(state, key)
+    assert state.get(key, isCommitted=False) == b'1'
+
+
+def test_spend_input_keeps_empty_value(state, utxo_cache):
+    TokenReqHandler.add_new_output(state, utxo_cache, Output(VALID_ADDR_1, 1, 10))
+    state.commit(rootHash=state.headHash)
+    key = TokenReqHandler.create_state_key(VALID_ADDR_1, 1)
+
+    TokenReqHandler.spend_input(state, utxo_cache, VALID_ADDR_1, 1)
+    assert state.get(key, isCommitted=False) == b''
+    assert utxo_cache.get_unspent_outputs(VALID_ADDR_1) == []
+
+
+def test_spend_input_removes_key_from_state(state, utxo_cache):
+    TokenReqHandler.add_new_output(state, utxo_cache, Output(VALID_ADDR_1, 1, 10))
+    state.commit(rootHash=state.headHash)
+    root_without_output = PruningState(KeyValueStorageInMemory()).headHash
+    key = TokenReqHandler.create_state_key(VALID_ADDR_1, 1)
+
+    TokenReqHandler.spend_input(state, utxo_cache, VALID_ADDR_1, 1, remove_spent=True)
+    assert state.get(key, isCommitted=False) is None
+    assert state.headHash == root_without_output
+
+    # The committed state is untouched until the batch is committed
+    assert state.get(key, isCommitted=True) == b'10'
+    state.revertToHead(state.committedHead)
+    assert state.get(key, isCommitted=False) == b'10'
+
+
+def test_compact_spent_outputs(state, utxo_cache):
+    for seq_no in range(1, 6):
+        state.set(TokenReqHandler.create_state_key(VALID_ADDR_1, seq_no), str(seq_no).encode())
+    expected = PruningState(KeyValueStorageInMemory())
+    for seq_no in (2, 4):
+        expected.set(TokenReqHandler.create_state_key(VALID_ADDR_1, seq_no), str(seq_no).encode())
+    # Spent outputs as written without removing them
+    for seq_no in (1, 3, 5):
+        state.set(TokenReqHandler.create_state_key(VALID_ADDR_1, seq_no), b'')
+    state.commit(rootHash=state.headHash)
+
+    assert TokenReqHandler.compact_spent_outputs(state, utxo_cache) == 3
+    assert state.committedHeadHash == expected.headHash
+    assert state.headHash == expected.headHash
+
+    # Done only once
+    state.set(TokenReqHandler.create_state_key(VALID_ADDR_1, 6), b'')
+    state.commit(rootHash=state.headHash)
+    assert TokenReqHandler.compact_spent_outputs(state, utxo_cache) == 0
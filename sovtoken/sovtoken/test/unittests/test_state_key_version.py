@@ -0,0 +1,122 @@
+import pytest
+
+from common.serializers.serialization import state_roots_serializer, proof_nodes_serializer
+from plenum.common.constants import STATE_PROOF, ROOT_HASH, PROOF_NODES
+from sovtoken.constants import OUTPUTS, ADDRESS, SEQNO, AMOUNT
+from sovtoken.exceptions import TokenValueError
+from sovtoken.test.helpers.helper_handler_env import TokenHandlerEnv
+from sovtoken.token_req_handler import TokenReqHandler
+from sovtoken.util import trie_items_with_prefix
+from state.pruning_state import PruningState
+from state.trie.pruning_trie import rlp_encode
+
+DECIMAL = TokenReqHandler.StateKeyVersionDecimal
+FIXED_WIDTH = TokenReqHandler.StateKeyVersionFixedWidth
+
+
+@pytest.fixture
+def env():
+    env = TokenHandlerEnv()
+    address = env.new_address()
+    # Seq nos 1 to 12, in decimal `10` to `12` come before `2`
+    env.fund(address, 12)
+    env.address = address
+    return env
+
+
+def verify_outputs_proof(reply, version=DECIMAL):
+    proof = reply[STATE_PROOF]
+    key_values = {TokenReqHandler.create_state_key(o[ADDRESS], o[SEQNO], version): str(o[AMOUNT]).encode()
+                  for o in reply[OUTPUTS]}
+    return PruningState.verify_state_proof_multi(state_roots_serializer.deserialize(proof[ROOT_HASH]),
+                                                 key_values, proof_nodes_serializer.deserialize(proof[PROOF_NODES]),
+                                                 serialized=True)
+
+
+def test_state_key_encodings():
+    address = 'addr'
+    assert TokenReqHandler.create_state_key(address, 19, DECIMAL) == b'addr:19'
+    assert TokenReqHandler.create_state_key(address, 19, FIXED_WIDTH) == b'addr:00000000000000000019'
+    keys = [TokenReqHandler.create_state_key(address, seq_no, FIXED_WIDTH) for seq_no in (4, 19, 100, 2 ** 64 - 1)]
+    assert keys == sorted(keys)
+    assert len(set(map(len, keys))) == 1
+    for key in keys:
+        _, seq_no = TokenReqHandler.parse_state_key(key.decode())
+        assert TokenReqHandler.create_state_key(address, int(seq_no), DECIMAL) == \
+            TokenReqHandler.create_state_key(address, int(seq_no))
+
+
+def test_trie_items_in_key_order(env):
+    prefix = (env.address + ':').encode()
+    root = env.state.committedHead
+    nodes, items = trie_items_with_prefix(env.state, prefix, root=root)
+    expected_nodes, expected = env.state.generate_state_proof_for_keys_with_prefix(prefix, root=root,
+                                                                                   get_value=True)
+    assert [k for k, _ in items] == sorted(expected)
+    assert dict(items) == expected
+    assert sorted(map(rlp_encode, nodes)) == sorted(map(rlp_encode, expected_nodes))
+
+
+def test_migration_keeps_outputs(env):
+    before = env.handler.get_query_response(env.get_utxo(env.address))[OUTPUTS]
+    assert [o[SEQNO] for o in before] == list(range(1, 13))
+    decimal_root = env.state.committedHeadHash
+
+    assert TokenReqHandler.migrate_state_keys(env.state, env.utxo_cache, FIXED_WIDTH) == 12
+    assert env.state.committedHeadHash != decimal_root
+    assert env.state.get(TokenReqHandler.create_state_key(env.address, 3, FIXED_WIDTH), isCommitted=True) == b'10'
+    assert env.state.get(TokenReqHandler.create_state_key(env.address, 3, DECIMAL), isCommitted=True) is None
+    # Done once for a version
+    assert TokenReqHandler.migrate_state_keys(env.state, env.utxo_cache, FIXED_WIDTH) == 0
+    # The handler keeps its version, like the handlers of the node running before the restart
+    assert env.handler.state_key_version == DECIMAL
+    assert not env.handler.state_keys_ordered()
+
+    # The handler of a node started with the version
+    env.handler.state_key_version = FIXED_WIDTH
+    reply = env.handler.get_query_response(env.get_utxo(env.address))
+    assert reply[OUTPUTS] == before
+    assert verify_outputs_proof(reply, FIXED_WIDTH)
+
+    # New outputs use the fixed width keys and are read in order
+    seq_no = env.mint([(env.address, 7)])
+    assert env.state.get(TokenReqHandler.create_state_key(env.address, seq_no, FIXED_WIDTH),
+                         isCommitted=True) == b'7'
+    reply = env.handler.get_query_response(env.get_utxo(env.address))
+    assert [o[SEQNO] for o in reply[OUTPUTS]] == list(range(1, 13)) + [seq_no]
+    assert verify_outputs_proof(reply, FIXED_WIDTH)
+
+    # Going back rewrites all keys in decimal, the outputs are still sorted
+    assert TokenReqHandler.migrate_state_keys(env.state, env.utxo_cache, DECIMAL) == 13
+    env.handler.state_key_version = DECIMAL
+    reply = env.handler.get_query_response(env.get_utxo(env.address))
+    assert reply[OUTPUTS][:12] == before
+    assert verify_outputs_proof(reply)
+
+
+def test_migration_of_mixed_keys(env):
+    # Like a state loaded from a snapshot of another version, keys in the encoding are kept
+    env.state.set(TokenReqHandler.create_state_key(env.address, 20, FIXED_WIDTH), b'5')
+    env.state.commit(rootHash=env.state.headHash)
+    assert TokenReqHandler.migrate_state_keys(env.state, env.utxo_cache, FIXED_WIDTH) == 12
+    assert len(env.state.as_dict) == 13
+
+
+def test_unknown_version_rejected():
+    env = TokenHandlerEnv()
+    with pytest.raises(TokenValueError):
+        TokenReqHandler.migrate_state_keys(env.state, env.utxo_cache, 3)
+
+
+def test_handlers_use_own_version():
+    decimal, fixed_width = TokenHandlerEnv(), TokenHandlerEnv(state_key_version=FIXED_WIDTH)
+    for env in (decimal, fixed_width):
+        env.address = env.new_address()
+        env.fund(env.address, 3)
+    assert decimal.state.get(TokenReqHandler.create_state_key(decimal.address, 2, DECIMAL), isCommitted=True)
+    assert fixed_width.state.get(TokenReqHandler.create_state_key(fixed_width.address, 2, FIXED_WIDTH),
+                                 isCommitted=True)
+    assert fixed_width.handler.state_keys_ordered()
+    # Migrating the state of one does not change the other
+    assert TokenReqHandler.migrate_state_keys(fixed_width.state, fixed_width.utxo_cache, FIXED_WIDTH) == 0
+    assert verify_outputs_proof(decimal.handler.get_query_response(decimal.get_utxo(decimal.address)))
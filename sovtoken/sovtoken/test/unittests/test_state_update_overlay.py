@@ -0,0 +1,121 @@
+import pytest
+
+from plenum.common.exceptions import OperationError
+from sovtoken.exceptions import UTXOError
+from sovtoken.sharded_utxo_cache import ShardedUTXOCache
+from sovtoken.state_update_overlay import StateUpdateOverlay
+from sovtoken.test.helpers.helper_handler_env import TokenHandlerEnv
+from sovtoken.token_req_handler import TokenReqHandler
+from sovtoken.types import Output
+from sovtoken.utxo_cache import UTXOCache
+from state.pruning_state import PruningState
+from storage.kv_in_memory import KeyValueStorageInMemory
+
+VALID_ADDR_1 = '6baBEYA94sAphWBA5efEsaA6X2wCdyaH7PXuBtv2H5S1'
+VALID_ADDR_2 = '2LWr2JsG6xTJrRVsnaYMm3Sc1G5oTw8D7K9gDbW2xJXxZkEe4t'
+
+# (address, seq no, amount), the amount is None to spend the output
+CHANGES = [
+    (VALID_ADDR_1, 1, 10),
+    (VALID_ADDR_1, 2, 20),
+    (VALID_ADDR_2, 2, 5),
+    (VALID_ADDR_1, 1, None),
+    (VALID_ADDR_1, 3, 7),
+    (VALID_ADDR_2, 2, None),
+    (VALID_ADDR_1, 3, None),
+    (VALID_ADDR_2, 4, 30),
+]
+
+
+@pytest.fixture(params=['address', 'address_lru', 'sharded'])
+def make_cache(request):
+    def make():
+        if request.param == 'sharded':
+            return ShardedUTXOCache(KeyValueStorageInMemory())
+        return UTXOCache(KeyValueStorageInMemory(), cache_size=10 if request.param == 'address_lru' else 0)
+    return make
+
+
+def apply_one_by_one(state, utxo_cache, changes, is_committed=False, remove_spent=False):
+    for address, seq_no, amount in changes:
+        if amount is None:
+            TokenReqHandler.spend_input(state, utxo_cache, address, seq_no, is_committed=is_committed,
+                                        remove_spent=remove_spent)
+        else:
+            TokenReqHandler.add_new_output(state, utxo_cache, Output(address, seq_no, amount),
+                                           is_committed=is_committed)
+
+
+def apply_overlay(state, utxo_cache, changes, is_committed=False, remove_spent=False):
+    overlay = StateUpdateOverlay(state, utxo_cache, remove_spent=remove_spent)
+    for address, seq_no, amount in changes:
+        key = TokenReqHandler.create_state_key(address, seq_no)
+        if amount is None:
+            overlay.spend_output(key, address, seq_no)
+        else:
+            overlay.add_output(key, Output(address, seq_no, amount))
+    overlay.flush(is_committed=is_committed)
+
+
+@pytest.mark.parametrize('remove_spent', [False, True])
+@pytest.mark.parametrize('is_committed', [False, True])
+def test_overlay_gives_same_state_and_cache(make_cache, is_committed, remove_spent):
+    expected_state, expected_cache = PruningState(KeyValueStorageInMemory()), make_cache()
+    state, utxo_cache = PruningState(KeyValueStorageInMemory()), make_cache()
+    # Outputs committed before, spent and replaced by the changes
+    for s, c in ((expected_state, expected_cache), (state, utxo_cache)):
+        apply_one_by_one(s, c, [(VALID_ADDR_2, 1, 15)], is_committed=True)
+        s.commit(rootHash=s.headHash)
+    changes = CHANGES + [(VALID_ADDR_2, 1, None)]
+
+    apply_one_by_one(expected_state, expected_cache, changes, is_committed=is_committed, remove_spent=remove_spent)
+    apply_overlay(state, utxo_cache, changes, is_committed=is_committed, remove_spent=remove_spent)
+
+    assert state.headHash == expected_state.headHash
+    assert state.as_dict == expected_state.as_dict
+    for address in (VALID_ADDR_1, VALID_ADDR_2):
+        assert utxo_cache.get_unspent_outputs(address, is_committed=is_committed) == \
+            expected_cache.get_unspent_outputs(address, is_committed=is_committed)
+        assert utxo_cache.get_balance(address, is_committed=is_committed) == \
+            expected_cache.get_balance(address, is_committed=is_committed)
+
+
+def test_overlay_writes_each_address_once():
+    state, utxo_cache = PruningState(KeyValueStorageInMemory()), UTXOCache(KeyValueStorageInMemory())
+    apply_overlay(state, utxo_cache, CHANGES)
+    # The outputs and the balance of each of the 2 addresses
+    assert utxo_cache.writes == 4
+
+
+def test_overlay_does_not_change_state_when_output_is_missing(make_cache):
+    state, utxo_cache = PruningState(KeyValueStorageInMemory()), make_cache()
+    root = state.headHash
+    with pytest.raises(UTXOError):
+        apply_overlay(state, utxo_cache, [(VALID_ADDR_1, 1, 10), (VALID_ADDR_1, 2, None)])
+    assert state.headHash == root
+
+
+def test_update_state_with_all_ledger_txns_at_once():
+    env = TokenHandlerEnv()
+    address = env.new_address()
+    seq_nos = [seq_no for seq_no, _ in env.fund(address, 4)]
+    first = env.xfer([(address, s) for s in seq_nos[:2]], [(address, 20)])
+    env.apply_batch([first])
+    env.commit_batch(1)
+    second = env.xfer([(address, seq_nos[2]), (address, env.ledger.size)], [(env.new_address(), 30)])
+    env.apply_batch([second])
+    env.commit_batch(1)
+
+    # Replaying the whole ledger in one call, the second transfer spends an output of the first
+    state, utxo_cache = PruningState(KeyValueStorageInMemory()), UTXOCache(KeyValueStorageInMemory())
+    handler = TokenReqHandler(env.ledger, state, utxo_cache, None, None)
+    txns = [txn for _, txn in env.ledger.getAllTxn()]
+    handler.updateState(txns, isCommitted=True)
+
+    assert state.headHash == env.state.committedHeadHash
+    assert utxo_cache.get_unspent_outputs(address, is_committed=True) == \
+        env.utxo_cache.get_unspent_outputs(address, is_committed=True)
+
+    # Spending the outputs again is refused
+    with pytest.raises(OperationError):
+        handler.updateState(txns[-1:], isCommitted=True)
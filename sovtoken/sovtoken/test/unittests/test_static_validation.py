@@ -1,4 +1,5 @@
 import pytest
+from base58 import b58encode_check
 
 from plenum.common.constants import TXN_TYPE
 from plenum.common.exceptions import InvalidClientRequest
@@ -7,8 +8,11 @@ from plenum.common.request import Request
 
 # TEST CONSTANTS
 from sovtoken.constants import XFER_PUBLIC, MINT_PUBLIC, SIGS, \
-    OUTPUTS, INPUTS, GET_UTXO, ADDRESS
-from sovtoken.messages.txn_validator import txn_xfer_public_validate, txt_get_utxo_validate, txn_mint_public_validate
+    OUTPUTS, INPUTS, GET_UTXO, GET_BALANCE, GET_UTXOS, GET_OUTPUT_AUDIT, GET_TXN_HISTORY, ADDRESS, ADDRESSES, \
+    FROM_SEQNO, LIMIT, SEQNO, WITH_TXNS, MAX_ADDRESSES_PER_QUERY, GET_UTXO_FOR_AMOUNT, AMOUNT, FEE_TXN_TYPE
+from sovtoken.messages.txn_validator import txn_xfer_public_validate, txt_get_utxo_validate, txn_mint_public_validate, \
+    txn_get_balance_validate, txn_get_utxos_validate, txn_get_output_audit_validate, \
+    txn_get_txn_history_validate, txn_get_utxo_for_amount_validate
 from sovtoken.test.constants import VALID_IDENTIFIER, VALID_REQID, SIGNATURES, VALID_ADDR_1, VALID_ADDR_2
 
 
@@ -84,3 +88,122 @@ def test_GET_UTXO_validate_success():
                       None, SIGNATURES, 1)
     ret_val = txt_get_utxo_validate(request)
     assert ret_val is None
+
+
+def test_GET_UTXO_validate_page_success():
+    request = Request(VALID_IDENTIFIER, VALID_REQID, {TXN_TYPE: GET_UTXO,
+                                                      ADDRESS: VALID_ADDR_1,
+                                                      FROM_SEQNO: 0,
+                                                      LIMIT: 10},
+                      None, SIGNATURES, 1)
+    ret_val = txt_get_utxo_validate(request)
+    assert ret_val is None
+
+
+@pytest.mark.parametrize('page', [{FROM_SEQNO: -1}, {FROM_SEQNO: '1'},
+                                  {LIMIT: 0}, {LIMIT: -10}, {LIMIT: 1.5}])
+def test_GET_UTXO_validate_invalid_page(page):
+    operation = {TXN_TYPE: GET_UTXO, ADDRESS: VALID_ADDR_1}
+    operation.update(page)
+    request = Request(VALID_IDENTIFIER, VALID_REQID, operation,
+                      None, SIGNATURES, 1)
+    with pytest.raises(InvalidClientRequest):
+        txt_get_utxo_validate(request)
+
+
+def test_GET_BALANCE_validate_missing_address():
+    request = Request(VALID_IDENTIFIER, VALID_REQID, {TXN_TYPE: GET_BALANCE},
+                      None, SIGNATURES, 1)
+    with pytest.raises(InvalidClientRequest):
+        txn_get_balance_validate(request)
+
+
+def test_GET_BALANCE_validate_success():
+    request = Request(VALID_IDENTIFIER, VALID_REQID, {TXN_TYPE: GET_BALANCE,
+                                                      ADDRESS: VALID_ADDR_1},
+                      None, SIGNATURES, 1)
+    ret_val = txn_get_balance_validate(request)
+    assert ret_val is None
+
+
+INVALID_LENGTH_ADDR = b58encode_check(b'1' * 33).decode()
+
+
+def test_GET_UTXOS_validate_success():
+    request = Request(VALID_IDENTIFIER, VALID_REQID, {TXN_TYPE: GET_UTXOS,
+                                                      ADDRESSES: [VALID_ADDR_1, VALID_ADDR_2]},
+                      None, SIGNATURES, 1)
+    ret_val = txn_get_utxos_validate(request)
+    assert ret_val is None
+
+
+@pytest.mark.parametrize('addresses', [None, [], VALID_ADDR_1, [VALID_ADDR_1, INVALID_LENGTH_ADDR],
+                                       [VALID_ADDR_1] * (MAX_ADDRESSES_PER_QUERY + 1)])
+def test_GET_UTXOS_validate_invalid_addresses(addresses):
+    operation = {TXN_TYPE: GET_UTXOS}
+    if addresses is not None:
+        operation[ADDRESSES] = addresses
+    request = Request(VALID_IDENTIFIER, VALID_REQID, operation,
+                      None, SIGNATURES, 1)
+    with pytest.raises(InvalidClientRequest):
+        txn_get_utxos_validate(request)
+
+
+@pytest.mark.parametrize('operation', [{SEQNO: 5}, {SEQNO: 5, ADDRESS: VALID_ADDR_1}])
+def test_GET_OUTPUT_AUDIT_validate_success(operation):
+    operation[TXN_TYPE] = GET_OUTPUT_AUDIT
+    request = Request(VALID_IDENTIFIER, VALID_REQID, operation,
+                      None, SIGNATURES, 1)
+    ret_val = txn_get_output_audit_validate(request)
+    assert ret_val is None
+
+
+@pytest.mark.parametrize('operation', [{}, {SEQNO: -1}, {SEQNO: 'a'}, {SEQNO: 5, ADDRESS: INVALID_LENGTH_ADDR}])
+def test_GET_OUTPUT_AUDIT_validate_invalid(operation):
+    operation[TXN_TYPE] = GET_OUTPUT_AUDIT
+    request = Request(VALID_IDENTIFIER, VALID_REQID, operation,
+                      None, SIGNATURES, 1)
+    with pytest.raises(InvalidClientRequest):
+        txn_get_output_audit_validate(request)
+
+
+@pytest.mark.parametrize('operation', [{ADDRESS: VALID_ADDR_1},
+                                       {ADDRESS: VALID_ADDR_1, FROM_SEQNO: 5, LIMIT: 10, WITH_TXNS: True}])
+def test_GET_TXN_HISTORY_validate_success(operation):
+    operation[TXN_TYPE] = GET_TXN_HISTORY
+    request = Request(VALID_IDENTIFIER, VALID_REQID, operation,
+                      None, SIGNATURES, 1)
+    ret_val = txn_get_txn_history_validate(request)
+    assert ret_val is None
+
+
+@pytest.mark.parametrize('operation', [{}, {ADDRESS: INVALID_LENGTH_ADDR}, {ADDRESS: VALID_ADDR_1, LIMIT: 0},
+                                       {ADDRESS: VALID_ADDR_1, WITH_TXNS: 'yes'}])
+def test_GET_TXN_HISTORY_validate_invalid(operation):
+    operation[TXN_TYPE] = GET_TXN_HISTORY
+    request = Request(VALID_IDENTIFIER, VALID_REQID, operation,
+                      None, SIGNATURES, 1)
+    with pytest.raises(InvalidClientRequest):
+        txn_get_txn_history_validate(request)
+
+
+@pytest.mark.parametrize('operation', [{ADDRESS: VALID_ADDR_1, AMOUNT: 10},
+                                       {ADDRESS: VALID_ADDR_1, AMOUNT: 10, FEE_TXN_TYPE: XFER_PUBLIC}])
+def test_GET_UTXO_FOR_AMOUNT_validate_success(operation):
+    operation[TXN_TYPE] = GET_UTXO_FOR_AMOUNT
+    request = Request(VALID_IDENTIFIER, VALID_REQID, operation,
+                      None, SIGNATURES, 1)
+    ret_val = txn_get_utxo_for_amount_validate(request)
+    assert ret_val is None
+
+
+@pytest.mark.parametrize('operation', [{AMOUNT: 10}, {ADDRESS: INVALID_LENGTH_ADDR, AMOUNT: 10},
+                                       {ADDRESS: VALID_ADDR_1}, {ADDRESS: VALID_ADDR_1, AMOUNT: 0},
+                                       {ADDRESS: VALID_ADDR_1, AMOUNT: -5},
+                                       {ADDRESS: VALID_ADDR_1, AMOUNT: 10, FEE_TXN_TYPE: ''}])
+def test_GET_UTXO_FOR_AMOUNT_validate_invalid(operation):
+    operation[TXN_TYPE] = GET_UTXO_FOR_AMOUNT
+    request = Request(VALID_IDENTIFIER, VALID_REQID, operation,
+                      None, SIGNATURES, 1)
+    with pytest.raises(InvalidClientRequest):
+        txn_get_utxo_for_amount_validate(request)
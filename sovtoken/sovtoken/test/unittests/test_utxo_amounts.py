@@ -20,33 +20,37 @@ def test_get_amounts():
     mock = MockUtxoCache({VALID_ADDR_1: "1:300"})
     amounts = UTXOAmounts.get_amounts(VALID_ADDR_1, mock)
     assert amounts.address == VALID_ADDR_1
-    assert isinstance(amounts.data, list)
+    assert isinstance(amounts.seq_nos, list)
+    assert isinstance(amounts.amounts, list)
 
 
 def test_init():
     amount = UTXOAmounts(VALID_ADDR_1, "1:100")
     assert amount.address == VALID_ADDR_1
-    assert len(amount.data) == 2
-    assert amount.data[0] == "1"
-    assert amount.data[1] == "100"
+    assert len(amount) == 1
+    assert amount.seq_nos == [1]
+    assert amount.amounts == [100]
 
     with pytest.raises(UTXOError):
         UTXOAmounts(VALID_ADDR_1, "1:100:2")
 
     amount = UTXOAmounts(VALID_ADDR_1, None)
-    assert len(amount.data) == 0
+    assert len(amount) == 0
 
 
-def test_init_more_complex():
-    val = '10:11:12:5:13:6'
+def test_init_legacy_is_sorted():
+    val = '10:11:12:5:3:6'
     amount = UTXOAmounts(VALID_ADDR_1, val)
-    assert amount.data == ['10', '11', '12', '5', '13', '6']
+    assert amount.seq_nos == [3, 10, 12]
+    assert amount.amounts == [6, 11, 5]
 
 
 def test_init_bytearray():
     val = bytearray(b'10:10')
     amount = UTXOAmounts(VALID_ADDR_1, val)
-    assert amount.data == ['10', '10']
+    assert amount.seq_nos == [10]
+    assert amount.amounts == [10]
+
 
 def test_init_invalid():
     val = [10, 11, 12, 5, 13, 6]
@@ -60,45 +64,87 @@ def test_parse_val_invalid_wrong_split():
     with pytest.raises(UTXOError):
         UTXOAmounts(VALID_ADDR_1, val)
 
+
 def test_parse_val_empty():
     amount = UTXOAmounts(VALID_ADDR_1, "")
-    assert amount.data == []
+    assert len(amount) == 0
+
+
+def test_parse_val_not_integers():
+    with pytest.raises(UTXOError):
+        UTXOAmounts(VALID_ADDR_1, '2:20:3:30::40:40:30:20:1')
+    with pytest.raises(UTXOError):
+        UTXOAmounts(VALID_ADDR_1, '2:20:3:30:30:40:40:30:20:')
+
+
+def test_encode_decode_roundtrip():
+    amount = UTXOAmounts(VALID_ADDR_1, "1:100:2:332:7:1")
+    encoded = amount.encode()
+    assert isinstance(encoded, bytes)
+    assert not UTXOAmounts.is_legacy(encoded)
+    # version byte, amount width, then 3 pairs of 8 byte words
+    assert len(encoded) == 2 + 3 * 16
+
+    decoded = UTXOAmounts(VALID_ADDR_1, encoded)
+    assert decoded.seq_nos == [1, 2, 7]
+    assert decoded.amounts == [100, 332, 1]
+
+
+def test_encode_empty():
+    encoded = UTXOAmounts(VALID_ADDR_1, None).encode()
+    assert len(UTXOAmounts(VALID_ADDR_1, encoded)) == 0
+
+
+def test_encode_big_amounts():
+    big = 9223372036854775807000
+    amount = UTXOAmounts(VALID_ADDR_1, None)
+    amount.add_amount(5, big)
+    amount.add_amount(2, 1)
+    encoded = amount.encode()
+    decoded = UTXOAmounts(VALID_ADDR_1, encoded)
+    assert decoded.seq_nos == [2, 5]
+    assert decoded.amounts == [1, big]
+
+
+def test_encode_invalid_record():
+    encoded = UTXOAmounts(VALID_ADDR_1, "1:100:2:332").encode()
+    with pytest.raises(UTXOError):
+        UTXOAmounts(VALID_ADDR_1, encoded[:-1])
+
+
+def test_is_legacy():
+    assert UTXOAmounts.is_legacy(b'1:100')
+    assert not UTXOAmounts.is_legacy(b'')
+    assert not UTXOAmounts.is_legacy(UTXOAmounts(VALID_ADDR_1, "1:100").encode())
 
 
 def test_add_amount():
     amount = UTXOAmounts(VALID_ADDR_1, "1:100")
     amount.add_amount(3, 23)
-    assert len(amount.data) == 4
-    assert amount.data[2] == "3"
-    assert amount.data[3] == "23"
-    assert amount.as_str() == "1:100:3:23"
+    assert amount.seq_nos == [1, 3]
+    assert amount.amounts == [100, 23]
 
-    amount = UTXOAmounts(VALID_ADDR_1, "1:100:2:332")
+    amount = UTXOAmounts(VALID_ADDR_1, "1:100:4:332")
     amount.add_amount(3, 23)
-    assert len(amount.data) == 6
-    assert amount.data[4] == "3"
-    assert amount.data[5] == "23"
-    assert amount.as_str() == "1:100:2:332:3:23"
+    assert amount.seq_nos == [1, 3, 4]
+    assert amount.amounts == [100, 23, 332]
 
     with pytest.raises(UTXOError):
         amount = UTXOAmounts(VALID_ADDR_1, "1:100")
         amount.add_amount(None, 32)
+    with pytest.raises(UTXOError):
         amount.add_amount(32, None)
-
-
-def test_remove_seq_no():
-    amount = UTXOAmounts(VALID_ADDR_1, "1:100:2:332")
-    amount.remove_seq_no(2)
-    assert len(amount.data) == 2
-
-    amount = UTXOAmounts(VALID_ADDR_1, "1:100:2:332")
     with pytest.raises(UTXOError):
-        amount.remove_seq_no(534)
+        amount.add_amount(32, -1)
 
-    amount = UTXOAmounts(VALID_ADDR_1, "1:100:2:332")
-    amount.data = ["1", "100", "2"]
-    with pytest.raises(UTXOError):
-        amount.remove_seq_no(2)
+
+def test_add_amount_same_seq_no():
+    amount = UTXOAmounts(VALID_ADDR_1, "1:100")
+    assert amount.add_amount(1, 100) == 0
+    assert amount.seq_nos == [1]
+    assert amount.amounts == [100]
+    assert amount.add_amount(1, 70) == -30
+    assert amount.add_amount(2, 5) == 5
 
 
 def test_as_output_list():
@@ -108,94 +154,52 @@ def test_as_output_list():
     for o in output_list:
         assert isinstance(o, Output)
 
-    amount = UTXOAmounts(VALID_ADDR_1, "1:100:2:332")
-    amount.data = ["1", "100", "2"]
-    with pytest.raises(UTXOError):
-        amount.as_output_list()
-
-
-def test_as_str():
-    amount = UTXOAmounts(VALID_ADDR_1, "1:100:2:332")
-    str_val = amount.as_str()
-    assert str_val == "1:100:2:332"
-
-    amount = UTXOAmounts(VALID_ADDR_1, "1:100:2:332")
-    amount.data = ["1", "100", "2"]
-    with pytest.raises(UTXOError):
-        amount.as_str()
-
-
-def test_as_str_invalid():
-    amount = UTXOAmounts(VALID_ADDR_1, "1:100:2:332")
-    amount.data = [10, 11, 12, 5, 13, 6]
-    with pytest.raises(TypeError):
-        amount.as_str()
-
-    amount.data = ['10', '11', '12', '5', '13', '6']
-    val = amount.as_str()
-    assert val == '10:11:12:5:13:6'
-
-
-def test_as_output_list():
-    with pytest.raises(UTXOError):
-        UTXOAmounts(VALID_ADDR_1, '2:20:3:30:30:40:40:30:20').as_output_list()
-    with pytest.raises(UTXOError):
-        UTXOAmounts(VALID_ADDR_1, '2:20:3:30:30:40:40:30:20:').as_output_list()
-    with pytest.raises(UTXOError):
-        UTXOAmounts(VALID_ADDR_1, ':20:3:30:30:40:40:30:20:1').as_output_list()
-    with pytest.raises(UTXOError):
-        UTXOAmounts(VALID_ADDR_1, '20:3:30:30:40:40:30:20:1').as_output_list()
-    with pytest.raises(UTXOError):
-        UTXOAmounts(VALID_ADDR_1, '2:20:3:30::40:40:30:20:1').as_output_list()
     val = '2:20:3:30:30:40:40:30:20:1'
     assert UTXOAmounts(VALID_ADDR_1, val).as_output_list() == [Output(VALID_ADDR_1, 2, 20),
                                                                Output(VALID_ADDR_1, 3, 30),
+                                                               Output(VALID_ADDR_1, 20, 1),
                                                                Output(VALID_ADDR_1, 30, 40),
                                                                Output(VALID_ADDR_1, 40, 30),
-                                                               Output(VALID_ADDR_1, 20, 1),
                                                                ]
 
 
 def test_remove_seq_no():
     seq_nos_amounts = ":".join(['2', '20', '3', '30', '30', '40', '40', '30', '20', '1'])
     amounts = UTXOAmounts(VALID_ADDR_1, seq_nos_amounts)
-    original_length = len(amounts.data)
+    original_length = len(amounts)
 
     with pytest.raises(UTXONotFound):
         amounts.remove_seq_no(35)
-        # UTXOCache.remove_seq_no('35', seq_nos_amounts)
-    assert original_length == len(amounts.data)
-    assert amounts.data == ['2', '20', '3', '30', '30', '40', '40', '30', '20', '1']
+    assert original_length == len(amounts)
+    assert amounts.seq_nos == [2, 3, 20, 30, 40]
 
     amounts.remove_seq_no('2')
-    assert original_length == len(amounts.data) + 2
-    assert amounts.data == ['3', '30', '30', '40', '40', '30', '20', '1']
+    assert original_length == len(amounts) + 1
+    assert amounts.seq_nos == [3, 20, 30, 40]
+    assert amounts.amounts == [30, 1, 40, 30]
 
-    amounts.remove_seq_no('40',)
-    assert original_length == len(amounts.data) + 4
-    assert amounts.data == ['3', '30', '30', '40', '20', '1']
+    assert amounts.remove_seq_no(40) == 30
+    assert amounts.seq_nos == [3, 20, 30]
+    assert amounts.amounts == [30, 1, 40]
 
-    amounts.remove_seq_no('20')
-    assert original_length == len(amounts.data) + 6
-    assert amounts.data == ['3', '30', '30', '40']
+    amounts.remove_seq_no(20)
+    assert amounts.seq_nos == [3, 30]
 
     with pytest.raises(UTXONotFound):
-        amounts.remove_seq_no('19')
-    assert original_length == len(amounts.data) + 6
-    assert amounts.data == ['3', '30', '30', '40']
-
+        amounts.remove_seq_no(19)
     with pytest.raises(UTXONotFound):
-        amounts.remove_seq_no('40')
-    assert original_length == len(amounts.data) + 6
-    assert amounts.data == ['3', '30', '30', '40']
+        amounts.remove_seq_no(40)
+    assert amounts.seq_nos == [3, 30]
+
+    amounts.remove_seq_no(30)
+    assert amounts.seq_nos == [3]
+    assert amounts.amounts == [30]
 
-    amounts.remove_seq_no('30')
-    assert original_length == len(amounts.data) + 8
-    assert amounts.data == ['3', '30']
+    amounts.remove_seq_no(3)
+    assert len(amounts) == 0
 
-    amounts.remove_seq_no('3')
-    assert original_length == len(amounts.data) + 10
-    assert amounts.data == []
+    with pytest.raises(UTXOError):
+        amounts.remove_seq_no(None)
 
 
 def test_sum_amounts_from_seq_nos_amounts():
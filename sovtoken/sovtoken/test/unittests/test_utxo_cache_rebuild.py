@@ -0,0 +1,97 @@
+import pytest
+
+from sovtoken.exceptions import UTXOError
+from sovtoken.sharded_utxo_cache import ShardedUTXOCache
+from sovtoken.test.helpers.helper_handler_env import TokenHandlerEnv
+from sovtoken.types import Output
+from sovtoken.utxo_cache import UTXOCache
+from sovtoken.utxo_cache_rebuild import rebuild_utxo_cache, verify_utxo_cache, collect_unspent_outputs
+from storage.kv_in_memory import KeyValueStorageInMemory
+
+
+@pytest.fixture(scope='module')
+def env():
+    # A few addresses, each with spent and unspent outputs
+    env = TokenHandlerEnv()
+    addresses = [env.new_address() for _ in range(4)]
+    for i, address in enumerate(addresses):
+        seq_nos = [s for s, _ in env.fund(address, 3 + i)]
+        request = env.xfer([(address, s) for s in seq_nos[:2]],
+                           [(addresses[(i + 1) % 4], 15), (address, 5)])
+        env.apply_batch([request])
+        env.commit_batch(1)
+    return env
+
+
+@pytest.fixture(params=['address', 'sharded'])
+def utxo_cache(request):
+    if request.param == 'sharded':
+        return ShardedUTXOCache(KeyValueStorageInMemory())
+    return UTXOCache(KeyValueStorageInMemory(), cache_size=10)
+
+
+@pytest.fixture(params=[False, True], ids=['in_memory', 'spilled'])
+def spill_dir(request, tmpdir):
+    return str(tmpdir) if request.param else None
+
+
+def outputs_of(utxo_cache):
+    return sorted(utxo_cache.iter_committed_outputs(), key=lambda o: (o.address, o.seqNo))
+
+
+def test_rebuild_matches_replayed_cache(env, utxo_cache, spill_dir):
+    written = rebuild_utxo_cache(env.ledger, utxo_cache, spill_dir=spill_dir, chunk_size=3)
+
+    assert written == 4
+    assert outputs_of(utxo_cache) == outputs_of(env.utxo_cache)
+    for output in env.utxo_cache.iter_committed_outputs():
+        assert utxo_cache.get_balance(output.address, is_committed=True) == \
+            env.utxo_cache.get_balance(output.address, is_committed=True)
+    assert verify_utxo_cache(utxo_cache, env.state) == []
+
+
+def test_spilled_aggregation_cleans_up(env, tmpdir):
+    in_memory = sorted(collect_unspent_outputs(env.ledger))
+    assert sorted(collect_unspent_outputs(env.ledger, spill_dir=str(tmpdir), partitions=3)) == in_memory
+    assert tmpdir.listdir() == []
+
+
+def test_rebuild_replaces_values_and_keeps_markers(env, utxo_cache):
+    stale = Output(env.new_address(), 1, 10)
+    utxo_cache.add_output(stale, is_committed=True)
+    utxo_cache.set_marker('some_marker')
+
+    rebuild_utxo_cache(env.ledger, utxo_cache)
+    assert utxo_cache.get_unspent_outputs(stale.address, is_committed=True) == []
+    assert utxo_cache.has_marker('some_marker')
+    assert utxo_cache.ensure_balance_index() == 0
+
+
+def test_rebuild_refuses_uncommitted_changes(env, utxo_cache):
+    utxo_cache.add_output(Output(env.new_address(), 1, 10))
+    with pytest.raises(UTXOError):
+        rebuild_utxo_cache(env.ledger, utxo_cache)
+
+
+def test_verify_reports_differences(env, utxo_cache):
+    rebuild_utxo_cache(env.ledger, utxo_cache)
+    spent = next(utxo_cache.iter_committed_outputs())
+    utxo_cache.spend_output(spent, is_committed=True)
+    utxo_cache.add_output(Output(spent.address, 10000, 1), is_committed=True)
+
+    errors = verify_utxo_cache(utxo_cache, env.state)
+    assert len(errors) == 2
+
+
+def test_verify_compares_committed_state(utxo_cache):
+    env = TokenHandlerEnv()
+    env.fund(env.new_address(), 2)
+    rebuild_utxo_cache(env.ledger, utxo_cache)
+    # Outputs of uncommitted batches are not in the committed state
+    env.apply_batch([env.mint_request([(env.new_address(), 5)])])
+    assert verify_utxo_cache(utxo_cache, env.state) == []
+
+    # Outputs of an address without any in the state
+    extra = Output(env.new_address(), 1, 7)
+    utxo_cache.add_output(extra, is_committed=True)
+    assert verify_utxo_cache(utxo_cache, env.state) == ['{} is not in the state'.format(extra)]
@@ -0,0 +1,53 @@
+import json
+
+import pytest
+
+from sovtoken.constants import OUTPUTS, ADDRESSES, GET_UTXOS, BALANCE, LIMIT
+from sovtoken.test.helpers.helper_handler_env import TokenHandlerEnv, IDENTIFIER
+from sovtoken.types import Output
+from plenum.common.constants import TXN_TYPE, CURRENT_PROTOCOL_VERSION
+from plenum.common.request import Request
+
+NUM_OUTPUTS = 12
+
+
+@pytest.fixture(scope='module')
+def funded():
+    env = TokenHandlerEnv()
+    address = env.new_address()
+    funds = env.fund(address, NUM_OUTPUTS)
+    return env, address, funds
+
+
+def expected_outputs(address, funds):
+    return [{"address": address, "seqNo": seq_no, "amount": amount} for seq_no, amount in funds]
+
+
+def test_get_utxo_reply_sorted_by_seq_no(funded):
+    env, address, funds = funded
+    result = env.handler.get_all_utxo(env.get_utxo(address))
+    # Seq nos 10 to 12 come before 2 in the trie
+    assert result[OUTPUTS] == expected_outputs(address, funds)
+
+
+def test_get_utxo_page_reply(funded):
+    env, address, funds = funded
+    result = env.handler.get_all_utxo(env.get_utxo(address, **{LIMIT: 5}))
+    assert result[OUTPUTS] == expected_outputs(address, funds[:5])
+
+
+def test_get_utxos_reply(funded):
+    env, address, funds = funded
+    request = Request(IDENTIFIER, Request.gen_req_id(), {TXN_TYPE: GET_UTXOS, ADDRESSES: [address]},
+                      protocolVersion=CURRENT_PROTOCOL_VERSION)
+    result = env.handler.get_utxos(request)
+    assert result[OUTPUTS] == {address: expected_outputs(address, funds)}
+    assert result[BALANCE] == {address: sum(amount for _, amount in funds)}
+
+
+def test_output_has_no_dict():
+    output = Output('address', 1, 10)
+    assert not hasattr(output, '__dict__')
+    assert json.loads(repr(output)) == output.as_dict() == {"address": 'address', "seqNo": 1, "amount": 10}
+    assert output == Output('address', 1, 10)
+    assert len({output, Output('address', 1, 10)}) == 1
@@ -1,3 +1,4 @@
+from collections import OrderedDict
 from typing import List, Optional
 
 import base58
@@ -10,40 +11,86 @@ from plenum.server.ledger_req_handler import LedgerRequestHandler
 
 from plenum.common.constants import TXN_TYPE, TRUSTEE, STATE_PROOF, ROOT_HASH, \
     PROOF_NODES, MULTI_SIGNATURE, ED25519
-from plenum.common.exceptions import InvalidClientMessageException, OperationError
+from plenum.common.exceptions import InvalidClientMessageException, OperationError, InvalidClientRequest
 
 from plenum.common.request import Request
 from plenum.common.types import f
 from sovtoken.constants import XFER_PUBLIC, MINT_PUBLIC, \
-    OUTPUTS, INPUTS, GET_UTXO, ADDRESS, SIGS
+    OUTPUTS, INPUTS, GET_UTXO, GET_BALANCE, GET_UTXOS, GET_OUTPUT_AUDIT, GET_TXN_HISTORY, GET_UTXO_FOR_AMOUNT, ADDRESS, \
+    ADDRESSES, SIGS, BALANCE, FROM_SEQNO, LIMIT, NEXT_SEQNO, SEQNO, AMOUNT, SPENT_BY, SEQNOS, WITH_TXNS, TXNS, \
+    FEE_TXN_TYPE, FEE
+from sovtoken.audit_index import AuditIndex
+from sovtoken.history_index import HistoryIndex
 from sovtoken.txn_util import add_sigs_to_txn
+from sovtoken.query_reply_cache import QueryReplyCache
+from sovtoken.state_update_overlay import StateUpdateOverlay
 from sovtoken.types import Output
-from sovtoken.util import SortedItems, validate_multi_sig_txn
+from sovtoken.util import validate_multi_sig_txn, remove_state_key, iter_trie_items, trie_items_with_prefix, \
+    TrieView
 from sovtoken.utxo_cache import UTXOCache
 from sovtoken.exceptions import InsufficientFundsError, ExtraFundsError, InvalidFundsError, UTXOError, TokenValueError
 from plenum.common.ledger_uncommitted_tracker import LedgerUncommittedTracker
-from state.trie.pruning_trie import rlp_decode
+from plenum.common.metrics_collector import MetricsCollector, NullMetricsCollector, measure_time
+from sovtoken.metrics import TokenMetricsName, VALIDATE_TIME, UPDATE_STATE_TIME, QUERY_TIME
+from state.trie.pruning_trie import rlp_decode, rlp_encode, Trie
 
 from state.pruning_state import PruningState
 
 from plenum.common.ledger import Ledger
+from stp_core.common.log import getlogger
+
+logger = getlogger()
 
 
 class TokenReqHandler(LedgerRequestHandler):
     write_types = {MINT_PUBLIC, XFER_PUBLIC}
-    query_types = {GET_UTXO, }
+    query_types = {GET_UTXO, GET_BALANCE, GET_UTXOS, GET_OUTPUT_AUDIT, GET_TXN_HISTORY, GET_UTXO_FOR_AMOUNT}
 
     MinSendersForPublicMint = 3
-
-    def __init__(self, ledger, state: PruningState, utxo_cache: UTXOCache, domain_state, bls_store):
+    # Marker set in the utxo cache once spent outputs were removed from the state
+    SpentOutputsCompactedMarker = 'state_spent_outputs_compacted'
+    # Maximum number of outputs in a reply to a paginated GET_UTXO
+    MaxUtxoPageSize = 1000
+    # Maximum number of seq nos in a reply to GET_TXN_HISTORY
+    MaxHistoryPageSize = 1000
+    # Maximum number of outputs in a reply to GET_UTXO_FOR_AMOUNT
+    MaxSelectedOutputs = 1000
+    # Encodings of the seq no in state keys, see `create_state_key`. The state is migrated to
+    # the one in use on startup by `migrate_state_keys`, which records it in the utxo cache
+    StateKeyVersionDecimal = 1
+    StateKeyVersionFixedWidth = 2
+    StateKeyVersionMeta = 'state_key_version'
+    # Digits of the largest 64 bit seq no
+    StateKeySeqNoWidth = 20
+
+    def __init__(self, ledger, state: PruningState, utxo_cache: UTXOCache, domain_state, bls_store,
+                 metrics: MetricsCollector = NullMetricsCollector(), reply_cache_size=0,
+                 audit_index: Optional[AuditIndex] = None, history_index: Optional[HistoryIndex] = None,
+                 remove_spent_outputs=False, query_executor=None, state_key_version=StateKeyVersionDecimal):
         super().__init__(ledger, state)
         self.utxo_cache = utxo_cache
+        # Remove spent outputs from the state instead of writing an empty value, see `spend_input`
+        self.remove_spent_outputs = remove_spent_outputs
+        # Encoding of the state keys, the state has to be migrated to it, see `migrate_state_keys`
+        self.state_key_version = state_key_version
+        # Spent-by and created-by index of outputs and txn history of addresses, None when disabled
+        self.audit_index = audit_index
+        self.history_index = history_index
+        # `QueryExecutor` making the state proofs of queries outside the node's thread, None when disabled
+        self.query_executor = query_executor
         self.domain_state = domain_state
         self.bls_store = bls_store
+        self.metrics = metrics
         self.tracker = LedgerUncommittedTracker(state.committedHeadHash, ledger.size)
         self.query_handlers = {
             GET_UTXO: self.get_all_utxo,
+            GET_BALANCE: self.get_balance,
+            GET_UTXOS: self.get_utxos,
+            GET_OUTPUT_AUDIT: self.get_output_audit,
+            GET_TXN_HISTORY: self.get_txn_history,
+            GET_UTXO_FOR_AMOUNT: self.get_utxo_for_amount,
         }
+        self.reply_cache = QueryReplyCache(reply_cache_size, proof_types={GET_UTXO, GET_UTXOS, GET_UTXO_FOR_AMOUNT}, metrics=metrics)
 
     def handle_xfer_public_txn(self, request):
         # Currently only sum of inputs is matched with sum of outputs. If anything more is
@@ -113,14 +160,23 @@ class TokenReqHandler(LedgerRequestHandler):
 
     def doStaticValidation(self, request: Request):
         static_req_validation(request)
+        txn_type = request.operation[TXN_TYPE]
+        if txn_type == GET_OUTPUT_AUDIT and not self.audit_index:
+            raise InvalidClientRequest(request.identifier, request.reqId,
+                                       'the audit index is not enabled on this node')
+        if txn_type == GET_TXN_HISTORY and not self.history_index:
+            raise InvalidClientRequest(request.identifier, request.reqId,
+                                       'the history index is not enabled on this node')
 
     def validate(self, request: Request):
         req_type = request.operation[TXN_TYPE]
         if req_type == MINT_PUBLIC:
-            return validate_multi_sig_txn(request, TRUSTEE, self.domain_state, self.MinSendersForPublicMint)
+            with self.metrics.measure_time(VALIDATE_TIME[req_type]):
+                return validate_multi_sig_txn(request, TRUSTEE, self.domain_state, self.MinSendersForPublicMint)
 
         elif req_type == XFER_PUBLIC:
-            return self.handle_xfer_public_txn(request)
+            with self.metrics.measure_time(VALIDATE_TIME[req_type]):
+                return self.handle_xfer_public_txn(request)
 
         raise InvalidClientMessageException(request.identifier,
                                             getattr(request, 'reqId', None),
@@ -150,106 +206,353 @@ class TokenReqHandler(LedgerRequestHandler):
             add_sigs_to_txn(txn, sigs, sig_type=ED25519)
         return txn
 
-    def _update_state_mint_public_txn(self, txn, is_committed=False):
+    def _update_state_mint_public_txn(self, txn, overlay: StateUpdateOverlay):
         payload = get_payload_data(txn)
         seq_no = get_seq_no(txn)
         for output in payload[OUTPUTS]:
-            self._add_new_output(Output(output["address"], seq_no, output["amount"]),
-                                 is_committed=is_committed)
+            output = Output(output["address"], seq_no, output["amount"])
+            overlay.add_output(self.create_state_key(output.address, seq_no, self.state_key_version), output)
 
-    def _update_state_xfer_public(self, txn, is_committed=False):
+    def _update_state_xfer_public(self, txn, overlay: StateUpdateOverlay):
         payload = get_payload_data(txn)
         for inp in payload[INPUTS]:
-            self._spend_input(inp["address"], inp["seqNo"], is_committed=is_committed)
+            overlay.spend_output(self.create_state_key(inp["address"], inp["seqNo"], self.state_key_version),
+                                 inp["address"], inp["seqNo"])
+        seq_no = get_seq_no(txn)
         for output in payload[OUTPUTS]:
-            seq_no = get_seq_no(txn)
-            self._add_new_output(Output(output["address"], seq_no, output["amount"]),
-                                 is_committed=is_committed)
+            output = Output(output["address"], seq_no, output["amount"])
+            overlay.add_output(self.create_state_key(output.address, seq_no, self.state_key_version), output)
 
     def updateState(self, txns, isCommitted=False):
+        # The changes of all txns are collected first, so every state key and every address
+        # of the utxo cache is written once however many inputs and outputs touch it
+        overlay = StateUpdateOverlay(self.state, self.utxo_cache, remove_spent=self.remove_spent_outputs)
         try:
             for txn in txns:
                 typ = get_type(txn)
                 if typ == MINT_PUBLIC:
-                    self._update_state_mint_public_txn(txn, is_committed=isCommitted)
+                    with self.metrics.measure_time(UPDATE_STATE_TIME[typ]):
+                        self._update_state_mint_public_txn(txn, overlay)
 
                 if typ == XFER_PUBLIC:
-                    self._update_state_xfer_public(txn, is_committed=isCommitted)
+                    with self.metrics.measure_time(UPDATE_STATE_TIME[typ]):
+                        self._update_state_xfer_public(txn, overlay)
+
+            with self.metrics.measure_time(TokenMetricsName.TOKEN_UPDATE_STATE_FLUSH_TIME):
+                overlay.flush(is_committed=isCommitted)
+            for index in (self.audit_index, self.history_index):
+                if index:
+                    for txn in txns:
+                        if get_type(txn) in self.write_types:
+                            index.add_txn(txn, is_committed=isCommitted)
         except UTXOError as ex:
             error = 'Exception {} while updating state'.format(ex)
             raise OperationError(error)
 
     def _spend_input(self, address, seq_no, is_committed=False):
         self.spend_input(self.state, self.utxo_cache, address, seq_no,
-                         is_committed=is_committed)
+                         is_committed=is_committed, remove_spent=self.remove_spent_outputs,
+                         state_key_version=self.state_key_version)
 
     def _add_new_output(self, output: Output, is_committed=False):
         self.add_new_output(self.state, self.utxo_cache, output,
-                            is_committed=is_committed)
+                            is_committed=is_committed, state_key_version=self.state_key_version)
 
+    @measure_time(TokenMetricsName.TOKEN_BATCH_CREATED_TIME)
     def onBatchCreated(self, state_root, txn_time):
         self.on_batch_created(self.utxo_cache, self.tracker, self.ledger, state_root)
+        self.utxo_cache.report_metrics(self.metrics)
 
     def onBatchRejected(self):
         self.on_batch_rejected(self.utxo_cache, self.tracker, self.state, self.ledger)
 
+    @measure_time(TokenMetricsName.TOKEN_BATCH_COMMITTED_TIME)
     def commit(self, txnCount, stateRoot, txnRoot, pptime) -> List:
         return self.__commit__(self.utxo_cache, self.ledger, self.state,
                                txnCount, stateRoot, txnRoot, pptime, self.tracker,
                                self.ts_store)
 
     def get_query_response(self, request: Request):
-        return self.query_handlers[request.operation[TXN_TYPE]](request)
+        query_type = request.operation[TXN_TYPE]
+        with self.metrics.measure_time(QUERY_TIME[query_type]):
+            if FEE_TXN_TYPE in request.operation:
+                # Fees are in the config state, the token state root does not change with them
+                return self.query_handlers[query_type](request)
+            return self.reply_cache.get_reply(request, bytes(self.state.committedHeadHash),
+                                              self.query_handlers[query_type])
+
+    def get_query_response_async(self, request: Request, executor, send_reply) -> bool:
+        """
+        Submits an unpaged GET_UTXO to `executor`, its reply is made at the committed root
+        captured here. Other queries read the utxo cache and are answered on the node's thread.
+
+        :return: False if the query was not submitted
+        """
+        operation = request.operation
+        if operation[TXN_TYPE] != GET_UTXO or FROM_SEQNO in operation or LIMIT in operation:
+            return False
+        # The job only reads the trie under the committed root and the multi-signature read here
+        view = TrieView(self.state, self.state.committedHead)
+        root_hash = bytes(self.state.committedHeadHash)
+        multi_sig = self.bls_store.get(state_roots_serializer.serialize(root_hash))
+        return executor.run_query(request, root_hash,
+                                  lambda: self._get_all_utxo_at(request, view, root_hash, multi_sig,
+                                                                NullMetricsCollector()),
+                                  self.reply_cache, send_reply)
+
+    def get_output_audit(self, request: Request):
+        """
+        Returns the outputs created by the txn with seq no `seqNo`, only the ones of `address`
+        if given, with the seq no of the txn spending each of them (None while unspent). They
+        are read from the committed audit index, the reply has no state proof.
+        """
+        seq_no = request.operation[SEQNO]
+        address = request.operation.get(ADDRESS)
+        outputs = []
+        if self.audit_index:
+            for addr, amount in self.audit_index.get_created(seq_no):
+                if address is not None and addr != address:
+                    continue
+                outputs.append({ADDRESS: addr, SEQNO: seq_no, AMOUNT: amount,
+                                SPENT_BY: self.audit_index.get_spent_by(addr, seq_no)})
+
+        result = {f.IDENTIFIER.nm: request.identifier,
+                  f.REQ_ID.nm: request.reqId,
+                  OUTPUTS: outputs}
+        result.update(request.operation)
+        return result
+
+    def get_txn_history(self, request: Request):
+        """
+        Returns at most `limit` seq nos of the committed token txns touching the address starting
+        from seq no `from`, the txns too if `withTxns` is set, and the `next` seq no to continue
+        from (None on the last page). They are read from the history index and the ledger, the
+        reply has no state proof.
+        """
+        operation = request.operation
+        limit = min(operation.get(LIMIT, self.MaxHistoryPageSize), self.MaxHistoryPageSize)
+        seq_nos, next_seq_no = [], None
+        if self.history_index:
+            seq_nos, next_seq_no = self.history_index.get_page(operation[ADDRESS], operation.get(FROM_SEQNO, 0),
+                                                               limit)
+
+        result = {f.IDENTIFIER.nm: request.identifier,
+                  f.REQ_ID.nm: request.reqId,
+                  SEQNOS: seq_nos}
+        if operation.get(WITH_TXNS):
+            result[TXNS] = [self.ledger.getBySeqNo(seq_no) for seq_no in seq_nos]
+        result.update(operation)
+        result[NEXT_SEQNO] = next_seq_no
+        return result
+
+    def _make_state_proof(self, encoded_root_hash, proof_nodes, metrics=None) -> dict:
+        return self._make_signed_state_proof(self.bls_store.get(encoded_root_hash), encoded_root_hash,
+                                             proof_nodes, metrics)
+
+    def _make_signed_state_proof(self, multi_sig, encoded_root_hash, proof_nodes, metrics=None) -> dict:
+        # Same as `_make_state_proof` with the multi-signature of the root already read
+        metrics = metrics or self.metrics
+        if not multi_sig:
+            return {}
+        encoded_proof = proof_nodes_serializer.serialize(proof_nodes)
+        metrics.add_event(TokenMetricsName.STATE_PROOF_SIZE, len(encoded_proof))
+        return {
+            MULTI_SIGNATURE: multi_sig.as_dict(),
+            ROOT_HASH: encoded_root_hash,
+            PROOF_NODES: encoded_proof
+        }
 
     def get_all_utxo(self, request: Request):
+        if FROM_SEQNO in request.operation or LIMIT in request.operation:
+            return self.get_utxo_page(request)
+        root_hash = bytes(self.state.committedHeadHash)
+        return self._get_all_utxo_at(request, TrieView(self.state, self.state.committedHead), root_hash,
+                                     self.bls_store.get(state_roots_serializer.serialize(root_hash)), self.metrics)
+
+    def _get_all_utxo_at(self, request: Request, view: TrieView, root_hash: bytes, multi_sig,
+                         metrics: MetricsCollector):
+        # Only reads the trie nodes of `view`, so it can run outside the node's thread
         address = request.operation[ADDRESS]
-        encoded_root_hash = state_roots_serializer.serialize(
-            bytes(self.state.committedHeadHash))
-        proof, rv = self.state.generate_state_proof_for_keys_with_prefix(address,
-                                                                         serialize=True,
-                                                                         get_value=True)
-        multi_sig = self.bls_store.get(encoded_root_hash)
-        if multi_sig:
-            encoded_proof = proof_nodes_serializer.serialize(proof)
-            proof = {
-                MULTI_SIGNATURE: multi_sig.as_dict(),
-                ROOT_HASH: encoded_root_hash,
-                PROOF_NODES: encoded_proof
-            }
-        else:
-            proof = {}
+        encoded_root_hash = state_roots_serializer.serialize(root_hash)
+        ordered = self.state_keys_ordered()
+        # Fixed width keys are only ordered by seq no among the keys of a single address, the
+        # separator keeps an address from matching longer addresses starting with it
+        proof, items = view.items_with_prefix((address + ':' if ordered else address).encode())
+        proof = self._make_signed_state_proof(multi_sig, encoded_root_hash, Trie.serialize_proof(proof), metrics)
 
         # The outputs need to be returned in sorted order since each node's reply should be same.
-        # Since no of outputs can be large, a concious choice to not use `operator.attrgetter` on an
-        # already constructed list was made
-        outputs = SortedItems()
-        for k, v in rv.items():
+        # They are collected as tuples and turned into their reply representation without creating
+        # an `Output` for each, decimal seq nos have to be sorted at once
+        utxos = []
+        for k, v in items:
             addr, seq_no = self.parse_state_key(k.decode())
             amount = rlp_decode(v)[0]
             if not amount:
                 continue
-            outputs.add(Output(addr, int(seq_no), int(amount)))
+            utxos.append((int(seq_no), addr, int(amount)))
+        if not ordered:
+            utxos.sort()
 
         result = {f.IDENTIFIER.nm: request.identifier,
-                  f.REQ_ID.nm: request.reqId, OUTPUTS: outputs.sorted_list}
+                  f.REQ_ID.nm: request.reqId,
+                  OUTPUTS: [{ADDRESS: addr, SEQNO: seq_no, AMOUNT: amount} for seq_no, addr, amount in utxos]}
         if proof:
             result[STATE_PROOF] = proof
 
         result.update(request.operation)
         return result
 
+    def get_utxo_page(self, request: Request):
+        """
+        Returns at most `limit` outputs of the address starting from seq no `from` and the
+        `next` seq no to continue from (None on the last page). The state proof only covers
+        the keys of the returned outputs.
+        """
+        address = request.operation[ADDRESS]
+        from_seq_no = request.operation.get(FROM_SEQNO, 0)
+        limit = min(request.operation.get(LIMIT, self.MaxUtxoPageSize), self.MaxUtxoPageSize)
+        # The committed cache is in sync with the committed state, it gives the seq nos of
+        # the page without walking the whole address in the trie
+        page, next_seq_no = self.utxo_cache.get_unspent_outputs_page(address, from_seq_no, limit,
+                                                                     is_committed=True)
+        outputs, proof = self._get_outputs_with_proof(address, [output.seqNo for output in page])
+
+        result = {f.IDENTIFIER.nm: request.identifier,
+                  f.REQ_ID.nm: request.reqId, OUTPUTS: outputs}
+        if proof:
+            result[STATE_PROOF] = proof
+
+        result.update(request.operation)
+        result[NEXT_SEQNO] = next_seq_no
+        return result
+
+    def get_utxo_for_amount(self, request: Request):
+        """
+        Returns a few committed outputs of the address adding up to at least `amount`, plus the
+        committed fee of the txn type `feeTxnType` if given, to be used as the inputs of a txn.
+        Outputs are chosen from the address ordered by amount, see `UTXOAmountOrder.select`, and
+        returned in seq no order with a state proof of their keys. They are empty if the address
+        cannot cover the amount with at most `MaxSelectedOutputs` outputs.
+        """
+        operation = request.operation
+        address = operation[ADDRESS]
+        fee = self.get_committed_fee(operation[FEE_TXN_TYPE]) if FEE_TXN_TYPE in operation else 0
+        selected = self.utxo_cache.get_outputs_by_amount(address, is_committed=True) \
+            .select(operation[AMOUNT] + fee, limit=self.MaxSelectedOutputs)
+        outputs, proof = self._get_outputs_with_proof(address, sorted(seq_no for seq_no, _ in selected))
+
+        result = {f.IDENTIFIER.nm: request.identifier,
+                  f.REQ_ID.nm: request.reqId, OUTPUTS: outputs}
+        if proof:
+            result[STATE_PROOF] = proof
+
+        result.update(request.operation)
+        result[FEE] = fee
+        return result
+
+    def get_committed_fee(self, txn_type: str) -> int:
+        # Txns have no fees without the fees plugin, it replaces this with its committed fees
+        return 0
+
+    def _get_outputs_with_proof(self, address: str, seq_nos: List[int]):
+        """
+        Reads the committed outputs of the address with the given seq nos from the state, with a
+        state proof covering their keys
+        """
+        root = self.state.committedHead
+        encoded_root_hash = state_roots_serializer.serialize(
+            bytes(self.state.committedHeadHash))
+        # Nodes shared by the proofs of several keys are included once, the root goes last
+        proof_nodes = OrderedDict()
+        outputs = []
+        for seq_no in seq_nos:
+            nodes, value = self.state.generate_state_proof(self.create_state_key(address, seq_no,
+                                                                                 self.state_key_version),
+                                                           root=root, get_value=True)
+            for node in nodes[:-1]:
+                proof_nodes.setdefault(rlp_encode(node), node)
+            amount = rlp_decode(value)[0] if value else None
+            if not amount:
+                continue
+            outputs.append({ADDRESS: address, SEQNO: seq_no, AMOUNT: int(amount)})
+        proof = self._make_state_proof(encoded_root_hash,
+                                       Trie.serialize_proof(list(proof_nodes.values()) + [root]))
+        return outputs, proof
+
+    def get_utxos(self, request: Request):
+        """
+        Returns the outputs and balance of each requested address at the committed root with
+        a single state proof covering all of them
+        """
+        addresses = list(OrderedDict.fromkeys(request.operation[ADDRESSES]))
+        root = self.state.committedHead
+        encoded_root_hash = state_roots_serializer.serialize(
+            bytes(self.state.committedHeadHash))
+
+        ordered = self.state_keys_ordered()
+        proof_nodes = OrderedDict()
+        outputs = {}
+        for address in addresses:
+            # The separator keeps an address from matching longer addresses starting with it
+            nodes, items = trie_items_with_prefix(self.state, (address + ':').encode(), root=root)
+            for node in nodes[:-1]:
+                proof_nodes.setdefault(rlp_encode(node), node)
+            utxos = []
+            for k, v in items:
+                _, seq_no = self.parse_state_key(k.decode())
+                amount = rlp_decode(v)[0]
+                if not amount:
+                    continue
+                utxos.append((int(seq_no), int(amount)))
+            if not ordered:
+                utxos.sort()
+            outputs[address] = [{ADDRESS: address, SEQNO: seq_no, AMOUNT: amount} for seq_no, amount in utxos]
+        proof = self._make_state_proof(encoded_root_hash,
+                                       Trie.serialize_proof(list(proof_nodes.values()) + [root]))
+
+        result = {f.IDENTIFIER.nm: request.identifier,
+                  f.REQ_ID.nm: request.reqId,
+                  OUTPUTS: outputs,
+                  BALANCE: {address: sum(o[AMOUNT] for o in address_outputs)
+                            for address, address_outputs in outputs.items()}}
+        if proof:
+            result[STATE_PROOF] = proof
+
+        result.update(request.operation)
+        return result
+
+    def get_balance(self, request: Request):
+        # The balance comes from the utxo cache index, it is not part of the state so no proof is returned
+        address = request.operation[ADDRESS]
+        result = {f.IDENTIFIER.nm: request.identifier,
+                  f.REQ_ID.nm: request.reqId,
+                  BALANCE: self.utxo_cache.get_balance(address, is_committed=True)}
+        result.update(request.operation)
+        return result
+
     def _sum_inputs(self, req: Request, is_committed=False) -> int:
         return self.sum_inputs(self.utxo_cache, req,
                                is_committed=is_committed)
 
     @staticmethod
-    def create_state_key(address: str, seq_no: int) -> bytes:
+    def create_state_key(address: str, seq_no: int, version: int = StateKeyVersionDecimal) -> bytes:
+        """
+        The state key of an output, `<address>:<seq no>`. In version 2 the seq no is zero padded
+        to a fixed width, so the keys of an address are in seq no order in the trie
+        """
+        if version == TokenReqHandler.StateKeyVersionFixedWidth:
+            return '{}:{:0{}d}'.format(address, int(seq_no), TokenReqHandler.StateKeySeqNoWidth).encode()
         return ':'.join([address, str(seq_no)]).encode()
 
     @staticmethod
     def parse_state_key(key: str) -> List[str]:
+        # Works for keys of any version, the seq no is given as it is in the key
         return key.split(':')
 
+    def state_keys_ordered(self) -> bool:
+        # Whether the state keys of an address are in seq no order
+        return self.state_key_version == self.StateKeyVersionFixedWidth
+
     @staticmethod
     def sum_inputs(utxo_cache: UTXOCache, request: Request,
                    is_committed=False) -> int:
@@ -264,18 +567,84 @@ class TokenReqHandler(LedgerRequestHandler):
         return sum(o["amount"] for o in request.operation[OUTPUTS])
 
     @staticmethod
-    def spend_input(state, utxo_cache, address, seq_no, is_committed=False):
-        state_key = TokenReqHandler.create_state_key(address, seq_no)
-        state.set(state_key, b'')
+    def spend_input(state, utxo_cache, address, seq_no, is_committed=False, remove_spent=False,
+                    state_key_version=StateKeyVersionDecimal):
+        # A spent output is kept in the state with an empty value unless `remove_spent` is set,
+        # nodes of a pool have to agree on it since the state roots differ otherwise
+        state_key = TokenReqHandler.create_state_key(address, seq_no, state_key_version)
+        if remove_spent:
+            remove_state_key(state, state_key)
+        else:
+            state.set(state_key, b'')
         utxo_cache.spend_output(Output(address, seq_no, None),
                                 is_committed=is_committed)
 
     @staticmethod
-    def add_new_output(state, utxo_cache, output: Output, is_committed=False):
+    def compact_spent_outputs(state: PruningState, utxo_cache: UTXOCache) -> int:
+        """
+        Spent outputs used to be kept in the state with an empty value, this removes them
+        from the committed state. Only for nodes removing spent outputs, see `spend_input`, it
+        changes the committed state root outside of consensus so all nodes of a pool have to do
+        it together. Runs once, the utxo cache records that it was done. Has to be called on
+        startup, before any batch is applied to the state.
+
+        :return: number of removed outputs
+        """
+        if utxo_cache.has_marker(TokenReqHandler.SpentOutputsCompactedMarker):
+            return 0
+
+        spent = [key for key, value in iter_trie_items(state, state.committedHead) if not rlp_decode(value)[0]]
+        for key in spent:
+            remove_state_key(state, key)
+        if spent:
+            state.commit(rootHash=state.headHash)
+        utxo_cache.set_marker(TokenReqHandler.SpentOutputsCompactedMarker)
+
+        logger.info('removed {} spent outputs from the token state'.format(len(spent)))
+        return len(spent)
+
+    @staticmethod
+    def migrate_state_keys(state: PruningState, utxo_cache: UTXOCache, version: int) -> int:
+        """
+        Rewrites the keys of the committed state in another encoding than `version`, the request
+        handlers are then created with `version`. Nodes of a pool have to use the same version,
+        their state roots differ otherwise. The utxo cache records the version of the state so the
+        state is only read again when the version changes. Has to be called on startup, before any
+        batch is applied to the state.
+
+        :return: number of rewritten keys
+        """
+        if version not in (TokenReqHandler.StateKeyVersionDecimal, TokenReqHandler.StateKeyVersionFixedWidth):
+            raise TokenValueError('version', version, 'one of {}'.format(
+                [TokenReqHandler.StateKeyVersionDecimal, TokenReqHandler.StateKeyVersionFixedWidth]))
+        if utxo_cache.get_meta(TokenReqHandler.StateKeyVersionMeta) == str(version):
+            return 0
+
+        # Keys already in the encoding are kept, so a state mixing both, like one loaded from a
+        # snapshot of another version, is migrated too
+        moved = []
+        for key, value in iter_trie_items(state, state.committedHead):
+            address, seq_no = TokenReqHandler.parse_state_key(key.decode())
+            new_key = TokenReqHandler.create_state_key(address, int(seq_no), version)
+            if new_key != key:
+                moved.append((key, new_key, rlp_decode(value)[0]))
+        for key, new_key, value in moved:
+            remove_state_key(state, key)
+            state.set(new_key, value)
+        if moved:
+            state.commit(rootHash=state.headHash)
+        utxo_cache.set_meta(TokenReqHandler.StateKeyVersionMeta, str(version), is_committed=True)
+
+        logger.info('rewrote {} token state keys in version {}'.format(len(moved), version))
+        return len(moved)
+
+    @staticmethod
+    def add_new_output(state, utxo_cache, output: Output, is_committed=False,
+                       state_key_version=StateKeyVersionDecimal):
         address = output.address
         seq_no = output.seqNo
         amount = output.amount
-        state_key = TokenReqHandler.create_state_key(address, seq_no)
+        state_key = TokenReqHandler.create_state_key(address, seq_no, state_key_version)
         state.set(state_key, str(amount).encode())
         utxo_cache.add_output(output, is_committed=is_committed)
 
@@ -13,6 +13,11 @@ class TokenTransactions(Enum):
     MINT_PUBLIC = PREFIX + '0'
     XFER_PUBLIC = PREFIX + '1'
     GET_UTXO = PREFIX + '2'
+    GET_BALANCE = PREFIX + '3'
+    GET_UTXOS = PREFIX + '4'
+    GET_OUTPUT_AUDIT = PREFIX + '5'
+    GET_TXN_HISTORY = PREFIX + '6'
+    GET_UTXO_FOR_AMOUNT = PREFIX + '7'
 
     def __str__(self):
         return self.name
@@ -3,11 +3,18 @@ import json
 
 
 class Output:
+    # Slots since outputs are created per unspent output of an address
+    __slots__ = ('address', 'seqNo', 'amount')
+
     def __init__(self, address: str, seq_no: str, value: Optional[int]):
         self.address = address
         self.seqNo = seq_no
         self.amount = value
 
+    def as_dict(self) -> dict:
+        # The representation of the output in requests and replies
+        return {"address": self.address, "seqNo": self.seqNo, "amount": self.amount}
+
     def less_than(self, other):
         return self.seqNo < other.seqNo
 
@@ -15,7 +22,7 @@ class Output:
         return self.less_than(other)
 
     def __repr__(self):
-        return json.dumps(self.__dict__)
+        return json.dumps(self.as_dict())
 
     def __eq__(self, other):
         return isinstance(other, Output) \
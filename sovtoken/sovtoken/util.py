@@ -1,11 +1,17 @@
+import copy
+from collections import OrderedDict
+from functools import lru_cache
 from heapq import heappush, heappop
-from typing import List
+from typing import Iterator, List, Tuple
 
 from base58 import b58decode_check, b58encode_check, b58encode, b58decode
 from plenum.common.exceptions import UnauthorizedClientRequest
 from plenum.common.types import f
 from plenum.common.roles import Roles
 from plenum.server.domain_req_handler import DomainRequestHandler
+from state.util.utils import to_string
+from state.trie.pruning_trie import bin_to_nibbles, nibbles_to_bin, key_nibbles_from_key_value_node, \
+    rlp_encode, BLANK_NODE, NODE_TYPE_BRANCH, NODE_TYPE_LEAF, NODE_TYPE_EXTENSION, Trie
 
 
 def register_token_wallet_with_client(client, token_wallet):
@@ -16,11 +22,24 @@ def update_token_wallet_with_result(wallet, result):
     wallet.on_reply_from_network(None, None, None, result, None)
 
 
+# Number of decoded addresses kept in memory, the same addresses show up in most requests
+ADDRESS_CACHE_SIZE = 10000
+
+
 def address_to_verkey(address):
+    if isinstance(address, str):
+        return _cached_address_to_verkey(address)
+    return _address_to_verkey(address)
+
+
+def _address_to_verkey(address):
     vk_bytes = decode_address_to_vk_bytes(address)
     return b58encode(vk_bytes).decode()
 
 
+_cached_address_to_verkey = lru_cache(maxsize=ADDRESS_CACHE_SIZE)(_address_to_verkey)
+
+
 def verkey_to_address(verkey):
     if isinstance(verkey, str):
         verkey = verkey.encode()
@@ -28,16 +47,148 @@ def verkey_to_address(verkey):
 
 
 def decode_address_to_vk_bytes(address):
-    from plenum.common.exceptions import UnknownIdentifier
-
     if isinstance(address, str):
         address = address.encode()
+    if isinstance(address, bytes):
+        # Only successful decodes are cached, invalid addresses raise every time
+        return _cached_decode_address_to_vk_bytes(address)
+    return _decode_address_to_vk_bytes(address)
+
+
+def _decode_address_to_vk_bytes(address):
+    from plenum.common.exceptions import UnknownIdentifier
+
     try:
         return b58decode_check(address)
     except ValueError:
         raise UnknownIdentifier('{} is not a valid base58check value'.format(address))
 
 
+_cached_decode_address_to_vk_bytes = lru_cache(maxsize=ADDRESS_CACHE_SIZE)(_decode_address_to_vk_bytes)
+
+
+# Private methods of the plenum trie `remove_state_key` deletes keys with
+_TRIE_DELETE_METHODS = ('_delete_and_delete_storage', 'replace_root_hash')
+
+
+def remove_state_key(state, key: bytes):
+    # `PruningState.remove` refuses keys longer than 32 bytes and every token state key is
+    # longer, so the key is deleted from the trie the way `Trie.delete` does it. This is the
+    # only place reaching into the trie to delete a key
+    trie = state._trie
+    if not all(hasattr(trie, name) for name in _TRIE_DELETE_METHODS):
+        raise NotImplementedError('the trie of this plenum version cannot delete token state keys, '
+                                  'it has no {}'.format(' or '.join(_TRIE_DELETE_METHODS)))
+    old_root = copy.deepcopy(trie.root_node)
+    trie.root_node = trie._delete_and_delete_storage(trie.root_node,
+                                                     bin_to_nibbles(to_string(key)))
+    trie.replace_root_hash(old_root, trie.root_node)
+
+
+class TrieView(Trie):
+    """
+    Reads the trie of a state at a fixed root node, the current head of the state if not given.
+    Nodes are stored under their hash and never changed, so the view can be read outside the
+    node's thread while batches are applied to the state.
+
+    The trie records the nodes of a proof in the module level `ProofConstructor` of
+    `pruning_trie`, which is not safe to use from several threads. A view records the nodes
+    it reads itself instead, only its `get_with_proof` and `items_with_prefix` make proofs.
+    """
+
+    def __init__(self, state, root=None):
+        super().__init__(state._trie._db)
+        self.root_node = root if root is not None else state._trie.root_node
+        # rlp encoded node -> node, read since the proof was started
+        self._recorded = None
+
+    def spv_grabbing(self, node):
+        if self._recorded is not None:
+            self._recorded.setdefault(rlp_encode(node), node)
+
+    def spv_storing(self, node):
+        pass
+
+    def _record_proof(self, read):
+        # Returns the nodes read by `read`, root last, and its result
+        self._recorded = OrderedDict()
+        try:
+            result = read()
+            nodes = list(self._recorded.values())
+        finally:
+            self._recorded = None
+        nodes.append(copy.deepcopy(self.root_node))
+        return nodes, result
+
+    def get_with_proof(self, key: bytes):
+        """
+        Like `generate_state_proof` of the state with `get_value`
+
+        :return: the proof nodes, root last, and the encoded value of the key, None if missing
+        """
+        nodes, value = self._record_proof(lambda: self.get_at(self.root_node, key))
+        return nodes, value if value != BLANK_NODE else None
+
+    def items_with_prefix(self, prefix: bytes) -> Tuple[list, List[Tuple[bytes, bytes]]]:
+        """
+        Like `generate_state_proof_for_keys_with_prefix` of the state but returns the items in
+        key order, the trie returns them in a dictionary.
+
+        :return: the proof nodes, root last, and the `(key, encoded value)` of the keys starting
+        with `prefix`
+        """
+        def read():
+            seen = []
+            node = self._get_last_node_for_prfx(self.root_node, bin_to_nibbles(to_string(prefix)), seen_prfx=seen)
+            return [(nibbles_to_bin(nibbles), value) for nibbles, value in _iter_trie_node(self, node, seen)]
+
+        return self._record_proof(read)
+
+
+def trie_items_with_prefix(state, prefix: bytes, root=None) -> Tuple[list, List[Tuple[bytes, bytes]]]:
+    # Proof nodes and items of the keys starting with `prefix` under `root`, see `TrieView.items_with_prefix`
+    return TrieView(state, root).items_with_prefix(prefix)
+
+
+def iter_trie_items(state, root=None) -> Iterator[Tuple[bytes, bytes]]:
+    # Yields `(key, encoded value)` of all keys under `root`, the current head if not given, in
+    # key order. Nodes are read as they are reached, the state is not loaded into memory at once
+    trie = state._trie
+    for nibbles, value in _iter_trie_node(trie, root if root is not None else trie.root_node, []):
+        yield nibbles_to_bin(nibbles), value
+
+
+def _iter_trie_node(trie, node, nibbles: list):
+    # Yields the nibbles of the keys under the node, which is at `nibbles`, and their values in
+    # key order. A key ending at a branch is a prefix of the keys below it and comes first
+    node_type = trie._get_node_type(node)
+    if node_type == NODE_TYPE_BRANCH:
+        if node[16]:
+            yield nibbles, node[16]
+        for i in range(16):
+            yield from _iter_trie_node(trie, trie._decode_to_node(node[i]), nibbles + [i])
+    elif node_type == NODE_TYPE_LEAF:
+        yield nibbles + key_nibbles_from_key_value_node(node), node[1]
+    elif node_type == NODE_TYPE_EXTENSION:
+        yield from _iter_trie_node(trie, trie._get_inner_node_from_extension(node),
+                                   nibbles + key_nibbles_from_key_value_node(node))
+
+
+def iterate_prefix(kv_store, prefix: bytes, start: bytes = None):
+    # Yields `(key, value)` for all keys of `kv_store` starting with `prefix`, in key order.
+    # Iteration begins from `start` (which should have `prefix`) if given
+    start = start or prefix
+    itr = kv_store.iterator(start=start, include_value=True)
+    if isinstance(itr, dict):
+        # The in-memory storage returns an unordered dictionary
+        itr = sorted((k, v) for k, v in itr.items() if bytes(k) >= start)
+    for key, value in itr:
+        key = bytes(key)
+        if not key.startswith(prefix):
+            break
+        yield key, value
+
+
 class SortedItems:
     # Used to keep the inserted items in sorted order.
     def __init__(self):
@@ -1,8 +1,13 @@
-from collections import defaultdict
-from typing import List, Set
+import struct
+from bisect import bisect_left, bisect_right
+from collections import defaultdict, OrderedDict
+from typing import List, Set, Optional, Tuple, Iterable, Iterator
 
+from plenum.common.metrics_collector import MetricsCollector
 from sovtoken.exceptions import UTXONotFound, UTXOError, UTXOAddressNotFound
+from sovtoken.metrics import TokenMetricsName
 from sovtoken.types import Output
+from sovtoken.util import iterate_prefix
 from storage.kv_store import KeyValueStorage
 from storage.optimistic_kv_store import OptimisticKVStore
 from stp_core.common.log import getlogger
@@ -16,37 +21,184 @@ class UTXOCache(OptimisticKVStore):
         1. Given an output, check whether it is spent. Return the amout it holds when not spent.
         2. Given an address, return all valid UTXOs.
 
-    The key value looks like this 
+    The key value looks like this
         `<key is address> -> <value is a list of unspent seq nos and amounts>`
 
     If address `a1` has 3 UTXOs with seq no 4, 6, 19 and amount 1, 31, 100 respectively,
-    the key value would be `a1 -> 4:1:6:31:19:100`
-        * For `n` seq_nos, there will be `2*n` items in the value list
-        * The seq no lives at index `i` and the corresponding value lives at `i+1`
-        * Avoiding tuples or any additional delimiters for seq_no:value pairs to avoid serialization and
-        deserialization cost
+    the value holds the pairs `(4, 1), (6, 31), (19, 100)` sorted by seq no in the packed
+    binary record described in `UTXOAmounts`.
 
     An unspent output is the combination of an address and a reference (seq no) to a txn in which this address was
     transferred some tokens
+
+    Keys starting with `RESERVED_KEY_MARK` (not a base58 character, so never an address) hold indexes, like the
+    running balance of each address `#balance:<address> -> <balance>` and, if `amount_index` is set, the unspent
+    outputs of each address ordered by amount `#amounts:<address> -> <record>`, see `UTXOAmountOrder`. With the
+    amount index and a `dust_threshold`, `#dust_count -> <count>` holds the number of unspent outputs of all
+    addresses with an amount below the threshold
     """
-    def __init__(self, kv_store: KeyValueStorage):
+    RESERVED_KEY_MARK = '#'
+    BALANCE_KEY_PREFIX = '#balance:'
+    AMOUNT_KEY_PREFIX = '#amounts:'
+    META_KEY_PREFIX = '#meta:'
+    BALANCE_INDEX_MARKER = 'balance_index'
+    DUST_COUNT_KEY = '#dust_count'
+    AMOUNT_INDEX_MARKER = 'amount_index'
+    # Threshold the dust count was computed for
+    DUST_THRESHOLD_META = 'dust_threshold'
+
+    def __init__(self, kv_store: KeyValueStorage, cache_size=0, amount_index=False, dust_threshold=0):
         super().__init__(kv_store)
+        self.amount_index = amount_index
+        self.dust_threshold = dust_threshold
+        # Decoded `UTXOAmounts` of the most recently used addresses, one map for the committed
+        # view and one for the view including uncommitted batches. Caching is off when the size is 0
+        self._cache_size = cache_size
+        self._committed_amounts = OrderedDict()
+        self._uncommitted_amounts = OrderedDict()
+        # Addresses changed in the current batch that are only in `_uncommitted_amounts`,
+        # they are encoded and written once when the batch is created (or on eviction)
+        self._dirty = set()
+        # Addresses written to `current_batch_ops` and to each batch of `un_committed`
+        self._current_batch_addresses = set()
+        self._batch_addresses = []
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.cache_evictions = 0
+        # Reads and writes of keys, the ones already reported to the metrics are kept apart
+        self.reads = 0
+        self.writes = 0
+        self._reported_reads = 0
+        self._reported_writes = 0
+
+    @property
+    def cache_stats(self) -> dict:
+        return {
+            'hits': self.cache_hits,
+            'misses': self.cache_misses,
+            'evictions': self.cache_evictions,
+            'committed_size': len(self._committed_amounts),
+            'uncommitted_size': len(self._uncommitted_amounts),
+            'dirty': len(self._dirty),
+            'reads': self.reads,
+            'writes': self.writes,
+        }
+
+    def report_metrics(self, metrics: MetricsCollector):
+        # Adds the reads and writes since the previous report
+        metrics.add_event(TokenMetricsName.UTXO_CACHE_READS, self.reads - self._reported_reads)
+        metrics.add_event(TokenMetricsName.UTXO_CACHE_WRITES, self.writes - self._reported_writes)
+        self._reported_reads = self.reads
+        self._reported_writes = self.writes
 
     @staticmethod
     def _is_valid_output(output: Output):
         if not isinstance(output, Output):
             raise UTXOError("Output is invalid object type")
 
+    def get(self, key, is_committed=False):
+        self.reads += 1
+        if not is_committed and key in self._dirty:
+            return self._uncommitted_amounts[key].encode()
+        return super().get(key, is_committed=is_committed)
+
+    def set(self, key, value, is_committed=False):
+        self.writes += 1
+        if self._cache_size:
+            # Whatever was cached for the key is outdated now
+            if is_committed:
+                self._committed_amounts.pop(key, None)
+            else:
+                self._dirty.discard(key)
+                self._current_batch_addresses.add(key)
+            if key not in self._dirty:
+                self._uncommitted_amounts.pop(key, None)
+        super().set(key, value, is_committed=is_committed)
+
+    def _get_amounts(self, address: str, make_new=False, is_committed=False) -> 'UTXOAmounts':
+        if not self._cache_size:
+            return UTXOAmounts.get_amounts(address, self, make_new=make_new, is_committed=is_committed)
+
+        cache = self._committed_amounts if is_committed else self._uncommitted_amounts
+        amounts = cache.get(address)
+        if amounts is not None:
+            self.cache_hits += 1
+            cache.move_to_end(address)
+            return amounts
+
+        self.cache_misses += 1
+        amounts = UTXOAmounts.get_amounts(address, self, make_new=make_new, is_committed=is_committed)
+        self._cache_put(cache, amounts)
+        return amounts
+
+    def _put_amounts(self, amounts: 'UTXOAmounts', is_committed=False):
+        address = amounts.address
+        if not self._cache_size:
+            self.set(address, amounts.encode(), is_committed=is_committed)
+        elif is_committed:
+            self.set(address, amounts.encode(), is_committed=True)
+            self._cache_put(self._committed_amounts, amounts)
+        else:
+            self._dirty.add(address)
+            self._cache_put(self._uncommitted_amounts, amounts)
+
+    def _cache_put(self, cache: OrderedDict, amounts: 'UTXOAmounts'):
+        cache[amounts.address] = amounts
+        cache.move_to_end(amounts.address)
+        while len(cache) > self._cache_size:
+            address, evicted = cache.popitem(last=False)
+            self.cache_evictions += 1
+            if address in self._dirty:
+                # Write back, the change still belongs to the current batch
+                self._dirty.discard(address)
+                super().set(address, evicted.encode())
+                self._current_batch_addresses.add(address)
+
+    def _flush_dirty(self):
+        for address in self._dirty:
+            super().set(address, self._uncommitted_amounts[address].encode())
+            self._current_batch_addresses.add(address)
+        self._dirty.clear()
+
+    def create_batch_from_current(self, batch_idr):
+        if self._cache_size:
+            self._flush_dirty()
+            self._batch_addresses.append(self._current_batch_addresses)
+            self._current_batch_addresses = set()
+        super().create_batch_from_current(batch_idr)
+
+    def reject_batch(self):
+        # Same as `OptimisticKVStore.reject_batch`, the current changes and the last batch are discarded
+        rejected = self._dirty | self._current_batch_addresses
+        if self._batch_addresses:
+            rejected |= self._batch_addresses.pop()
+        for address in rejected:
+            self._uncommitted_amounts.pop(address, None)
+        self._dirty.clear()
+        self._current_batch_addresses = set()
+        super().reject_batch()
+
+    def commit_batch(self):
+        batch_idr = super().commit_batch()
+        if self._batch_addresses:
+            for address in self._batch_addresses.pop(0):
+                self._committed_amounts.pop(address, None)
+        return batch_idr
+
     # Adds an output to the batch of uncommitted outputs
     def add_output(self, output: Output, is_committed=False):
         UTXOCache._is_valid_output(output)
 
         logger.debug('adding new output: output:{}'.format(str(output)))
 
-        seq_nos_amounts = UTXOAmounts.get_amounts(output.address, self, make_new=True, is_committed=is_committed)
+        seq_nos_amounts = self._get_amounts(output.address, make_new=True, is_committed=is_committed)
 
-        seq_nos_amounts.add_amount(output.seqNo, output.amount)
-        self.set(output.address, seq_nos_amounts.as_str(), is_committed=is_committed)
+        previous = seq_nos_amounts.get_amount(output.seqNo) if self.amount_index else None
+        added = seq_nos_amounts.add_amount(output.seqNo, output.amount)
+        self._put_amounts(seq_nos_amounts, is_committed=is_committed)
+        self._add_to_balance(output.address, added, is_committed=is_committed)
+        self._update_amount_order(output.address, [(output.seqNo, previous, output.amount)],
+                                  is_committed=is_committed)
 
     # Spends the provided output by fetching it from the key value store
     # (it must have been previously added) and then doing batch ops
@@ -55,19 +207,101 @@ class UTXOCache(OptimisticKVStore):
 
         logger.debug('spending output -- output:{}'.format(str(output)))
 
-        seq_nos_amounts = UTXOAmounts.get_amounts(output.address, self, is_committed=is_committed)
-
-        seq_nos_amounts.remove_seq_no(output.seqNo)
+        seq_nos_amounts = self._get_amounts(output.address, is_committed=is_committed)
+
+        amount = seq_nos_amounts.remove_seq_no(output.seqNo)
+
+        self._put_amounts(seq_nos_amounts, is_committed=is_committed)
+        self._add_to_balance(output.address, -amount, is_committed=is_committed)
+        self._update_amount_order(output.address, [(output.seqNo, amount, None)], is_committed=is_committed)
+
+    def update_outputs(self, address: str, changes: List[Tuple[int, Optional[int]]], is_committed=False):
+        """
+        Applies `(seq no, amount)` changes to the outputs of the address in the given order, an
+        amount of None spends the output. Same as calling `add_output` and `spend_output` for
+        each change but the value and the balance of the address are read and written once.
+        """
+        logger.debug('updating {} outputs of address {}'.format(len(changes), address))
+
+        make_new = any(amount is not None for _, amount in changes)
+        seq_nos_amounts = self._get_amounts(address, make_new=make_new, is_committed=is_committed)
+        if self._cache_size:
+            # A later change may raise, the cached outputs are only replaced once all are applied
+            seq_nos_amounts = seq_nos_amounts.copy()
+
+        delta = 0
+        # `(seq no, old amount, new amount)` of the changed outputs for the amount index
+        moves = []
+        for seq_no, amount in changes:
+            if amount is None:
+                previous = seq_nos_amounts.remove_seq_no(seq_no)
+                delta -= previous
+            else:
+                previous = seq_nos_amounts.get_amount(seq_no) if self.amount_index else None
+                delta += seq_nos_amounts.add_amount(seq_no, amount)
+            moves.append((seq_no, previous, amount))
 
-        self.set(output.address, seq_nos_amounts.as_str(), is_committed=is_committed)
+        self._put_amounts(seq_nos_amounts, is_committed=is_committed)
+        self._add_to_balance(address, delta, is_committed=is_committed)
+        self._update_amount_order(address, moves, is_committed=is_committed)
 
     # Retrieves a list of the unspent outputs from the key value storage that
     # are associated with the provided address
     def get_unspent_outputs(self, address: str,
                             is_committed=False) -> List[Output]:
-        seq_nos_amounts = UTXOAmounts.get_amounts(address, self, make_new=True, is_committed=is_committed)
+        seq_nos_amounts = self._get_amounts(address, make_new=True, is_committed=is_committed)
         return seq_nos_amounts.as_output_list()
 
+    def get_unspent_outputs_page(self, address: str, from_seq_no=0, limit=None,
+                                 is_committed=False) -> Tuple[List[Output], Optional[int]]:
+        """
+        Returns at most `limit` unspent outputs of the address with seq no not less than
+        `from_seq_no` and the seq no the next page starts from, None if there is no next page
+        """
+        seq_nos_amounts = self._get_amounts(address, make_new=True, is_committed=is_committed)
+        seq_nos = seq_nos_amounts.seq_nos
+        start = bisect_left(seq_nos, from_seq_no)
+        end = len(seq_nos) if limit is None else min(start + limit, len(seq_nos))
+        outputs = [Output(address, seq_no, amount) for seq_no, amount in
+                   zip(seq_nos[start:end], seq_nos_amounts.amounts[start:end])]
+        return outputs, seq_nos[end] if end < len(seq_nos) else None
+
+    def get_outputs_by_amount(self, address: str, is_committed=False) -> 'UTXOAmountOrder':
+        """
+        The unspent outputs of the address ordered by amount, then by seq no. Read from the amount
+        index if it is kept, sorted on each call otherwise
+        """
+        if self.amount_index:
+            return self._get_amount_order(address, is_committed=is_committed)
+        outputs = sorted((o.amount, o.seqNo) for o in self.get_unspent_outputs(address, is_committed=is_committed))
+        order = UTXOAmountOrder(address)
+        order.amounts, order.seq_nos = [a for a, _ in outputs], [s for _, s in outputs]
+        return order
+
+    def get_dust_outputs(self, address: str, threshold: Optional[int] = None, is_committed=False) -> List[Output]:
+        """
+        The unspent outputs of the address with an amount below `threshold`, `dust_threshold` if
+        not given, smallest first
+        """
+        threshold = self.dust_threshold if threshold is None else threshold
+        order = self.get_outputs_by_amount(address, is_committed=is_committed)
+        end = order.count_below(threshold)
+        return [Output(address, seq_no, amount) for seq_no, amount in
+                zip(order.seq_nos[:end], order.amounts[:end])]
+
+    @property
+    def keeps_dust_count(self) -> bool:
+        return self.amount_index and self.dust_threshold > 0
+
+    def get_dust_count(self, is_committed=False) -> int:
+        # Number of unspent outputs of all addresses below `dust_threshold`
+        if not self.keeps_dust_count:
+            raise UTXOError('The dust count is only kept with the amount index and a dust threshold')
+        try:
+            return int(self.get(self.DUST_COUNT_KEY, is_committed=is_committed))
+        except KeyError:
+            return 0
+
     def sum_inputs(self, inputs: list, is_committed=False):
         addresses = defaultdict(set)
         for inp in inputs:
@@ -77,7 +311,7 @@ class UTXOCache(OptimisticKVStore):
 
         output_val = 0
         for addr, seq_nos in addresses.items():
-            seq_nos_amounts = UTXOAmounts.get_amounts(addr, self, is_committed=is_committed)
+            seq_nos_amounts = self._get_amounts(addr, is_committed=is_committed)
 
             total = seq_nos_amounts.sum_amounts(seq_nos)
 
@@ -85,13 +319,291 @@ class UTXOCache(OptimisticKVStore):
 
         return output_val
 
+    @classmethod
+    def _balance_key(cls, address: str) -> str:
+        return '{}{}'.format(cls.BALANCE_KEY_PREFIX, address)
+
+    @classmethod
+    def _is_address_key(cls, key) -> bool:
+        if isinstance(key, (bytes, bytearray)):
+            key = key.decode()
+        return not key.startswith(cls.RESERVED_KEY_MARK)
+
+    @classmethod
+    def _marker_key(cls, name: str) -> str:
+        return '{}{}'.format(cls.META_KEY_PREFIX, name)
+
+    def has_marker(self, name: str) -> bool:
+        # Markers record one-time migrations done on the committed store
+        try:
+            self._store.get(self._marker_key(name))
+            return True
+        except KeyError:
+            return False
+
+    def set_marker(self, name: str):
+        self._store.put(self._marker_key(name), '1')
+
+    def get_meta(self, name: str) -> Optional[str]:
+        # Meta values share the keys of the markers, read from the committed store
+        try:
+            value = self._store.get(self._marker_key(name))
+        except KeyError:
+            return None
+        return bytes(value).decode() if isinstance(value, (bytes, bytearray)) else value
+
+    def set_meta(self, name: str, value: str, is_committed=False):
+        # Uncommitted values are stored with the batch they are set in
+        self.set(self._marker_key(name), value, is_committed=is_committed)
+
+    def remove_meta(self, name: str):
+        try:
+            self._store.remove(self._marker_key(name))
+        except KeyError:
+            pass
+
+    def set_committed_batch(self, records: List[Tuple]):
+        # Writes `(key, value)` pairs of reserved keys to the committed store at once
+        self._store.setBatch(records)
+
+    def get_balance(self, address: str, is_committed=False) -> int:
+        # Sum of the unspent outputs of the address, read from the balance index
+        try:
+            return int(self.get(self._balance_key(address), is_committed=is_committed))
+        except KeyError:
+            return 0
+
+    def _add_to_balance(self, address: str, delta: int, is_committed=False):
+        if delta == 0:
+            return
+        balance = self.get_balance(address, is_committed=is_committed) + delta
+        self.set(self._balance_key(address), str(balance), is_committed=is_committed)
+
+    @classmethod
+    def _amount_key(cls, address: str) -> str:
+        return '{}{}'.format(cls.AMOUNT_KEY_PREFIX, address)
+
+    def _get_amount_order(self, address: str, is_committed=False) -> 'UTXOAmountOrder':
+        try:
+            return UTXOAmountOrder(address, self.get(self._amount_key(address), is_committed=is_committed))
+        except KeyError:
+            return UTXOAmountOrder(address)
+
+    def _update_amount_order(self, address: str, moves: List[Tuple[int, Optional[int], Optional[int]]],
+                             is_committed=False):
+        # Applies `(seq no, old amount, new amount)` moves of outputs in order, None for an output
+        # that was not there before or is spent
+        if not self.amount_index or not moves:
+            return
+        order = self._get_amount_order(address, is_committed=is_committed)
+        dust_delta = 0
+        for seq_no, old, new in moves:
+            if old is not None:
+                order.remove(seq_no, old)
+                dust_delta -= old < self.dust_threshold
+            if new is not None:
+                order.add(seq_no, new)
+                dust_delta += new < self.dust_threshold
+        self.set(self._amount_key(address), order.encode(), is_committed=is_committed)
+        if dust_delta:
+            count = self.get_dust_count(is_committed=is_committed) + dust_delta
+            self.set(self.DUST_COUNT_KEY, str(count), is_committed=is_committed)
+
+    def ensure_amount_index(self, chunk_size=1000) -> int:
+        """
+        Builds the amount index from the committed values, replacing any record left from an
+        index disabled before. Runs once, later calls find the marker key and return immediately.
+        Has to be called on startup, before any batch is applied.
+
+        :return: number of indexed addresses
+        """
+        if self.has_marker(self.AMOUNT_INDEX_MARKER):
+            return 0
+
+        stale = {k for k, _ in iterate_prefix(self._store, self.AMOUNT_KEY_PREFIX.encode())}
+        indexed = 0
+        chunk = []
+        for key, value in self._store.iterator(include_value=True):
+            if not self._is_address_key(key):
+                continue
+            record = UTXOAmounts(bytes(key).decode(), value)
+            amount_key = self._amount_key(record.address)
+            stale.discard(amount_key.encode())
+            chunk.append((amount_key, UTXOAmountOrder.from_amounts(record).encode()))
+            indexed += 1
+            if len(chunk) >= chunk_size:
+                self._store.setBatch(chunk)
+                chunk = []
+        if chunk:
+            self._store.setBatch(chunk)
+        for key in stale:
+            self._store.remove(key)
+        self.set_marker(self.AMOUNT_INDEX_MARKER)
+        # The dust count follows the index, it is computed again from the new records
+        self.remove_meta(self.DUST_THRESHOLD_META)
+
+        logger.info('built amount index for {} addresses'.format(indexed))
+        return indexed
+
+    def ensure_dust_count(self) -> Optional[int]:
+        """
+        Counts the committed outputs below `dust_threshold` from the amount index if the count
+        was not computed for that threshold yet. Has to be called on startup after
+        `ensure_amount_index`, before any batch is applied.
+
+        :return: the count if it was computed, None otherwise
+        """
+        if not self.keeps_dust_count:
+            # Outputs changed while the count is not kept are missed, it is computed again once kept
+            self.remove_meta(self.DUST_THRESHOLD_META)
+            return None
+        if self.get_meta(self.DUST_THRESHOLD_META) == str(self.dust_threshold):
+            return None
+
+        count = 0
+        for key, value in iterate_prefix(self._store, self.AMOUNT_KEY_PREFIX.encode()):
+            address = key[len(self.AMOUNT_KEY_PREFIX):].decode()
+            count += UTXOAmountOrder(address, value).count_below(self.dust_threshold)
+        self._store.setBatch([(self.DUST_COUNT_KEY, str(count)),
+                              (self._marker_key(self.DUST_THRESHOLD_META), str(self.dust_threshold))])
+
+        logger.info('counted {} outputs below {}'.format(count, self.dust_threshold))
+        return count
+
+    def ensure_balance_index(self) -> int:
+        """
+        Builds the balance index for committed values written before the index existed. Runs
+        once, later calls find the marker key and return immediately.
+
+        :return: number of indexed addresses
+        """
+        if self.has_marker(self.BALANCE_INDEX_MARKER):
+            return 0
+
+        balances = []
+        for key, value in self._store.iterator(include_value=True):
+            if not self._is_address_key(key):
+                continue
+            address = bytes(key).decode()
+            balances.append((self._balance_key(address), str(sum(UTXOAmounts(address, value).amounts))))
+        balances.append((self._marker_key(self.BALANCE_INDEX_MARKER), '1'))
+        self._store.setBatch(balances)
+
+        logger.info('built balance index for {} addresses'.format(len(balances) - 1))
+        return len(balances) - 1
+
+    def migrate_legacy_values(self, chunk_size=1000) -> int:
+        """
+        Rewrites committed values still stored in the legacy `:` delimited format in the binary
+        format. Safe to run on a live cache since legacy values are read transparently anyway,
+        values are converted and written in chunks of `chunk_size` keys.
+
+        :return: number of converted values
+        """
+        converted = 0
+        chunk = []
+        for key, value in self._store.iterator(include_value=True):
+            if not self._is_address_key(key) or not UTXOAmounts.is_legacy(value):
+                continue
+            address = key.decode() if isinstance(key, (bytes, bytearray)) else key
+            chunk.append((key, UTXOAmounts(address, value).encode()))
+            if len(chunk) >= chunk_size:
+                self._store.setBatch(chunk)
+                converted += len(chunk)
+                chunk = []
+        if chunk:
+            self._store.setBatch(chunk)
+            converted += len(chunk)
+
+        logger.info('converted {} legacy utxo cache values'.format(converted))
+        return converted
+
+    def rebuild(self, unspent: Iterable[Tuple[str, List[int], List[int]]], chunk_size=1000) -> int:
+        """
+        Replaces all committed values with the given unspent outputs, `(address, seq nos, amounts)`
+        with the seq nos of each address sorted. Reserved keys other than the balance and amount
+        indexes and the dust count, like the meta keys, are kept. The values are written in chunks of `chunk_size` keys,
+        there must be no uncommitted batch.
+
+        :return: number of written addresses
+        """
+        if self.un_committed or self.current_batch_ops or self._dirty:
+            raise UTXOError('Cannot rebuild the utxo cache while there are uncommitted changes')
+
+        rebuilt = (self.BALANCE_KEY_PREFIX.encode(), self.AMOUNT_KEY_PREFIX.encode(), self.DUST_COUNT_KEY.encode(),
+                   self._marker_key(self.AMOUNT_INDEX_MARKER).encode(),
+                   self._marker_key(self.DUST_THRESHOLD_META).encode())
+        meta = [(k, v) for k, v in iterate_prefix(self._store, self.RESERVED_KEY_MARK.encode())
+                if not k.startswith(rebuilt)]
+        self._store.reset()
+        self._committed_amounts.clear()
+        self._uncommitted_amounts.clear()
+        # The rebuilt values include the balance index, and the amount index and dust count if kept
+        meta.append((self._marker_key(self.BALANCE_INDEX_MARKER), '1'))
+        if self.amount_index:
+            meta.append((self._marker_key(self.AMOUNT_INDEX_MARKER), '1'))
+        self._store.setBatch(meta)
+
+        written = 0
+        dust_count = 0
+        chunk = []
+        for address, seq_nos, amounts in unspent:
+            chunk.extend(self._address_records(address, seq_nos, amounts))
+            if self.keeps_dust_count:
+                dust_count += sum(1 for amount in amounts if amount < self.dust_threshold)
+            written += 1
+            if len(chunk) >= chunk_size:
+                self._store.setBatch(chunk)
+                chunk = []
+        if self.keeps_dust_count:
+            chunk.extend([(self.DUST_COUNT_KEY, str(dust_count)),
+                          (self._marker_key(self.DUST_THRESHOLD_META), str(self.dust_threshold))])
+        if chunk:
+            self._store.setBatch(chunk)
+        return written
+
+    def _address_records(self, address: str, seq_nos: List[int], amounts: List[int]) -> List[Tuple]:
+        # The key values of an address holding the given outputs
+        record = UTXOAmounts(address)
+        record.seq_nos, record.amounts = list(seq_nos), list(amounts)
+        records = [(address, record.encode()), (self._balance_key(address), str(sum(amounts)))]
+        if self.amount_index:
+            records.append((self._amount_key(address), UTXOAmountOrder.from_amounts(record).encode()))
+        return records
+
+    def iter_committed_outputs(self) -> Iterator[Output]:
+        # All committed unspent outputs, in no particular order
+        for key, value in self._store.iterator(include_value=True):
+            if self._is_address_key(key):
+                yield from UTXOAmounts(bytes(key).decode(), value).as_output_list()
+
     @staticmethod
     def _create_key(output: Output) -> str:
         return '{}'.format(output.address)
 
 
 class UTXOAmounts:
+    """
+    Unspent seq nos and amounts of a single address, always kept sorted by seq no so lookups
+    and removals are done with a binary search.
+
+    The stored value is a versioned binary record
+        `<version byte><word count byte><seq_no><amount><seq_no><amount>...`
+        * Every seq no is an unsigned 64 bit big-endian integer
+        * Every amount is `word count` unsigned 64 bit big-endian integers, the word count is the
+        smallest one that fits the largest amount of the address (usually 1)
+        * Fixed width items let the whole record be packed and unpacked with a single `struct` call
+
+    Values written by older versions are `:` delimited strings like `4:1:6:31:19:100`. These are
+    still read transparently and are rewritten in the binary format on the next write to the
+    address (or in bulk by `UTXOCache.migrate_legacy_values`).
+    """
     DELIMITER = ':'
+    VERSION = 1
+    _HEADER = struct.Struct('>BB')
+    _WORD_BITS = 64
+    _WORD_MASK = (1 << 64) - 1
+    _MAX_WORDS = 255
 
     @classmethod
     def get_amounts(cls, address: str, cache: UTXOCache, make_new=False, is_committed=False):
@@ -108,94 +620,257 @@ class UTXOAmounts:
 
     def __init__(self, address: str, data=None):
         self.address = address
+        self.seq_nos = []
+        self.amounts = []
 
         if data:
             if isinstance(data, (bytes, bytearray)):
+                if data[0] == self.VERSION:
+                    self._decode(bytes(data))
+                    return
                 data = data.decode()
 
             if not isinstance(data, str):
                 raise UTXOError("Items are not valid string -- '{}'".format(str(data)))
 
-            split = data.split(self.DELIMITER)
+            self._decode_legacy(data)
 
-            if not len(split) % 2 == 0:  # test if even
-                raise UTXOError("Stored seqNo-amount pairs is not even")
-            self.data = split
+    @classmethod
+    def is_legacy(cls, data) -> bool:
+        return bool(data) and data[0] != cls.VERSION
+
+    def _decode(self, data: bytes):
+        if len(data) < self._HEADER.size:
+            raise UTXOError("Stored seqNo-amount record is truncated")
+        _, words = self._HEADER.unpack_from(data)
+        if words < 1:
+            raise UTXOError("Stored seqNo-amount record has invalid amount width")
+
+        item_size = 8 * (words + 1)
+        body_size = len(data) - self._HEADER.size
+        if body_size % item_size != 0:
+            raise UTXOError("Stored seqNo-amount record has invalid length")
+
+        count = body_size // item_size
+        values = struct.unpack_from('>{}Q'.format(count * (words + 1)), data, self._HEADER.size)
+        stride = words + 1
+        self.seq_nos = list(values[0::stride])
+        if words == 1:
+            self.amounts = list(values[1::stride])
         else:
-            self.data = []
+            self.amounts = [self._join_words(values[i + 1:i + stride])
+                            for i in range(0, len(values), stride)]
+
+    def _decode_legacy(self, data: str):
+        split = data.split(self.DELIMITER)
 
-    def add_amount(self, seq_no: int, amount: int):
+        if not len(split) % 2 == 0:  # test if even
+            raise UTXOError("Stored seqNo-amount pairs is not even")
+
+        try:
+            pairs = sorted((int(split[i]), int(split[i + 1])) for i in range(0, len(split), 2))
+        except ValueError:
+            raise UTXOError("Invalid data -- not integers -- {}".format(data))
+
+        self.seq_nos = [s for s, _ in pairs]
+        self.amounts = [a for _, a in pairs]
+
+    @classmethod
+    def _join_words(cls, words) -> int:
+        value = 0
+        for w in words:
+            value = (value << cls._WORD_BITS) | w
+        return value
+
+    @classmethod
+    def _split_words(cls, value: int, count: int) -> List[int]:
+        return [(value >> (cls._WORD_BITS * i)) & cls._WORD_MASK for i in reversed(range(count))]
+
+    def __len__(self):
+        return len(self.seq_nos)
+
+    def copy(self) -> 'UTXOAmounts':
+        amounts = UTXOAmounts(self.address)
+        amounts.seq_nos = list(self.seq_nos)
+        amounts.amounts = list(self.amounts)
+        return amounts
+
+    def _index_of(self, seq_no: int) -> int:
+        i = bisect_left(self.seq_nos, seq_no)
+        if i < len(self.seq_nos) and self.seq_nos[i] == seq_no:
+            return i
+        return -1
+
+    def get_amount(self, seq_no: int) -> Optional[int]:
+        # Amount of the output, None if the address does not have it
+        i = self._index_of(seq_no)
+        return self.amounts[i] if i >= 0 else None
+
+    def add_amount(self, seq_no: int, amount: int) -> int:
+        # Returns the change of the total amount of the address
         if not isinstance(seq_no, int) or not isinstance(amount, int):
             raise UTXOError("Adding invalid types -- seqNo:{} amount:{}".format(seq_no, amount))
+        if seq_no < 0 or amount < 0:
+            raise UTXOError("Adding negative values -- seqNo:{} amount:{}".format(seq_no, amount))
 
         logger.debug('adding seq_no: address {} - seq_no: {} - amount: {}'.format(self.address, seq_no, amount))
 
-        self.data.append(str(seq_no))
-        self.data.append(str(amount))
+        i = bisect_left(self.seq_nos, seq_no)
+        if i < len(self.seq_nos) and self.seq_nos[i] == seq_no:
+            # The same output can be re-applied (e.g. replaying a txn), keep a single entry for it
+            previous, self.amounts[i] = self.amounts[i], amount
+            return amount - previous
+        self.seq_nos.insert(i, seq_no)
+        self.amounts.insert(i, amount)
+        return amount
 
-    def remove_seq_no(self, seq_no: int):
-        logger.debug('removing seq_no -- address:{} - seq_no: {} - data: {}'.format(self.address,
-                                                                                    seq_no,
-                                                                                    str(self.data)))
+    def remove_seq_no(self, seq_no: int) -> int:
+        # Returns the amount of the removed output
+        logger.debug('removing seq_no -- address:{} - seq_no: {}'.format(self.address, seq_no))
 
-        seq_no_str = str(seq_no)
-        # Shortens the passed list `seq_nos_amounts` by 2 items
-        for i in range(0, len(self.data), 2):
-            if self.data[i] == seq_no_str:
-                break
-        else:
+        try:
+            seq_no = int(seq_no)
+        except (TypeError, ValueError):
+            raise UTXOError("Invalid seq_no {}".format(seq_no))
+
+        i = self._index_of(seq_no)
+        if i < 0:
             err_msg = "seq_no {} is not found is list of seq_nos_amounts for address -- current list: {}".format(
-                seq_no_str,
-                self.data)
+                seq_no,
+                self.seq_nos)
             raise UTXONotFound(err_msg)
 
-        if i < len(self.data) and (i+1) < len(self.data):
-            self.data.pop(i)
-            # List has changed length, value at index `i+1` has moved to index `i`
-            self.data.pop(i)
-        else:
-            raise UTXOError("Unable to remove seq_no from address")
+        del self.seq_nos[i]
+        return self.amounts.pop(i)
 
-    def sum_amounts(self, seq_nos:Set[int])->int:
+    def sum_amounts(self, seq_nos: Set[int]) -> int:
         total = 0
-        for i in range(0, len(self.data), 2):
-            if int(self.data[i]) in seq_nos:
-                total += int(self.data[i + 1])
-                seq_nos.remove(int(self.data[i]))
-                if not seq_nos:
-                    break
-
-        if seq_nos:
+        missing = set()
+        for seq_no in seq_nos:
+            i = self._index_of(seq_no)
+            if i < 0:
+                missing.add(seq_no)
+            else:
+                total += self.amounts[i]
+
+        if missing:
             err_msg = "seq_nos {} are not found is list of seq_nos_amounts for address -- current list: {}".format(
-                seq_nos,
-                self.data)
+                missing,
+                self.seq_nos)
             raise UTXONotFound(err_msg)
 
         return total
 
     def as_output_list(self) -> List[Output]:
-        if len(self.data) % 2 != 0:
-            raise UTXOError('Length of seqNo-amount pairs must be even: items={}'.format(len(self.data)))
-
-        rtn = []
-        for i in range(0, len(self.data), 2):
-            try:
-                seq_no = int(self.data[i])
-                amount = int(self.data[i + 1])
-            except ValueError:
-                raise UTXOError("Invalid data -- not integers -- seq_no:{} amount:{}".format(self.data[i],
-                                                                                             self.data[i + 1]))
-            rtn.append(Output(self.address, seq_no, amount))
+        return [Output(self.address, seq_no, amount) for seq_no, amount in zip(self.seq_nos, self.amounts)]
 
+    def encode(self) -> bytes:
+        if len(self.seq_nos) != len(self.amounts):
+            raise UTXOError('Number of seqNos and amounts must match: seqNos={} amounts={}'.format(
+                len(self.seq_nos), len(self.amounts)))
 
-        return rtn
+        max_amount = max(self.amounts) if self.amounts else 0
+        words = max(1, -(-max_amount.bit_length() // self._WORD_BITS))
+        if words > self._MAX_WORDS:
+            raise UTXOError('Amount {} is too big to be stored'.format(max_amount))
 
-    def as_str(self) -> str:
-        if len(self.data) % 2 != 0:
-            raise UTXOError('Length of seqNo-amount pairs must be even: items={}'.format(len(self.data)))
+        if words == 1:
+            values = [v for pair in zip(self.seq_nos, self.amounts) for v in pair]
+        else:
+            values = []
+            for seq_no, amount in zip(self.seq_nos, self.amounts):
+                values.append(seq_no)
+                values.extend(self._split_words(amount, words))
 
-        return ':'.join(self.data)
+        try:
+            body = struct.pack('>{}Q'.format(len(values)), *values)
+        except struct.error as ex:
+            raise UTXOError('Unable to encode seqNo-amount pairs: {}'.format(ex))
+        return self._HEADER.pack(self.VERSION, words) + body
 
     @staticmethod
     def _create_key(output: Output) -> str:
         return '{}'.format(output.address)
+
+
+class UTXOAmountOrder:
+    """
+    Unspent outputs of a single address ordered by amount, then by seq no, as kept by the amount
+    index of `UTXOCache`. Stored in the binary record format of `UTXOAmounts` with the items in
+    this order.
+    """
+
+    def __init__(self, address: str, data=None):
+        self.address = address
+        record = UTXOAmounts(address, data=data)
+        self.seq_nos = record.seq_nos
+        self.amounts = record.amounts
+
+    @classmethod
+    def from_amounts(cls, record: UTXOAmounts) -> 'UTXOAmountOrder':
+        order = cls(record.address)
+        items = sorted(zip(record.amounts, record.seq_nos))
+        order.amounts, order.seq_nos = [a for a, _ in items], [s for _, s in items]
+        return order
+
+    def __len__(self):
+        return len(self.seq_nos)
+
+    def encode(self) -> bytes:
+        record = UTXOAmounts(self.address)
+        record.seq_nos, record.amounts = self.seq_nos, self.amounts
+        return record.encode()
+
+    def _position(self, seq_no: int, amount: int) -> int:
+        # Outputs with the same amount are ordered by seq no
+        low, high = bisect_left(self.amounts, amount), bisect_right(self.amounts, amount)
+        return bisect_left(self.seq_nos, seq_no, low, high)
+
+    def add(self, seq_no: int, amount: int):
+        i = self._position(seq_no, amount)
+        if i < len(self.seq_nos) and self.seq_nos[i] == seq_no and self.amounts[i] == amount:
+            return
+        self.seq_nos.insert(i, seq_no)
+        self.amounts.insert(i, amount)
+
+    def remove(self, seq_no: int, amount: int):
+        i = self._position(seq_no, amount)
+        if i == len(self.seq_nos) or self.seq_nos[i] != seq_no or self.amounts[i] != amount:
+            # The index is not part of the state, a missing entry must not fail the txn
+            logger.warning('output {} with amount {} of address {} is not in the amount index'.format(
+                seq_no, amount, self.address))
+            return
+        del self.seq_nos[i]
+        del self.amounts[i]
+
+    def count_below(self, amount: int) -> int:
+        # Number of outputs with an amount less than `amount`, they come first
+        return bisect_left(self.amounts, amount)
+
+    def select(self, target: int, limit: Optional[int] = None) -> List[Tuple[int, int]]:
+        """
+        Returns `(seq no, amount)` of a few outputs adding up to at least `target`, empty if the
+        address cannot cover it with at most `limit` outputs. The smallest output covering the
+        target is taken if there is one. Otherwise the largest outputs are taken until they cover
+        it, which takes the fewest outputs, and the last one is swapped for the smallest output
+        left that still covers the rest, to keep the change small.
+        """
+        count = len(self.amounts)
+        i = bisect_left(self.amounts, target)
+        if i < count:
+            return [(self.seq_nos[i], self.amounts[i])]
+
+        taken = []
+        total = 0
+        i = count - 1
+        while i >= 0 and total < target and (limit is None or len(taken) < limit):
+            taken.append(i)
+            total += self.amounts[i]
+            i -= 1
+        if total < target:
+            return []
+        rest = target - (total - self.amounts[taken[-1]])
+        smaller = bisect_left(self.amounts, rest, 0, i + 1)
+        if smaller <= i:
+            taken[-1] = smaller
+        return [(self.seq_nos[j], self.amounts[j]) for j in taken]
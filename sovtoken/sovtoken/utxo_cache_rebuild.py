@@ -0,0 +1,226 @@
+"""
+Rebuilds the utxo cache from the token ledger, for when the cache is lost or corrupted or its
+layout changes. The ledger is streamed once and the final unspent outputs of each address are
+aggregated before anything is written, so every address is written once with
+`KeyValueStorage.setBatch` instead of once per output as replaying the txns through
+`TokenReqHandler.updateState` does.
+
+Large ledgers can be aggregated through temporary files: the inputs and outputs are first
+spilled to files partitioned by address and each file is then aggregated on its own, so only
+the outputs of the addresses of one file are in memory at a time.
+
+Offline, with the node stopped
+
+    python -m sovtoken.utxo_cache_rebuild --data-dir <node data dir>
+
+or on startup by setting `utxoCacheRebuildOnStartup` in the config.
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import zlib
+from collections import defaultdict
+from itertools import groupby
+from typing import Callable, Iterator, List, Tuple
+
+from plenum.common.config_util import getConfig
+from plenum.common.txn_util import get_payload_data
+from sovtoken.config import get_config
+from sovtoken.constants import ADDRESS, AMOUNT, INPUTS, OUTPUTS, SEQNO
+from sovtoken.exceptions import UTXONotFound
+from sovtoken.storage import get_token_hash_store, get_token_ledger, get_token_state, get_utxo_cache
+from sovtoken.token_req_handler import TokenReqHandler
+from sovtoken.types import Output
+from sovtoken.util import iter_trie_items, trie_items_with_prefix
+from sovtoken.utxo_cache import UTXOCache
+from state.trie.pruning_trie import rlp_decode
+from stp_core.common.log import getlogger
+
+logger = getlogger()
+
+# Number of files the outputs are spilled to when aggregating through files
+SPILL_PARTITIONS = 64
+# Txns processed between progress reports
+PROGRESS_INTERVAL = 100000
+
+
+def log_progress(done: int, total: int):
+    if done % PROGRESS_INTERVAL == 0 or done == total:
+        logger.info('utxo cache rebuild: processed {} of {} token txns'.format(done, total))
+
+
+def iter_payments(ledger, progress: Callable[[int, int], None] = log_progress) \
+        -> Iterator[Tuple[int, list, list]]:
+    # Yields the seq no, inputs and outputs of every committed token txn. MINT_PUBLIC, XFER_PUBLIC
+    # and the fees txns all spend their inputs and create their outputs with the txn's seq no
+    total = ledger.size
+    for seq_no, txn in ledger.getAllTxn():
+        payload = get_payload_data(txn)
+        yield seq_no, payload.get(INPUTS, []), payload.get(OUTPUTS, [])
+        if progress:
+            progress(seq_no, total)
+
+
+def _aggregate(events) -> Iterator[Tuple[str, List[int], List[int]]]:
+    # `events` are `(address, seq no, amount)` in ledger order, the amount is None for a spend
+    unspent = defaultdict(dict)
+    for address, seq_no, amount in events:
+        if amount is None:
+            try:
+                del unspent[address][seq_no]
+            except KeyError:
+                raise UTXONotFound('seq_no {} of address {} is spent before it is created'.format(seq_no, address))
+        else:
+            unspent[address][seq_no] = amount
+
+    for address, outputs in unspent.items():
+        if outputs:
+            seq_nos = sorted(outputs)
+            yield address, seq_nos, [outputs[s] for s in seq_nos]
+
+
+def _events(payments):
+    for seq_no, inputs, outputs in payments:
+        for inp in inputs:
+            yield inp[ADDRESS], inp[SEQNO], None
+        for output in outputs:
+            yield output[ADDRESS], seq_no, output[AMOUNT]
+
+
+def _spilled_events(path):
+    with open(path) as f:
+        for line in f:
+            address, seq_no, amount = line.split()
+            yield address, int(seq_no), None if amount == '-' else int(amount)
+
+
+def collect_unspent_outputs(ledger, spill_dir=None, partitions=SPILL_PARTITIONS,
+                            progress: Callable[[int, int], None] = log_progress) \
+        -> Iterator[Tuple[str, List[int], List[int]]]:
+    """
+    Yields `(address, seq nos, amounts)` with the unspent outputs of every address holding any,
+    the seq nos sorted. Aggregates in memory unless `spill_dir` is given, then the events are
+    partitioned into files in a temporary directory under it, removed once done.
+    """
+    events = _events(iter_payments(ledger, progress=progress))
+    if spill_dir is None:
+        yield from _aggregate(events)
+        return
+
+    os.makedirs(spill_dir, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(dir=spill_dir, prefix='utxo_cache_rebuild_')
+    try:
+        paths = [os.path.join(tmp_dir, str(i)) for i in range(partitions)]
+        files = [open(path, 'w') for path in paths]
+        try:
+            for address, seq_no, amount in events:
+                f = files[zlib.crc32(address.encode()) % partitions]
+                f.write('{} {} {}\n'.format(address, seq_no, '-' if amount is None else amount))
+        finally:
+            for f in files:
+                f.close()
+        for path in paths:
+            yield from _aggregate(_spilled_events(path))
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def rebuild_utxo_cache(ledger, utxo_cache: UTXOCache, spill_dir=None, chunk_size=1000,
+                       progress: Callable[[int, int], None] = log_progress) -> int:
+    """
+    Replaces the content of the utxo cache with the unspent outputs of the committed token ledger
+
+    :return: number of addresses holding unspent outputs
+    """
+    logger.info('rebuilding the utxo cache from {} token txns'.format(ledger.size))
+    written = utxo_cache.rebuild(collect_unspent_outputs(ledger, spill_dir=spill_dir, progress=progress),
+                                 chunk_size=chunk_size)
+    logger.info('rebuilt the utxo cache, {} addresses hold unspent outputs'.format(written))
+    return written
+
+
+def collect_state_outputs(state, root=None) -> Iterator[Tuple[str, List[int], List[int]]]:
+    """
+    Yields `(address, seq nos, amounts)` with the unspent outputs of every address holding any in
+    the token state at `root`, the committed root if not given, the seq nos sorted. Keys of an
+    address are next to each other in the trie, so one address is in memory at a time.
+    """
+    root = root if root is not None else state.committedHead
+    outputs = ((TokenReqHandler.parse_state_key(key.decode()), rlp_decode(value)[0])
+               for key, value in iter_trie_items(state, root))
+    for address, address_outputs in groupby(outputs, key=lambda output: output[0][0]):
+        # Spent outputs may be kept with an empty value
+        unspent = sorted((int(seq_no), int(amount)) for (_, seq_no), amount in address_outputs if amount)
+        if unspent:
+            yield address, [s for s, _ in unspent], [a for _, a in unspent]
+
+
+def verify_utxo_cache(utxo_cache: UTXOCache, state) -> List[str]:
+    """
+    Compares the committed unspent outputs of the utxo cache with the committed token state.
+    The state is streamed one address at a time and the outputs of each address are looked up
+    in the cache, so neither is loaded into memory at once. Addresses of the cache without
+    outputs in the state are only searched for when the cache has more outputs than compared.
+
+    :return: descriptions of the differences, empty if they match
+    """
+    errors = []
+    compared = 0
+    for address, seq_nos, amounts in collect_state_outputs(state, state.committedHead):
+        cached = {o.seqNo: o.amount for o in utxo_cache.get_unspent_outputs(address, is_committed=True)}
+        compared += len(cached)
+        for seq_no, amount in zip(seq_nos, amounts):
+            cached_amount = cached.pop(seq_no, None)
+            if cached_amount is None:
+                errors.append('seq_no {} of address {} with amount {} is not in the utxo cache'.format(
+                    seq_no, address, amount))
+            elif cached_amount != amount:
+                errors.append('{} has amount {} in the state'.format(Output(address, seq_no, cached_amount), amount))
+        errors.extend('{} is not in the state'.format(Output(address, seq_no, amount))
+                      for seq_no, amount in cached.items())
+
+    if sum(1 for _ in utxo_cache.iter_committed_outputs()) != compared:
+        for address, outputs in groupby(utxo_cache.iter_committed_outputs(), key=lambda output: output.address):
+            _, items = trie_items_with_prefix(state, '{}:'.format(address).encode(), state.committedHead)
+            if not any(rlp_decode(value)[0] for _, value in items):
+                errors.extend('{} is not in the state'.format(output) for output in outputs)
+    return errors
+
+
+def rebuild_and_verify(ledger, state, utxo_cache: UTXOCache, spill_dir=None) -> List[str]:
+    rebuild_utxo_cache(ledger, utxo_cache, spill_dir=spill_dir)
+    errors = verify_utxo_cache(utxo_cache, state)
+    for error in errors[:100]:
+        logger.error('utxo cache rebuild: {}'.format(error))
+    if errors:
+        logger.error('utxo cache rebuild: the cache differs from the token state in {} outputs'.format(len(errors)))
+    return errors
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Rebuilds the utxo cache of a stopped node from its token ledger')
+    parser.add_argument('--data-dir', required=True, help="the node's data directory")
+    parser.add_argument('--spill-dir', help='aggregate through temporary files in this directory')
+    parser.add_argument('--no-verify', action='store_true', help='skip comparing the result with the token state')
+    args = parser.parse_args(args)
+
+    config = get_config(getConfig())
+    ledger = get_token_ledger(args.data_dir, config.tokenTransactionsFile,
+                              get_token_hash_store(args.data_dir), config)
+    utxo_cache = get_utxo_cache(args.data_dir, config.utxoCacheDbName, config)
+    rebuild_utxo_cache(ledger, utxo_cache, spill_dir=args.spill_dir)
+    if args.no_verify:
+        return 0
+
+    state = get_token_state(args.data_dir, config.tokenStateDbName, config)
+    errors = verify_utxo_cache(utxo_cache, state)
+    for error in errors:
+        print(error)
+    print('{} differences with the token state'.format(len(errors)))
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,11 +1,13 @@
 from plenum.common.constants import TXN_TYPE
 from plenum.common.exceptions import InvalidClientRequest
+from plenum.common.metrics_collector import MetricsCollector, NullMetricsCollector, measure_time
 from plenum.common.types import PLUGIN_TYPE_AUTHENTICATOR, OPERATION, f
 from plenum.common.verifier import DidVerifier
 from plenum.server.client_authn import CoreAuthNr
 from sovtokenfees import AcceptableWriteTypes, AcceptableQueryTypes
 from sovtokenfees.constants import SET_FEES
 from sovtoken.client_authnr import AddressSigVerifier, TokenAuthNr
+from sovtoken.metrics import TokenMetricsName
 
 
 class FeesAuthNr(CoreAuthNr):
@@ -14,9 +16,10 @@ class FeesAuthNr(CoreAuthNr):
     write_types = AcceptableWriteTypes
     query_types = AcceptableQueryTypes
 
-    def __init__(self, state, token_authnr):
+    def __init__(self, state, token_authnr, metrics: MetricsCollector = NullMetricsCollector()):
         super().__init__(state)
         self.token_authnr = token_authnr
+        self.metrics = metrics
 
     # ------------------------------------------------------------------------------------
     # verifies the request operation is transaction type of fees
@@ -41,12 +44,14 @@ class FeesAuthNr(CoreAuthNr):
     #
     #     If everything is ok, nothing is returned
     #     If there is no fees, nothing is returned
+    @measure_time(TokenMetricsName.FEES_VERIFY_SIGNATURE_TIME)
     def verify_signature(self, msg):
         try:
             fees = getattr(msg, f.FEES.nm)
         except (AttributeError, KeyError):
             return
 
+        self.metrics.add_event(TokenMetricsName.SIGNATURE_VERIFICATIONS, len(fees[2]))
         digest = msg.digest
         return TokenAuthNr.verify_signtures_on_payments(fees[0], fees[1], fees[2],
                                                         AddressSigVerifier, digest)
@@ -9,6 +9,7 @@ def integrate_plugin_in_node(node):
         ThreePhaseCommitHandler
     from sovtoken import TOKEN_LEDGER_ID
     from sovtoken.client_authnr import TokenAuthNr
+    from sovtoken.metrics import get_metrics
 
     token_authnr = node.clientAuthNr.get_authnr_by_type(TokenAuthNr)
     if not token_authnr:
@@ -28,7 +29,8 @@ def integrate_plugin_in_node(node):
     token_ledger = token_req_handler.ledger
     token_state = token_req_handler.state
     utxo_cache = token_req_handler.utxo_cache
-    fees_authnr = FeesAuthNr(node.getState(DOMAIN_LEDGER_ID), token_authnr)
+    metrics = get_metrics(node)
+    fees_authnr = FeesAuthNr(node.getState(DOMAIN_LEDGER_ID), token_authnr, metrics=metrics)
     fees_req_handler = StaticFeesReqHandler(node.configLedger,
                                             node.getState(CONFIG_LEDGER_ID),
                                             token_ledger,
@@ -36,9 +38,19 @@ def integrate_plugin_in_node(node):
                                             utxo_cache,
                                             node.getState(DOMAIN_LEDGER_ID),
                                             node.bls_bft.bls_store,
-                                            token_req_handler.tracker)
+                                            token_req_handler.tracker,
+                                            metrics=metrics,
+                                            reply_cache_size=node.config.tokenQueryReplyCacheSize,
+                                            audit_index=token_req_handler.audit_index,
+                                            history_index=token_req_handler.history_index,
+                                            remove_spent_outputs=token_req_handler.remove_spent_outputs,
+                                            state_key_version=token_req_handler.state_key_version)
+    # GET_UTXO_FOR_AMOUNT of `TokenReqHandler` adds the fee of a txn type to the amount to cover
+    token_req_handler.get_committed_fee = fees_req_handler.get_committed_txn_fee
     node.clientAuthNr.register_authenticator(fees_authnr)
     node.register_req_handler(fees_req_handler, CONFIG_LEDGER_ID)
+    if token_req_handler.query_executor:
+        token_req_handler.query_executor.serve(fees_req_handler)
     node.register_hook(NodeHooks.PRE_SIG_VERIFICATION, fees_authnr.verify_signature)
     node.register_hook(NodeHooks.PRE_DYNAMIC_VALIDATION, fees_req_handler.can_pay_fees)
     node.register_hook(NodeHooks.POST_REQUEST_APPLICATION, fees_req_handler.deduct_fees)
@@ -50,7 +62,7 @@ def integrate_plugin_in_node(node):
 
     three_pc_handler = ThreePhaseCommitHandler(node.master_replica,
                                                token_ledger, token_state,
-                                               fees_req_handler)
+                                               fees_req_handler, metrics=metrics)
     node.master_replica.register_hook(ReplicaHooks.CREATE_PPR,
                                       three_pc_handler.add_to_pre_prepare)
     node.master_replica.register_hook(ReplicaHooks.CREATE_PR,
@@ -1,7 +1,9 @@
+from typing import Optional
+
 from common.serializers.serialization import proof_nodes_serializer, \
     state_roots_serializer
 from common.serializers.base58_serializer import Base58Serializer
-from sovtoken.util import validate_multi_sig_txn
+from sovtoken.util import validate_multi_sig_txn, TrieView
 from stp_core.common.log import getlogger
 
 from plenum.server.node import Node
@@ -10,9 +12,10 @@ txn_root_serializer = Base58Serializer()
 
 from common.serializers.json_serializer import JsonSerializer
 from plenum.common.constants import TXN_TYPE, TRUSTEE, ROOT_HASH, PROOF_NODES, \
-    STATE_PROOF, MULTI_SIGNATURE, TXN_PAYLOAD, TXN_PAYLOAD_DATA
+    STATE_PROOF, MULTI_SIGNATURE, TXN_PAYLOAD, TXN_PAYLOAD_DATA, CONFIG_LEDGER_ID
 from plenum.common.exceptions import UnauthorizedClientRequest, \
     InvalidClientRequest, InvalidClientMessageException
+from plenum.common.metrics_collector import MetricsCollector, NullMetricsCollector, measure_time
 from plenum.common.request import Request
 from plenum.common.txn_util import reqToTxn, get_type, get_payload_data, get_seq_no, \
     get_req_id
@@ -22,11 +25,15 @@ from sovtokenfees.fee_req_handler import FeeReqHandler
 from sovtokenfees.messages.fields import FeesStructureField, TxnFeesField
 from sovtoken.constants import INPUTS, OUTPUTS, \
     XFER_PUBLIC, AMOUNT, ADDRESS, SEQNO, TOKEN_LEDGER_ID
+from sovtoken.metrics import TokenMetricsName
+from sovtoken.audit_index import AuditIndex
+from sovtoken.history_index import HistoryIndex
 from sovtoken.token_req_handler import TokenReqHandler
+from sovtoken.query_reply_cache import QueryReplyCache
 from sovtoken.types import Output
 from sovtoken.exceptions import InsufficientFundsError, ExtraFundsError, \
     UTXOError, InvalidFundsError
-from state.trie.pruning_trie import rlp_decode
+from state.trie.pruning_trie import rlp_decode, Trie
 logger = getlogger()
 
 
@@ -40,21 +47,36 @@ class StaticFeesReqHandler(FeeReqHandler):
     state_serializer = JsonSerializer()
 
     def __init__(self, ledger, state, token_ledger, token_state, utxo_cache,
-                 domain_state, bls_store, token_tracker):
+                 domain_state, bls_store, token_tracker,
+                 metrics: MetricsCollector = NullMetricsCollector(), reply_cache_size=0,
+                 audit_index: Optional[AuditIndex] = None, history_index: Optional[HistoryIndex] = None,
+                 remove_spent_outputs=False, state_key_version=TokenReqHandler.StateKeyVersionDecimal):
         super().__init__(ledger, state)
         self.token_ledger = token_ledger
         self.token_state = token_state
         self.utxo_cache = utxo_cache
+        # Same as the token request handler, see `TokenReqHandler.spend_input`
+        self.remove_spent_outputs = remove_spent_outputs
+        self.state_key_version = state_key_version
+        # Indexes of the token ledger shared with the token request handler, None when disabled
+        self.audit_index = audit_index
+        self.history_index = history_index
         self.domain_state = domain_state
         self.bls_store = bls_store
         self.token_tracker = token_tracker
+        self.metrics = metrics
 
         # In-memory map of sovtokenfees, changes on SET_FEES txns
         self.fees = self._get_fees(is_committed=True)
+        # Fees at the committed state and the state root and fees of each created but
+        # uncommitted batch of the config ledger, `fees` goes back to them on batch reject
+        self.committed_fees = self.fees
+        self.uncommitted_fees_for_batches = []
 
         self.query_handlers = {
             GET_FEES: self.get_fees,
         }
+        self.reply_cache = QueryReplyCache(reply_cache_size, proof_types={GET_FEES}, metrics=metrics)
 
         # Tracks count of transactions paying sovtokenfees while a batch is being
         # processed. Reset to zero once a batch is created (not committed)
@@ -82,6 +104,10 @@ class StaticFeesReqHandler(FeeReqHandler):
     def get_txn_fees(self, request) -> int:
         return self.fees.get(request.operation[TXN_TYPE], 0)
 
+    def get_committed_txn_fee(self, txn_type: str) -> int:
+        return self.committed_fees.get(txn_type, 0)
+
+    @measure_time(TokenMetricsName.FEES_CAN_PAY_TIME)
     def can_pay_fees(self, request):
         required_fees = self.get_txn_fees(request)
 
@@ -108,6 +134,7 @@ class StaticFeesReqHandler(FeeReqHandler):
 
     # TODO: Fix this to match signature of `FeeReqHandler` and extract
     # the params from `kwargs`
+    @measure_time(TokenMetricsName.FEES_DEDUCT_TIME)
     def deduct_fees(self, request, cons_time, ledger_id, seq_no, txn):
         txn_type = request.operation[TXN_TYPE]
         fees_key = "{}#{}".format(txn_type, seq_no)
@@ -161,14 +188,39 @@ class StaticFeesReqHandler(FeeReqHandler):
             super().validate(request)
 
     def get_query_response(self, request: Request):
-        return self.query_handlers[request.operation[TXN_TYPE]](request)
+        return self.reply_cache.get_reply(request, bytes(self.state.committedHeadHash),
+                                          self.query_handlers[request.operation[TXN_TYPE]])
 
     def updateState(self, txns, isCommitted=False):
         for txn in txns:
             self._update_state_with_single_txn(txn, is_committed=isCommitted)
 
+    def get_query_response_async(self, request: Request, executor, send_reply) -> bool:
+        """
+        Submits a GET_FEES to `executor`, its reply is made at the committed root captured here
+
+        :return: False if the query was not submitted
+        """
+        if request.operation[TXN_TYPE] != GET_FEES:
+            return False
+        # The job only reads the trie under the committed root and the multi-signature read here
+        view = TrieView(self.state, self.state.committedHead)
+        root_hash = bytes(self.state.committedHeadHash)
+        multi_sig = self.bls_store.get(state_roots_serializer.serialize(root_hash))
+
+        def make_reply():
+            fees, proof = self._get_fees_with_proof_at(view, root_hash, multi_sig, NullMetricsCollector())
+            return self._get_fees_reply(request, fees, proof)
+
+        return executor.run_query(request, root_hash, make_reply, self.reply_cache, send_reply)
+
+    @measure_time(TokenMetricsName.GET_FEES_TIME)
     def get_fees(self, request: Request):
         fees, proof = self._get_fees(is_committed=True, with_proof=True)
+        return self._get_fees_reply(request, fees, proof)
+
+    @staticmethod
+    def _get_fees_reply(request: Request, fees, proof):
         result = {f.IDENTIFIER.nm: request.identifier,
                   f.REQ_ID.nm: request.reqId, FEES: fees}
         if proof:
@@ -176,7 +228,10 @@ class StaticFeesReqHandler(FeeReqHandler):
         result.update(request.operation)
         return result
 
+    @measure_time(TokenMetricsName.FEES_POST_BATCH_CREATED_TIME)
     def post_batch_created(self, ledger_id, state_root):
+        if ledger_id == CONFIG_LEDGER_ID:
+            self.uncommitted_fees_for_batches.append((self.state.headHash, self.fees))
         if self.fee_txns_in_current_batch > 0:
             state_root = self.token_state.headHash
             txn_root = self.token_ledger.uncommittedRootHash
@@ -184,19 +239,25 @@ class StaticFeesReqHandler(FeeReqHandler):
             TokenReqHandler.on_batch_created(self.utxo_cache, self.token_tracker, self.token_ledger, state_root)
             # ToDo: Needed investigation about affection of removing setting this var into 0
             self.fee_txns_in_current_batch = 0
+            self.utxo_cache.report_metrics(self.metrics)
         else:
             self.token_tracker.apply_batch(self.token_state.headHash,
                                            self.token_ledger.uncommitted_size)
 
     def post_batch_rejected(self, ledger_id):
+        if ledger_id == CONFIG_LEDGER_ID:
+            self._revert_fees()
         count_reverted = TokenReqHandler.on_batch_rejected(self.utxo_cache, self.token_tracker, self.token_state, self.token_ledger)
         if count_reverted > 0:
             self.uncommitted_state_roots_for_batches.pop()
         self.fee_txns_in_current_batch = 0
         logger.debug("Reverted {} txns with fees".format(count_reverted))
 
+    @measure_time(TokenMetricsName.FEES_POST_BATCH_COMMITTED_TIME)
     def post_batch_committed(self, ledger_id, pp_time, committed_txns,
                              state_root, txn_root):
+        if ledger_id == CONFIG_LEDGER_ID:
+            self._commit_fees()
         committed_seq_nos_with_fees = [get_seq_no(t) for t in committed_txns
                                        if "{}#{}".format(get_type(t), get_seq_no(t)) in self.deducted_fees
                                        and get_type(t) != XFER_PUBLIC
@@ -250,70 +311,124 @@ class StaticFeesReqHandler(FeeReqHandler):
 
 
     def _get_fees(self, is_committed=False, with_proof=False):
+        if with_proof:
+            if is_committed:
+                view, root_hash = TrieView(self.state, self.state.committedHead), bytes(self.state.committedHeadHash)
+            else:
+                view, root_hash = TrieView(self.state), bytes(self.state.headHash)
+            multi_sig = self.bls_store.get(state_roots_serializer.serialize(root_hash))
+            return self._get_fees_with_proof_at(view, root_hash, multi_sig, self.metrics)
+        fees = {}
+        try:
+            serz = self.state.get(self.fees_state_key,
+                                  isCommitted=is_committed)
+            if serz:
+                fees = self.state_serializer.deserialize(serz)
+        except KeyError:
+            pass
+        return fees
+
+    def _get_fees_with_proof_at(self, view: TrieView, root_hash: bytes, multi_sig, metrics: MetricsCollector):
+        # Only reads the trie nodes of `view`, so it can run outside the node's thread. `multi_sig`
+        # is the multi-signature of the root, read by the caller
         fees = {}
         proof = None
         try:
-            if with_proof:
-                proof, serz = self.state.generate_state_proof(self.fees_state_key,
-                                                              serialize=True,
-                                                              get_value=True)
-                if serz:
-                    serz = rlp_decode(serz)[0]
-                root_hash = self.state.committedHeadHash if is_committed else self.state.headHash
-                encoded_root_hash = state_roots_serializer.serialize(bytes(root_hash))
-                multi_sig = self.bls_store.get(encoded_root_hash)
-                if multi_sig:
-                    encoded_proof = proof_nodes_serializer.serialize(proof)
-                    proof = {
-                        MULTI_SIGNATURE: multi_sig.as_dict(),
-                        ROOT_HASH: encoded_root_hash,
-                        PROOF_NODES: encoded_proof
-                    }
-                else:
-                    proof = {}
+            proof, serz = view.get_with_proof(self.fees_state_key)
+            proof = Trie.serialize_proof(proof)
+            if serz:
+                serz = rlp_decode(serz)[0]
+            encoded_root_hash = state_roots_serializer.serialize(root_hash)
+            if multi_sig:
+                encoded_proof = proof_nodes_serializer.serialize(proof)
+                metrics.add_event(TokenMetricsName.STATE_PROOF_SIZE, len(encoded_proof))
+                proof = {
+                    MULTI_SIGNATURE: multi_sig.as_dict(),
+                    ROOT_HASH: encoded_root_hash,
+                    PROOF_NODES: encoded_proof
+                }
             else:
-                serz = self.state.get(self.fees_state_key,
-                                      isCommitted=is_committed)
+                proof = {}
             if serz:
                 fees = self.state_serializer.deserialize(serz)
         except KeyError:
             pass
-        if with_proof:
-            return fees, proof
-        return fees
+        return fees, proof
+
+    def _revert_fees(self):
+        # The state is reverted to the root of the last batch left, batches rejected before
+        # they were created have no fees to drop
+        head_hash = self.state.headHash
+        if head_hash == self.state.committedHeadHash:
+            self.uncommitted_fees_for_batches = []
+            self.fees = self.committed_fees
+            return
+        while self.uncommitted_fees_for_batches and self.uncommitted_fees_for_batches[-1][0] != head_hash:
+            self.uncommitted_fees_for_batches.pop()
+        if self.uncommitted_fees_for_batches:
+            self.fees = self.uncommitted_fees_for_batches[-1][1]
+        else:
+            self.fees = self._get_fees(is_committed=False)
+
+    def _commit_fees(self):
+        committed_hash = self.state.committedHeadHash
+        while self.uncommitted_fees_for_batches:
+            head_hash, fees = self.uncommitted_fees_for_batches.pop(0)
+            if head_hash == committed_hash:
+                self.committed_fees = fees
+                return
+        self.committed_fees = self._get_fees(is_committed=True)
 
     def _update_state_with_single_txn(self, txn, is_committed=False):
         typ = get_type(txn)
         if typ == SET_FEES:
-            payload = get_payload_data(txn)
-            existing_fees = self._get_fees(is_committed=is_committed)
-            existing_fees.update(payload[FEES])
-            val = self.state_serializer.serialize(existing_fees)
-            self.state.set(self.fees_state_key, val)
-            self.fees = existing_fees
+            with self.metrics.measure_time(TokenMetricsName.SET_FEES_UPDATE_STATE_TIME):
+                self._update_state_set_fees(txn, is_committed=is_committed)
         elif typ == FEE_TXN:
-            for utxo in txn[TXN_PAYLOAD][TXN_PAYLOAD_DATA][INPUTS]:
-                TokenReqHandler.spend_input(
-                    state=self.token_state,
-                    utxo_cache=self.utxo_cache,
-                    address=utxo[ADDRESS],
-                    seq_no=utxo[SEQNO],
-                    is_committed=is_committed
-                )
-            seq_no = get_seq_no(txn)
-            for output in txn[TXN_PAYLOAD][TXN_PAYLOAD_DATA][OUTPUTS]:
-                TokenReqHandler.add_new_output(
-                    state=self.token_state,
-                    utxo_cache=self.utxo_cache,
-                    output=Output(
-                        output[ADDRESS],
-                        seq_no,
-                        output[AMOUNT]),
-                    is_committed=is_committed)
+            with self.metrics.measure_time(TokenMetricsName.FEE_TXN_UPDATE_STATE_TIME):
+                self._update_state_fee_txn(txn, is_committed=is_committed)
         else:
             logger.warning('Unknown type {} found while updating '
                            'state with txn {}'.format(typ, txn))
 
+    def _update_state_set_fees(self, txn, is_committed=False):
+        payload = get_payload_data(txn)
+        # The fees are not read back from the state, a new map is made so that the maps of
+        # the uncommitted batches stay unchanged
+        existing_fees = dict(self.committed_fees if is_committed else self.fees)
+        existing_fees.update(payload[FEES])
+        val = self.state_serializer.serialize(existing_fees)
+        self.state.set(self.fees_state_key, val)
+        self.fees = existing_fees
+        if is_committed:
+            self.committed_fees = existing_fees
+
+    def _update_state_fee_txn(self, txn, is_committed=False):
+        for utxo in txn[TXN_PAYLOAD][TXN_PAYLOAD_DATA][INPUTS]:
+            TokenReqHandler.spend_input(
+                state=self.token_state,
+                utxo_cache=self.utxo_cache,
+                address=utxo[ADDRESS],
+                seq_no=utxo[SEQNO],
+                is_committed=is_committed,
+                remove_spent=self.remove_spent_outputs,
+                state_key_version=self.state_key_version
+            )
+        seq_no = get_seq_no(txn)
+        for output in txn[TXN_PAYLOAD][TXN_PAYLOAD_DATA][OUTPUTS]:
+            TokenReqHandler.add_new_output(
+                state=self.token_state,
+                utxo_cache=self.utxo_cache,
+                output=Output(
+                    output[ADDRESS],
+                    seq_no,
+                    output[AMOUNT]),
+                is_committed=is_committed,
+                state_key_version=self.state_key_version)
+        for index in (self.audit_index, self.history_index):
+            if index:
+                index.add_txn(txn, is_committed=is_committed)
+
     @staticmethod
     def _handle_incorrect_funds(sum_inputs, sum_outputs, expected_amount, required_fees, request):
         if sum_inputs < expected_amount:
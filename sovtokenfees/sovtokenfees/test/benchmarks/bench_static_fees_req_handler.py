@@ -0,0 +1,128 @@
+"""
+Benchmarks of `StaticFeesReqHandler` paying the fees of a NYM with different numbers of
+inputs, and of GET_FEES with different numbers of fees set. They are run together with the
+token benchmarks by `python -m sovtoken.test.benchmarks.runner`.
+"""
+from functools import lru_cache
+
+from plenum.common.constants import TXN_TYPE, NYM, TARGET_NYM, DOMAIN_LEDGER_ID, \
+    CONFIG_LEDGER_ID, CURRENT_PROTOCOL_VERSION
+from plenum.common.request import Request
+from plenum.common.txn_util import reqToTxn, append_txn_metadata
+from sovtoken.test.helpers.helper_handler_env import TokenHandlerEnv, FixedMultiSigStore, \
+    in_memory_ledger, IDENTIFIER
+from sovtoken.test.benchmarks.runner import benchmark
+from sovtoken.constants import ADDRESS, AMOUNT, SEQNO
+from sovtokenfees.constants import SET_FEES, GET_FEES, FEES
+from sovtokenfees.static_fee_req_handler import StaticFeesReqHandler
+from state.pruning_state import PruningState
+from storage.kv_in_memory import KeyValueStorageInMemory
+
+INPUT_COUNTS = (1, 10, 100, 1000)
+# Number of txn types with fees set
+FEES_COUNTS = (1, 10, 100)
+NYM_FEES = 1
+
+
+class FeesHandlerEnv(TokenHandlerEnv):
+    # The fees handler is built on the token ledger, state and utxo cache of `TokenHandlerEnv`
+    def __init__(self, fees=None, reply_cache_size=0):
+        super().__init__()
+        self.fees_handler = StaticFeesReqHandler(in_memory_ledger(),
+                                                 PruningState(KeyValueStorageInMemory()),
+                                                 self.ledger, self.state, self.utxo_cache,
+                                                 PruningState(KeyValueStorageInMemory()),
+                                                 FixedMultiSigStore(), self.handler.tracker,
+                                                 reply_cache_size=reply_cache_size)
+        self.set_fees(fees or {NYM: NYM_FEES})
+
+    def apply_set_fees(self, fees):
+        # Applies a SET_FEES in a new config ledger batch
+        request = Request(IDENTIFIER, Request.gen_req_id(), {TXN_TYPE: SET_FEES, FEES: fees},
+                          protocolVersion=CURRENT_PROTOCOL_VERSION)
+        self.fees_handler.updateState([reqToTxn(request)])
+        self.fees_handler.post_batch_created(CONFIG_LEDGER_ID, self.fees_handler.state.headHash)
+
+    def commit_config_batch(self):
+        # Commits the oldest uncommitted config ledger batch the way the node does
+        state = self.fees_handler.state
+        state.commit(rootHash=self.fees_handler.uncommitted_fees_for_batches[0][0])
+        self.fees_handler.post_batch_committed(CONFIG_LEDGER_ID, self.pp_time, [], None, None)
+
+    def set_fees(self, fees):
+        self.apply_set_fees(fees)
+        self.commit_config_batch()
+
+    def nym_with_fees(self, num_inputs, amount=10) -> Request:
+        # A NYM paying its fees with `num_inputs` committed outputs of a new address
+        address = self.new_address()
+        inputs = [{ADDRESS: address, SEQNO: s} for s, _ in self.fund(address, num_inputs, amount)]
+        outputs = [{ADDRESS: address, AMOUNT: num_inputs * amount - NYM_FEES}]
+        request = Request(IDENTIFIER, Request.gen_req_id(),
+                          {TXN_TYPE: NYM, TARGET_NYM: self.new_address()[:22]},
+                          protocolVersion=CURRENT_PROTOCOL_VERSION)
+        request.fees = [inputs, outputs,
+                        [self.sign(address, i, outputs, request.digest) for i in inputs]]
+        return request
+
+    def nym_txn(self, request, seq_no):
+        self.pp_time += 1
+        return append_txn_metadata(reqToTxn(request), seq_no=seq_no, txn_time=self.pp_time)
+
+
+@lru_cache()
+def nym_with_fees(num_inputs):
+    env = FeesHandlerEnv()
+    return env, env.nym_with_fees(num_inputs)
+
+
+def payable_nym(num_inputs):
+    env = FeesHandlerEnv()
+    request = env.nym_with_fees(num_inputs)
+    env.fees_handler.can_pay_fees(request)
+    return env, request, env.nym_txn(request, 1)
+
+
+def paid_nym(num_inputs):
+    env, request, txn = payable_nym(num_inputs)
+    env.fees_handler.deduct_fees(request, env.pp_time, DOMAIN_LEDGER_ID, 1, txn)
+    return env, txn
+
+
+@lru_cache()
+def fees_set(num_fees):
+    # The reply cache is only used through `get_query_response`
+    env = FeesHandlerEnv({str(20000 + i): i + 1 for i in range(num_fees)}, reply_cache_size=1)
+    return env, Request(IDENTIFIER, Request.gen_req_id(), {TXN_TYPE: GET_FEES},
+                        protocolVersion=CURRENT_PROTOCOL_VERSION)
+
+
+@benchmark(INPUT_COUNTS, setup=nym_with_fees, number=20)
+def fees_can_pay(ctx):
+    env, request = ctx
+    env.fees_handler.can_pay_fees(request)
+
+
+@benchmark(INPUT_COUNTS, setup=payable_nym)
+def fees_deduct(ctx):
+    env, request, txn = ctx
+    env.fees_handler.deduct_fees(request, env.pp_time, DOMAIN_LEDGER_ID, 1, txn)
+
+
+@benchmark(INPUT_COUNTS, setup=paid_nym)
+def fees_batch_created_and_committed(ctx):
+    env, txn = ctx
+    env.fees_handler.post_batch_created(DOMAIN_LEDGER_ID, None)
+    env.fees_handler.post_batch_committed(DOMAIN_LEDGER_ID, env.pp_time, [txn], None, None)
+
+
+@benchmark(FEES_COUNTS, setup=fees_set, number=20)
+def get_fees(ctx):
+    env, request = ctx
+    env.fees_handler.get_fees(request)
+
+
+@benchmark(FEES_COUNTS, setup=fees_set, number=20)
+def get_fees_cached(ctx):
+    env, request = ctx
+    env.fees_handler.get_query_response(request)
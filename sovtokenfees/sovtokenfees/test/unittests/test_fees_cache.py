@@ -0,0 +1,125 @@
+from common.serializers.serialization import proof_nodes_serializer, state_roots_serializer
+from plenum.common.constants import TXN_TYPE, NYM, CONFIG_LEDGER_ID, CURRENT_PROTOCOL_VERSION, \
+    STATE_PROOF, ROOT_HASH, PROOF_NODES
+from plenum.common.request import Request
+from plenum.common.types import f
+from sovtoken.query_executor import QueryExecutor
+from sovtoken.test.helpers.helper_handler_env import IDENTIFIER
+from sovtokenfees.constants import GET_FEES, FEES
+from sovtokenfees.static_fee_req_handler import StaticFeesReqHandler
+from sovtokenfees.test.benchmarks.bench_static_fees_req_handler import FeesHandlerEnv
+from state.pruning_state import PruningState
+
+COMMITTED_FEES = {NYM: 1}
+
+
+def get_fees_request():
+    return Request(IDENTIFIER, Request.gen_req_id(), {TXN_TYPE: GET_FEES},
+                   protocolVersion=CURRENT_PROTOCOL_VERSION)
+
+
+def reject_last_batch(env):
+    # The node reverts the state to the root of the previous batch, then runs the hooks
+    handler = env.fees_handler
+    previous = [root for root, _ in handler.uncommitted_fees_for_batches[:-1]]
+    handler.state.revertToHead(previous[-1] if previous else handler.state.committedHeadHash)
+    handler.post_batch_rejected(CONFIG_LEDGER_ID)
+
+
+def test_set_fees_committed():
+    env = FeesHandlerEnv(COMMITTED_FEES)
+    handler = env.fees_handler
+    assert handler.fees == handler.committed_fees == COMMITTED_FEES
+    assert handler._get_fees(is_committed=True) == COMMITTED_FEES
+    assert handler.uncommitted_fees_for_batches == []
+
+
+def test_rejected_batches_revert_fees():
+    env = FeesHandlerEnv(COMMITTED_FEES)
+    handler = env.fees_handler
+    env.apply_set_fees({NYM: 2})
+    env.apply_set_fees({'10001': 3})
+    assert handler.fees == {NYM: 2, '10001': 3}
+    assert handler.committed_fees == COMMITTED_FEES
+
+    reject_last_batch(env)
+    assert handler.fees == {NYM: 2}
+    reject_last_batch(env)
+    assert handler.fees == COMMITTED_FEES
+    assert handler.uncommitted_fees_for_batches == []
+
+
+def test_commit_after_reject():
+    env = FeesHandlerEnv(COMMITTED_FEES)
+    handler = env.fees_handler
+    env.apply_set_fees({NYM: 2})
+    env.apply_set_fees({NYM: 3})
+    reject_last_batch(env)
+    env.apply_set_fees({'10001': 4})
+
+    env.commit_config_batch()
+    assert handler.committed_fees == {NYM: 2}
+    env.commit_config_batch()
+    assert handler.committed_fees == handler.fees == {NYM: 2, '10001': 4}
+    assert handler._get_fees(is_committed=True) == handler.committed_fees
+
+
+def test_get_fees_served_from_cache_until_commit(monkeypatch):
+    env = FeesHandlerEnv(COMMITTED_FEES, reply_cache_size=10)
+    handler = env.fees_handler
+    reads = []
+    get_fees_with_proof_at = handler._get_fees_with_proof_at
+    monkeypatch.setattr(handler, '_get_fees_with_proof_at',
+                        lambda *args, **kwargs: reads.append(args) or get_fees_with_proof_at(*args, **kwargs))
+
+    first_request, second_request = get_fees_request(), get_fees_request()
+    first = handler.get_query_response(first_request)
+    second = handler.get_query_response(second_request)
+    assert first[FEES] == second[FEES] == COMMITTED_FEES
+    assert first[STATE_PROOF] == second[STATE_PROOF]
+    assert second[f.REQ_ID.nm] == second_request.reqId
+    assert len(reads) == 1
+    assert handler.reply_cache.stats['hits'] == 1
+
+    # An uncommitted SET_FEES does not change the reply
+    env.apply_set_fees({NYM: 2})
+    assert handler.get_query_response(get_fees_request())[FEES] == COMMITTED_FEES
+    assert len(reads) == 1
+
+    env.commit_config_batch()
+    assert handler.get_query_response(get_fees_request())[FEES] == {NYM: 2}
+    assert len(reads) == 2
+
+
+def test_get_fees_proof_is_for_committed_root():
+    env = FeesHandlerEnv(COMMITTED_FEES)
+    env.apply_set_fees({NYM: 2})
+
+    proof = env.fees_handler.get_fees(get_fees_request())[STATE_PROOF]
+    assert state_roots_serializer.deserialize(proof[ROOT_HASH]) == env.fees_handler.state.committedHeadHash
+    assert PruningState.verify_state_proof(state_roots_serializer.deserialize(proof[ROOT_HASH]),
+                                           StaticFeesReqHandler.fees_state_key,
+                                           StaticFeesReqHandler.state_serializer.serialize(COMMITTED_FEES),
+                                           proof_nodes_serializer.deserialize(proof[PROOF_NODES]),
+                                           serialized=True)
+
+
+def test_get_fees_answered_in_executor():
+    env = FeesHandlerEnv(COMMITTED_FEES, reply_cache_size=10)
+    handler = env.fees_handler
+    env.apply_set_fees({NYM: 2})
+    executor = QueryExecutor(max_workers=1, max_pending=1)
+    replies = []
+    request = get_fees_request()
+    try:
+        assert handler.get_query_response_async(request, executor, replies.append)
+        while not replies:
+            executor.service()
+    finally:
+        executor.stop()
+
+    [reply] = replies
+    assert reply[f.REQ_ID.nm] == request.reqId
+    assert reply[FEES] == COMMITTED_FEES
+    assert reply[STATE_PROOF] == handler.get_fees(get_fees_request())[STATE_PROOF]
+    assert handler.reply_cache.stats['size'] == 1
@@ -1,19 +1,23 @@
+from plenum.common.metrics_collector import MetricsCollector, NullMetricsCollector, measure_time
 from plenum.common.types import f
 from plenum.common.util import updateNamedTuple
 from sovtokenfees.constants import FEES, FEE_TXNS_IN_BATCH
 from sovtoken import TOKEN_LEDGER_ID
+from sovtoken.metrics import TokenMetricsName
 
 
 class ThreePhaseCommitHandler:
     def __init__(self, master_replica, token_ledger, token_state,
-                 fees_req_handler):
+                 fees_req_handler, metrics: MetricsCollector = NullMetricsCollector()):
         self.master_replica = master_replica
         self.token_ledger = token_ledger
         self.token_state = token_state
         self.fees_req_handler = fees_req_handler
+        self.metrics = metrics
 
     # adds a pre_prepare message to be sent that includes the fee transaction info in
     # the "plugins_fields" member
+    @measure_time(TokenMetricsName.FEES_ADD_TO_PRE_PREPARE_TIME)
     def add_to_pre_prepare(self, pre_prepare):
         if pre_prepare.ledgerId != TOKEN_LEDGER_ID and \
                 self.fees_req_handler.fee_txns_in_current_batch > 0:
@@ -76,6 +80,7 @@ class ThreePhaseCommitHandler:
         return ordered
 
     # Checks to make sure the pre_prepare message was properly appended and formatted with fee info
+    @measure_time(TokenMetricsName.FEES_CHECK_RECVD_PRE_PREPARE_TIME)
     def check_recvd_pre_prepare(self, pre_prepare):
         if pre_prepare.ledgerId != TOKEN_LEDGER_ID:
             fee_txn_count = self.fees_req_handler.fee_txns_in_current_batch